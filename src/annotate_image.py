@@ -19,6 +19,8 @@ from PIL import Image
 from mt_trainer.frame_processor import FrameProcessor
 from mt_trainer.camera import Camera
 from mt_trainer.graph_plotter import GraphPlotter
+from mt_trainer.metrics import NULL_METRICS, Metrics
+from mt_trainer.profiling import Profiler, profile_prefix
 
 
 def insert_suffix_before_extension(path, suffix):
@@ -58,20 +60,58 @@ parser.add_argument('-dc', '--min-detection-confidence',
 parser.add_argument('-tc', '--min-tracking-confidence',
                     dest='min_tracking_confidence',
                     type=float, default=0.5)
+parser.add_argument('-mc', '--model-complexity',
+                    dest='model_complexity',
+                    type=int, default=1, choices=[0, 1, 2],
+                    help=("Pose landmark model complexity - higher is more "
+                          "accurate but slower. Default is 1"))
+parser.add_argument('--smooth-landmarks',
+                    dest='smooth_landmarks',
+                    choices=['true', 'false'], default='true',
+                    help="Filter landmarks across frames to reduce jitter")
+parser.add_argument('--enable-segmentation',
+                    dest='enable_segmentation',
+                    choices=['true', 'false'], default='false',
+                    help="Also generate a segmentation mask of the person")
+parser.add_argument('--metrics',
+                    dest='metrics_file',
+                    type=str, default=None,
+                    help=("Time each stage - decode, inference, rendering, "
+                          "encode etc - and write them to this file, as "
+                          "CSV if it ends in .csv, otherwise JSON"))
+parser.add_argument('--profile',
+                    dest='profile',
+                    choices=['true', 'false'], default='false',
+                    help=("Profile the run, writing "
+                          "<output>.profile.pstats (cProfile), "
+                          "<output>.profile.folded (sampled stacks, for "
+                          "flamegraph.pl / speedscope) and "
+                          "<output>.profile.memory.txt (the largest "
+                          "allocations)"))
 args = parser.parse_args()
 input_file = args.input_file
 output_file = args.output_file or default_output_file_path(input_file)
+metrics = Metrics() if args.metrics_file else NULL_METRICS
+profiler = None
+if args.profile == 'true':
+    profiler = Profiler(profile_prefix(output_file)).start()
 
 
 # read the image
-mp_image = mp.Image.create_from_file(input_file)
+with metrics.span('decode'):
+    mp_image = mp.Image.create_from_file(input_file)
 
 # convert the image to the right format for pose recognition (RGB)
-rgb_image = cv2.cvtColor(mp_image.numpy_view(), cv2.COLOR_BGR2RGB)
+with metrics.span('colour_conversion'):
+    rgb_image = cv2.cvtColor(mp_image.numpy_view(), cv2.COLOR_BGR2RGB)
 
 processor = FrameProcessor(
     min_detection_confidence=args.min_detection_confidence,
-    min_tracking_confidence=args.min_tracking_confidence)
+    min_tracking_confidence=args.min_tracking_confidence,
+    model_complexity=args.model_complexity,
+    smooth_landmarks=(args.smooth_landmarks == 'true'),
+    enable_segmentation=(args.enable_segmentation == 'true'))
+processor.metrics = metrics
 
 
 # detect & quantify the pose
@@ -80,15 +120,18 @@ pose = processor.quantify_pose(rgb_image)
 # Draw landmarks on the image itself
 # Returns a copy - the mp_image.numpy_view() is immutable
 # converted_annotated_image = cv2.cvtColor(annotated_image, cv2.COLOR_BGR2RGB)
-rgb_image_with_landmarks = processor.draw_landmarks(pose.image_landmarks,
-                                                    rgb_image)
+with metrics.span('draw_landmarks'):
+    rgb_image_with_landmarks = processor.draw_landmarks(pose.image_landmarks,
+                                                        rgb_image)
 
 # render the body angles to a separate panel
-rgb_panel = processor.render_angles(pose)
+with metrics.span('panel_render'):
+    rgb_panel = processor.render_angles(pose)
 
 # Combine the two images into one
-combined_image = processor.append_image_to_rhs(rgb_image_with_landmarks,
-                                               rgb_panel)
+with metrics.span('composite_panel'):
+    combined_image = processor.append_image_to_rhs(rgb_image_with_landmarks,
+                                                   rgb_panel)
 
 # plot the pose as a connected skeleton in matlib3d if required
 if args.plot_3d == 'matlib':
@@ -112,16 +155,25 @@ elif args.plot_3d == 'inline':
     camera = Camera(image_width=rgb_image.shape[0],
                     image_height=rgb_image.shape[1],
                     )
-    plotter.plot_3d_landmarks_on_image(landmark_list=pose.world_landmarks,
-                                       image=image_3d,
-                                       camera=camera)
+    with metrics.span('plot_3d'):
+        plotter.plot_3d_landmarks_on_image(landmark_list=pose.world_landmarks,
+                                           image=image_3d,
+                                           camera=camera)
 
-    combined_image = processor.append_image_to_bottom_left(
-        combined_image,
-        image_3d)
+    with metrics.span('composite_plot_3d'):
+        combined_image = processor.append_image_to_bottom_left(
+            combined_image,
+            image_3d)
 
 print('writing annotated image to ', args.output_file)
-cv2.imwrite(
-    args.output_file,
-    combined_image
-)
+with metrics.span('encode'):
+    cv2.imwrite(
+        args.output_file,
+        combined_image
+    )
+
+if metrics:
+    metrics.write(args.metrics_file, script='annotate_image.py',
+                  options=vars(args))
+if profiler:
+    print('Profile written to', *profiler.stop())
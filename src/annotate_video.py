@@ -11,22 +11,18 @@ given codec
 # mediapipe - google's toolkit for applying AI to media
 from __future__ import annotations
 import argparse
-import math
 import os
 import sys
 from time import time
 
-import cv2
-import mediapipe as mp
-import numpy as np
+from mt_trainer.live_annotation import annotate_live
+from mt_trainer.metrics import NULL_METRICS, Metrics
+from mt_trainer.profiling import Profiler, profile_prefix
+from mt_trainer.video_annotation import (VideoInfo, annotate_frames,
+                                         annotate_frames_in_shards,
+                                         auto_tune_model_complexity,
+                                         print_debug_line)
 
-from mt_trainer.frame_processor import FrameProcessor
-from mt_trainer.text_rendering import Cv2TextRenderer
-from mt_trainer.pose_classifier import PoseClassifier
-from mt_trainer.graph_plotter import GraphPlotter
-from mt_trainer.layout import Layout
-from mt_trainer.camera import Camera
-from mt_trainer import vector_maths
 
 def default_output_file_path(path):
     """Append -output before the file extension in the given file path"""
@@ -37,22 +33,6 @@ def default_output_file_path(path):
     return out_path
 
 
-def decode_fourcc(four_cc_int_value):
-    """FourCC values from a video file are packed into an int.
-    We need to decode them into four actual characters if we
-    want to re-use them.
-    """
-    return "".join(
-        [chr((int(four_cc_int_value) >> 8 * i) & 0xFF) for i in range(4)]
-    )
-
-
-def print_debug_line(*variables):
-    ''' Writes the given line to STDOUT if in verbose mode, otherwise no-op '''
-    if args.verbose == 'true':
-        sys.stdout.write(' '.join([str(var) for var in variables]))
-
-
 parser = argparse.ArgumentParser(
     prog='landmark_video.py',
     description=(
@@ -92,16 +72,126 @@ parser.add_argument("-s", "--scale", dest='output_scale',
                           "Has no effect if the above width & height values"
                           "are set."))
 parser.add_argument('--plot-3d', '-3d',
-                    dest='plot_3d', default='false', choices=['false', 'true'])
+                    dest='plot_3d', default='true', choices=['false', 'true'])
+parser.add_argument('--text-renderer',
+                    dest='text_renderer',
+                    choices=['cv2', 'glyph-atlas'], default='cv2',
+                    help=("cv2 = draw text with cv2.putText's Hershey font. "
+                          "glyph-atlas = draw each character once, in a "
+                          "TrueType font (see --font), and blend the "
+                          "cached glyphs into each frame"))
+parser.add_argument('--font',
+                    dest='font_file',
+                    type=str, default=None,
+                    help=("TrueType font file for --text-renderer "
+                          "glyph-atlas. Default is Pillow's built-in font"))
+parser.add_argument('--inference-max-side',
+                    dest='inference_max_side',
+                    type=int, default=None,
+                    help=("Shrink frames so their longest side is at most "
+                          "this many pixels before pose inference. The "
+                          "output stays at full resolution. See "
+                          "benchmark_inference.py to choose a value"))
+parser.add_argument('--inference-scale',
+                    dest='inference_scale',
+                    type=int, default=100,
+                    help=("Shrink frames by this many percent before pose "
+                          "inference. Default is 100 (full resolution)"))
+parser.add_argument('--roi',
+                    dest='roi',
+                    choices=['true', 'false'], default='false',
+                    help=("Only run pose inference on the region around the "
+                          "fighter found in the last frame, falling back to "
+                          "the whole frame when the fighter is lost or nears "
+                          "the edge of the region"))
+parser.add_argument('--roi-padding',
+                    dest='roi_padding',
+                    type=float, default=0.25,
+                    help=("With --roi, pad the fighter's bounding box by "
+                          "this fraction of its size on each side"))
+parser.add_argument('-mc', '--model-complexity',
+                    dest='model_complexity',
+                    choices=['0', '1', '2', 'auto'], default='1',
+                    help=("Pose landmark model complexity - higher is more "
+                          "accurate but slower. Default is 1. "
+                          "auto = benchmark each one on the first "
+                          "--auto-tune-frames frames, and use the most "
+                          "accurate which meets --target-fps"))
+parser.add_argument('--target-fps',
+                    dest='target_fps',
+                    type=float, default=None,
+                    help=("Frames per second the whole run needs to "
+                          "annotate, for --model-complexity auto. Default "
+                          "is the frame rate of the input. Each model "
+                          "complexity is benchmarked in one process, so "
+                          "the rate it needs is divided by --processes "
+                          "(up to the number of CPUs) and, with "
+                          "--adaptive-inference, multiplied by the "
+                          "fraction of the benchmark frames it would infer"))
+parser.add_argument('--auto-tune-frames',
+                    dest='auto_tune_frames',
+                    type=int, default=30,
+                    help=("Number of frames to benchmark each model "
+                          "complexity on, for --model-complexity auto"))
+parser.add_argument('--smooth-landmarks',
+                    dest='smooth_landmarks',
+                    choices=['true', 'false'], default='true',
+                    help="Filter landmarks across frames to reduce jitter")
+parser.add_argument('--enable-segmentation',
+                    dest='enable_segmentation',
+                    choices=['true', 'false'], default='false',
+                    help="Also generate a segmentation mask of the person")
 parser.add_argument('-dc', '--min-detection-confidence',
                     dest='min_detection_confidence',
                     type=float, default=0.5)
 parser.add_argument('-tc', '--min-tracking-confidence',
                     dest='min_tracking_confidence',
                     type=float, default=0.5)
+parser.add_argument('--landmark-cache',
+                    dest='landmark_cache',
+                    choices=['true', 'false'], default='true',
+                    help=("Save the pose landmarks detected in each frame to "
+                          "a sidecar file, and replay them on later runs "
+                          "over the same video with the same detection & "
+                          "tracking confidence, instead of running pose "
+                          "inference again"))
+parser.add_argument('--landmark-cache-dir',
+                    dest='landmark_cache_dir',
+                    type=str, default=None,
+                    help=("Directory for the landmark cache and the index "
+                          "of the input file's frames. Default is the "
+                          "directory of the input file"))
 parser.add_argument('-td', '--training-data',
                     dest='training_data_dir',
                     type=str, default='../data/poses/training/')
+parser.add_argument('--training-cache',
+                    dest='training_cache',
+                    choices=['true', 'false'], default='true',
+                    help=("Load the training data from a compiled cache "
+                          "alongside the training data directory, "
+                          "rebuilding it if any training file has changed"))
+parser.add_argument('--training-workers',
+                    dest='training_workers',
+                    type=int, default=None,
+                    help=("Number of processes to parse the training data "
+                          "with, when it isn't cached. Default is one per "
+                          "CPU"))
+parser.add_argument('--classifier',
+                    dest='classifier',
+                    choices=['archetype', 'nearest-neighbour'],
+                    default='archetype',
+                    help=("archetype = compare each pose to the average of "
+                          "each technique's training data. "
+                          "nearest-neighbour = let the most similar "
+                          "training samples vote. Its confidence is the "
+                          "share of the votes weighted by similarity, so "
+                          "may need a lower "
+                          "--classification-confidence-threshold"))
+parser.add_argument('-k', '--neighbours',
+                    dest='neighbours',
+                    type=int, default=5,
+                    help=("Number of training samples which vote, "
+                          "with --classifier nearest-neighbour"))
 
 parser.add_argument('-cct', '--classification-confidence-threshold',
                     dest='classification_confidence_threshold',
@@ -116,264 +206,165 @@ parser.add_argument('-ffc', '--frames-for-classification',
                           "pose classification must persist in order to be"
                           "outputted. Larger values help make the pose"
                           "classification less noisy"))
-
-args = parser.parse_args()
-input_file = args.input_file
-output_file = args.output_file or default_output_file_path(input_file)
-
-classifier = PoseClassifier(data_dir=args.training_data_dir)
-
-# read the input video
-cap = cv2.VideoCapture(input_file)
-if cap.isOpened() is False:
-    print("Error opening video stream or file")
-    raise TypeError
-
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-max_frames = args.max_frames or (int(cap.get(cv2.CAP_PROP_FRAME_COUNT) - args.from_frame))
-output_fps = args.fps or int(cap.get(cv2.CAP_PROP_FPS))
-output_frame_width = args.output_width or int(frame_width * 0.01 * args.output_scale)
-output_frame_height = args.output_height or int(
-    frame_height * 0.01 * args.output_scale)
-
-processor = FrameProcessor(
-    min_detection_confidence=args.min_detection_confidence,
-    min_tracking_confidence=args.min_tracking_confidence)
-
-text_renderer = Cv2TextRenderer()
-
-# need to do this now, so that we can work out the output width for the video
-# 
-# layout:
-#
-# ---------------------------------------------
-# | original video, scaled | body angles & prediction |
-# height is adjusted to the tallest of the above
-# width also includes a few pixels padding between the two panels
-# 
-# if told to plot3d, we append another row on the bottom:
-# | 3d landmarks           | (empty space)            |
-# -----------------------------------------------------
-FONT_SIZE = 12
-annotation_panel = processor.make_panel_for_angles(font_size=FONT_SIZE)
-PADDING = 2
-# panel_width = annotation_panel.shape[1]
-# height_with_annotation = max(output_frame_height, annotation_panel.shape[0])
-# annotated_video_width = output_frame_width + panel_width + PADDING
-
-if args.plot_3d == 'true':
-    panel_3d_size = [output_frame_width, output_frame_height]
-else:
-    panel_3d_size = None
-
-
-layout = Layout(
-    [output_frame_width, output_frame_height],
-    [annotation_panel.shape[1], annotation_panel.shape[0]],
-    panel_3d_size,
-    PADDING,
-)
-
-output_codec = args.codec or decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC))
-
-# output video writer
-out = cv2.VideoWriter(output_file,
-                      cv2.VideoWriter_fourcc(*output_codec),
-                      output_fps,
-                      (layout.total_width, layout.total_height))
-
-if not out.isOpened():
-    print("Error: Could not create the output video file.")
-    cap.release()
-    sys.exit()
-    
-# Create the graph here as it's an expensive operation
-plotter = None
-if args.plot_3d == 'true':
-    plotter = GraphPlotter()
-    camera = Camera(image_width=panel_3d_size[0],
-                    image_height=panel_3d_size[1],
-                    )
-    # rotate the camera at PI/4 radians/sec (=> 8s per full circle)
-    # angular_speed = 0.25 * math.pi
-    angular_speed = 0.0
-
-print_debug_line('writing', max_frames, 
-                 'frames of annotated video to', output_file,
-                 'at', output_fps, 'fps,', 
-                 layout.video_size[0], 'x', layout.video_size[1],
-                 'with codec', output_codec,
-                 ' total size =',
-                 layout.total_width, 'x', layout.total_height)
-print_debug_line('\n\n')
-
-output_frame_number = 1
-last_classification = None
-frames_with_this_classification = 0
-last_3d_render_time = None
-
-while (cap.isOpened() and 
-       (cap.get(cv2.CAP_PROP_POS_FRAMES) <= (args.from_frame + max_frames))):
-    start = time()
-
-    # get frame
-    frame_number = cap.get(cv2.CAP_PROP_POS_FRAMES)
-    ret, input_image = cap.read()
-    if not ret:
-        print("Couldn't read frame ", frame_number, "from", input_file,
-              "aborting!")
-        break
-
-    # Skip if < from_frame
-    if int(frame_number) < args.from_frame:
-        print_debug_line('Skipping frame ',  int(frame_number))
-        sys.stdout.write('\r')
-        sys.stdout.flush()
-        # ignore skip time in calculations of FPS
-        start = time()
-        whole_process_start = time()
-        continue
-
-    print_debug_line('Frame ', frame_number,
-                     ' of ', cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    # process the frame
-    input_image = cv2.cvtColor(input_image, cv2.COLOR_BGR2RGB)
-    input_image.flags.writeable = True
-
-    pose = processor.quantify_pose(input_image)
-
-    panel = processor.make_panel_for_angles(FONT_SIZE)
-
-    # if we didn't detect a pose, say so and skip
-    if not pose:
-        # we'll just output the input image
-        output_image = input_image
-
-        print_debug_line(" No pose detected")
-        sys.stdout.write('\r')
-        sys.stdout.flush()
-        continue
-    else:
-        # draw the landmarks
-        output_image = processor.draw_landmarks(
-            pose.image_landmarks,
-            input_image
-        )
-
-        # render the frame number into the panel
-        text_renderer.render('Frame #' + str(int(output_frame_number)),
-                             panel,
-                             top=FONT_SIZE+2, left=2,
-                             pixel_height=FONT_SIZE,
-                             color=(255, 255, 255))
-
-        # render the body angles into the panel
-        panel = processor.render_angles(
-            pose, panel, top=FONT_SIZE * 2, font_size=FONT_SIZE)
-        
-        # render the pose classification
-        classification = classifier.classify(
-            pose,
-            threshold=args.classification_confidence_threshold,
-            max_results=1
-        )
-        # we get an array back, it might be empty
-        # But if it isn't ....
-        if classification:
-            print_debug_line(classification[0])
-            confidence = classification[0][1]
-            classification = classification[0][0]
-            if classification == last_classification:
-                frames_with_this_classification += 1
-            else:
-                frames_with_this_classification = 1
-                
-            # only output the classification if it's been constant for
-            # at least the required number of frames
-            if frames_with_this_classification >= args.frames_for_classification:    
-                top = panel.shape[0] - (FONT_SIZE + 2)
-                confidence_pct = str(round(100.0 * confidence, 2))
-                prediction = f"Pose: {classification} ({confidence_pct}%)"
-                text_renderer.render(
-                    prediction,
-                    panel,
-                    top=top, left=2,
-                    pixel_height=FONT_SIZE,
-                    color=(255, 255, 255))
-            
-            last_classification = classification
+parser.add_argument('-q', '--queue-size',
+                    dest='queue_size',
+                    type=int, default=8,
+                    help=("Maximum number of frames waiting between each "
+                          "stage of the decode / inference / render / "
+                          "encode pipeline"))
+parser.add_argument('--adaptive-inference',
+                    dest='adaptive_inference',
+                    choices=['true', 'false'], default='false',
+                    help=("Only run pose inference on frames where "
+                          "something has moved since the last inferred "
+                          "frame, and interpolate the poses of the frames "
+                          "in between"))
+parser.add_argument('--motion-threshold',
+                    dest='motion_threshold',
+                    type=float, default=12.0,
+                    help=("With --adaptive-inference, the difference in "
+                          "grey level (0-255) from the last inferred frame "
+                          "above which a pixel counts as changed"))
+parser.add_argument('--motion-area',
+                    dest='motion_area',
+                    type=float, default=0.0005,
+                    help=("With --adaptive-inference, the fraction of the "
+                          "frame which must have changed for it to be "
+                          "inferred - small, so that a small subject moving "
+                          "in a wide shot is still seen. Default is 0.0005"))
+parser.add_argument('--max-stride',
+                    dest='max_stride',
+                    type=int, default=5,
+                    help=("With --adaptive-inference, always infer at "
+                          "least every this many frames"))
+parser.add_argument('--live',
+                    dest='live',
+                    choices=['true', 'false'], default='false',
+                    help=("Annotate input_file live - it may be a camera "
+                          "index (e.g. 0), a stream URL, or a video file, "
+                          "which is replayed at its own frame rate. Frames "
+                          "which can't be processed within "
+                          "--latency-budget are dropped. Only writes an "
+                          "output file if -o is given"))
+parser.add_argument('--latency-budget',
+                    dest='latency_budget',
+                    type=float, default=200,
+                    help=("With --live, drop frames that are already older "
+                          "than this many milliseconds when they could be "
+                          "processed. Default is 200"))
+parser.add_argument('--display',
+                    dest='display',
+                    choices=['true', 'false'], default='true',
+                    help="With --live, show the annotated frames in a window")
+parser.add_argument('--json-lines',
+                    dest='json_lines',
+                    choices=['true', 'false'], default='false',
+                    help=("With --live, print a line of JSON for each "
+                          "frame processed - its latency, angles and "
+                          "prediction"))
+parser.add_argument('-p', '--processes',
+                    dest='processes',
+                    type=int, default=1,
+                    help=("Split the frames into this many shards, and "
+                          "annotate each in a separate process, stitching "
+                          "the results together at the end. Worthwhile "
+                          "for long videos on multi-core machines"))
+parser.add_argument('--warm-up-frames',
+                    dest='warm_up_frames',
+                    type=int, default=15,
+                    help=("When using more than one process, each shard "
+                          "starts this many frames early so that pose "
+                          "tracking and classification have settled by "
+                          "its first output frame"))
+parser.add_argument('--metrics',
+                    dest='metrics_file',
+                    type=str, default=None,
+                    help=("Time each stage of every frame - decode, "
+                          "inference, rendering, encode etc - and write "
+                          "the p50 / p95 / p99 of each to this file, as "
+                          "CSV if it ends in .csv, otherwise JSON"))
+parser.add_argument('--profile',
+                    dest='profile',
+                    choices=['true', 'false'], default='false',
+                    help=("Profile the run, writing "
+                          "<output>.profile.pstats (cProfile of the main "
+                          "thread, for python -m pstats / snakeviz), "
+                          "<output>.profile.folded (sampled stacks of "
+                          "every thread, including each pipeline stage - "
+                          "for flamegraph.pl / speedscope) and "
+                          "<output>.profile.memory.txt (the allocations "
+                          "which grew the most per frame). With -p, each "
+                          "worker is profiled into "
+                          "<output>.profile.shard-<n>.* too"))
+
+# guarded, as worker processes import this module when sharding
+if __name__ == '__main__':
+    args = parser.parse_args()
+    input_file = args.input_file
+    metrics = Metrics() if args.metrics_file else NULL_METRICS
+
+    if args.live == 'true':
+        profiler = None
+        if args.profile == 'true':
+            profiler = Profiler(profile_prefix(args.output_file or 'live')).start()
+        try:
+            annotate_live(args, args.output_file, metrics=metrics,
+                          profiler=profiler)
+        except IOError as error:
+            print("Error:", error)
+            sys.exit(1)
+        finally:
+            if profiler:
+                print('Profile written to', *profiler.stop())
+        if metrics:
+            metrics.write(args.metrics_file, script='annotate_video.py',
+                          options=vars(args))
+        sys.exit(0)
+
+    output_file = args.output_file or default_output_file_path(input_file)
+
+    info = VideoInfo(input_file)
+    max_frames = args.max_frames or (info.frame_count - args.from_frame)
+    stop_frame = min(args.from_frame + max_frames, info.frame_count)
+
+    profiler = None
+    if args.profile == 'true':
+        profiler = Profiler(profile_prefix(output_file)).start()
+
+    whole_process_start = time()
+    try:
+        if args.model_complexity == 'auto':
+            args.target_fps = args.target_fps or info.fps
+            args.model_complexity = str(
+                auto_tune_model_complexity(args, args.from_frame))
+        if args.processes > 1:
+            frames_written = annotate_frames_in_shards(
+                args, output_file, args.from_frame, stop_frame,
+                processes=args.processes,
+                warm_up_frames=args.warm_up_frames,
+                metrics=metrics,
+                profile_prefix=profiler.prefix if profiler else None)
         else:
-            print_debug_line(
-                "doesn't match any known pose by at least",
-                f"{round(args.classification_confidence_threshold, 2)}%"
-            )
-            
-    # resize the frame if needed
-    if output_frame_width != frame_width or output_frame_height != frame_height:
-        # Resize the frame
-        dim = (output_frame_width, output_frame_height)
-        output_image = cv2.resize(
-            output_image, dim, interpolation=cv2.INTER_AREA)
-
-    # combine the landmarked image and annotation panel into one
-    output_image_with_panel = processor.append_image_to_rhs(output_image, panel)
-    
-    # plot the pose as a connected skeleton in matlib3d if required
-    if args.plot_3d == 'true':
-        image_3d = np.zeros((layout.video_size[1],
-                             layout.video_size[0],
-                             3),
-                            np.uint8
-                            )
-        # white background
-        image_3d.fill(255)
-        
-        start = time()
-        # rotate the camera around the y axis
-        if False and last_3d_render_time:
-            rotation_angle = (angular_speed * (time() - last_3d_render_time))
-            camera.rotation_vector[2] = 2
-            camera.rotation_vector[1] = camera.rotation_vector[1] + rotation_angle
-            print_debug_line( 'rotation_angle is ', rotation_angle )
-            print_debug_line( 'Camera position is ', camera.position )
-            
-        plotter.plot_3d_landmarks_on_image(landmark_list=pose.world_landmarks,
-                                           image=image_3d,
-                                           camera=camera)
-        print_debug_line(' Plotted 3d landmarks in ', str(round(time() - start, 4)) + 's')
-        
-        last_3d_render_time = time()
-        
-        start = time()
-        output_image_with_panel = processor.append_image_to_bottom_left(
-            output_image_with_panel,
-            image_3d)
-        print_debug_line(' appended image in ', str(round(time() - start, 4)) + 's')
-
-    # write the frame out
-    out.write(cv2.cvtColor(output_image_with_panel, cv2.COLOR_RGB2BGR))
-    output_frame_number += 1
-
-    print_debug_line(' - Total frame time', str(round(time() - start, 4)) + 's')
-
-    # wind the stdout buffer back a line if needed & flush
-    if args.verbose == 'true':
-        sys.stdout.write('\r')
-        sys.stdout.flush()
-
-whole_process_time = time() - whole_process_start
-print_debug_line('\nProcessed', output_frame_number, 
-                 'frames in ', str(round(whole_process_time, 2)) + 's',
-                 '=>', round(output_frame_number / whole_process_time, 2), 'fps')
-# cleanup
-processor.pose_landmarker.close()
-if plotter:
-    plotter.cleanup()
-cap.release()
-out.release()
-
-# print output file
-print('\n')
-print(output_file, ' - ', os.path.getsize(output_file), ' bytes')
+            frames_written = annotate_frames(
+                args, output_file, args.from_frame, stop_frame,
+                metrics=metrics, profiler=profiler)
+    except IOError as error:
+        print("Error:", error)
+        sys.exit(1)
+    finally:
+        if profiler:
+            print('Profile written to', *profiler.stop())
+    whole_process_time = time() - whole_process_start
+
+    print_debug_line(args, '\nProcessed', frames_written, 
+                     'frames in ', str(round(whole_process_time, 2)) + 's',
+                     '=>', round(frames_written / whole_process_time, 2), 'fps')
+    if metrics:
+        metrics.write(args.metrics_file, script='annotate_video.py',
+                      options=vars(args), frames_written=frames_written,
+                      fps=frames_written / whole_process_time)
+        print_debug_line(args, '\n' + metrics.summary(), '\n')
+
+    # print output file
+    print('\n')
+    print(output_file, ' - ', os.path.getsize(output_file), ' bytes')
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+""" benchmark_hot_paths.py
+Times the hot paths of mt_trainer - angle calculation, classification,
+saving & loading poses, 3D projection & plotting, panel rendering and
+compositing - on synthetic landmarks, and compares them to a baseline
+saved by an earlier run, reporting anything which has got slower or
+faster by more than the tolerance.
+Exits with status 1 if anything has got slower
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from mt_trainer.micro_benchmark import (DEFAULT_TOLERANCE, compare_to_baseline,
+                                        hot_path_benchmarks, load_baseline,
+                                        run_benchmarks, save_baseline)
+
+parser = argparse.ArgumentParser(
+    prog='benchmark_hot_paths.py',
+    description=(
+        "Times the hot paths of mt_trainer on synthetic landmarks, and "
+        "compares them to a saved baseline")
+    )
+
+parser.add_argument('-b', '--baseline',
+                    dest='baseline_file',
+                    type=str, default='hot-path-baseline.json',
+                    help=("Baseline file to compare to, or save to with "
+                          "--save-baseline. Default is "
+                          "hot-path-baseline.json"))
+parser.add_argument('--save-baseline',
+                    dest='save_baseline',
+                    choices=['true', 'false'], default='false',
+                    help="Save the results as the new baseline")
+parser.add_argument('-t', '--tolerance',
+                    dest='tolerance',
+                    type=float, default=DEFAULT_TOLERANCE,
+                    help=("Fraction by which a benchmark can be slower or "
+                          "faster than its baseline before it's reported. "
+                          f"Default is {DEFAULT_TOLERANCE}"))
+parser.add_argument('-r', '--repeat',
+                    dest='repeat',
+                    type=int, default=7,
+                    help="Number of times to time each benchmark. Default is 7")
+parser.add_argument('-k', '--only',
+                    dest='only',
+                    type=str, nargs='*', default=None,
+                    help=("Only run the benchmarks whose names contain any "
+                          "of these, e.g. -k classify Camera"))
+
+args = parser.parse_args()
+
+with tempfile.TemporaryDirectory(prefix='mt-trainer-benchmark-') as work_dir:
+    results = run_benchmarks(hot_path_benchmarks(work_dir),
+                             repeat=args.repeat,
+                             names=args.only)
+
+if args.save_baseline == 'true':
+    save_baseline(args.baseline_file, results)
+    for name, result in results.items():
+        print(f"{name}: {result['median_us']:.1f}us")
+    print('Saved baseline to', args.baseline_file)
+    sys.exit(0)
+
+if not os.path.exists(args.baseline_file):
+    for name, result in results.items():
+        print(f"{name}: {result['median_us']:.1f}us")
+    print('No baseline at', args.baseline_file,
+          '- run again with --save-baseline true to save one')
+    sys.exit(0)
+
+comparisons = compare_to_baseline(results, load_baseline(args.baseline_file),
+                                  tolerance=args.tolerance)
+for comparison in comparisons:
+    print(comparison)
+
+regressions = [comparison for comparison in comparisons if comparison.regressed]
+if regressions:
+    print(len(regressions), 'benchmark(s) slower than the baseline by more than',
+          f"{100.0 * args.tolerance:.0f}%")
+    sys.exit(1)
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+""" benchmark_inference.py
+Runs pose inference on frames of the given video at full resolution, and
+again at each of the given reduced inference resolutions, and reports how
+fast each one is and how far the body angles drift from those found at
+full resolution - to help choose --inference-max-side / --inference-scale
+for annotate_video.py for a given camera
+"""
+import argparse
+import sys
+
+from mt_trainer.inference_benchmark import benchmark_inference
+from mt_trainer.metrics import NULL_METRICS, Metrics
+from mt_trainer.video_source import VideoSource
+
+
+def int_list(string):
+    return [int(s) for s in string.split(',') if s.strip()]
+
+
+parser = argparse.ArgumentParser(
+    prog='benchmark_inference.py',
+    description=(
+        "Compares the speed and angle accuracy of pose inference at "
+        "reduced resolutions against full-resolution inference, on frames "
+        "of the given video file")
+    )
+
+parser.add_argument('input_file')
+parser.add_argument('-f', '--from-frame',
+                    dest='from_frame',
+                    type=int, default=0)
+parser.add_argument('-n', '--frames',
+                    dest='frames',
+                    type=int, default=100,
+                    help="Number of frames to benchmark on. Default is 100")
+parser.add_argument('--max-sides',
+                    dest='max_sides',
+                    type=int_list, default=[1280, 960, 640, 480, 320],
+                    help=("Comma-separated list of --inference-max-side "
+                          "values to try. Default is 1280,960,640,480,320"))
+parser.add_argument('--scales',
+                    dest='scales',
+                    type=int_list, default=[],
+                    help=("Comma-separated list of --inference-scale "
+                          "percentages to try, e.g. 75,50,25"))
+parser.add_argument('-dc', '--min-detection-confidence',
+                    dest='min_detection_confidence',
+                    type=float, default=0.5)
+parser.add_argument('-tc', '--min-tracking-confidence',
+                    dest='min_tracking_confidence',
+                    type=float, default=0.5)
+parser.add_argument('-mc', '--model-complexity',
+                    dest='model_complexity',
+                    type=int, default=1, choices=[0, 1, 2],
+                    help=("Pose landmark model complexity - higher is more "
+                          "accurate but slower. Default is 1"))
+parser.add_argument('--smooth-landmarks',
+                    dest='smooth_landmarks',
+                    choices=['true', 'false'], default='true',
+                    help="Filter landmarks across frames to reduce jitter")
+parser.add_argument('--enable-segmentation',
+                    dest='enable_segmentation',
+                    choices=['true', 'false'], default='false',
+                    help="Also generate a segmentation mask of the person")
+parser.add_argument('--metrics',
+                    dest='metrics_file',
+                    type=str, default=None,
+                    help=("Write the p50 / p95 / p99 inference time per "
+                          "frame of each setting to this file, as CSV if it "
+                          "ends in .csv, otherwise JSON"))
+
+args = parser.parse_args()
+metrics = Metrics() if args.metrics_file else NULL_METRICS
+
+source = VideoSource(args.input_file)
+frames = [frame for _, frame in source.frames(args.from_frame,
+                                               args.from_frame + args.frames)]
+source.release()
+if not frames:
+    print("Couldn't read any frames from", args.input_file)
+    sys.exit(1)
+
+height, width = frames[0].shape[0:2]
+print('Benchmarking inference on', len(frames), 'frames of',
+      args.input_file, '-', width, 'x', height)
+
+settings = {
+    'min_detection_confidence': args.min_detection_confidence,
+    'min_tracking_confidence': args.min_tracking_confidence,
+    'model_complexity': args.model_complexity,
+    'smooth_landmarks': args.smooth_landmarks == 'true',
+    'enable_segmentation': args.enable_segmentation == 'true',
+}
+candidates = {}
+for max_side in args.max_sides:
+    if max_side < max(width, height):
+        candidates[f"--inference-max-side {max_side}"] = \
+            dict(settings, inference_max_side=max_side)
+for scale in args.scales:
+    if scale < 100:
+        candidates[f"--inference-scale {scale}"] = \
+            dict(settings, inference_scale=scale / 100.0)
+
+reference, results = benchmark_inference(frames, candidates, settings,
+                                         metrics=metrics)
+print(reference.summary().replace('reference', 'full resolution', 1))
+for result in results:
+    print(result)
+if metrics:
+    metrics.write(args.metrics_file, script='benchmark_inference.py',
+                  options=vars(args), frame_width=width, frame_height=height)
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+""" benchmark_throughput.py
+Runs the whole annotate_video.py pipeline over each of the given videos -
+or a synthetic video at each of the given resolutions - for each
+combination of --plot-3d, output scale and codec - once with real
+MediaPipe inference, and once with a stand-in that replays canned
+landmarks - reporting the frames per second, the cost per frame of each
+stage, and the peak RSS of each run. The difference between the two
+shows how much of the frame budget goes on inference, and how much on
+our own rendering & I/O. MediaPipe finds no pose in the synthetic
+videos, so only the stand-in is run on them unless asked for
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+from annotate_video import parser as annotate_video_parser
+from mt_trainer.throughput_benchmark import (BACKENDS, output_extension,
+                                             run_in_fresh_process, summary,
+                                             write_synthetic_video)
+
+
+def string_list(string):
+    return [s.strip() for s in string.split(',') if s.strip()]
+
+
+def int_list(string):
+    return [int(s) for s in string_list(string)]
+
+
+def resolution_list(string):
+    return [tuple(int(n) for n in s.lower().split('x'))
+            for s in string_list(string)]
+
+
+parser = argparse.ArgumentParser(
+    prog='benchmark_throughput.py',
+    description=(
+        "Measures the end-to-end throughput of the annotate_video.py "
+        "pipeline on synthetic videos, with and without real pose "
+        "inference")
+    )
+
+parser.add_argument('-n', '--frames',
+                    dest='frames',
+                    type=int, default=120,
+                    help="Number of frames of each video to annotate. Default is 120")
+parser.add_argument('--videos',
+                    dest='videos',
+                    type=string_list, default=[],
+                    help=("Comma-separated list of videos of a person to "
+                          "benchmark, instead of synthetic ones"))
+parser.add_argument('--resolutions',
+                    dest='resolutions',
+                    type=resolution_list, default=[(640, 360), (1280, 720), (1920, 1080)],
+                    help=("Comma-separated list of WIDTHxHEIGHT resolutions "
+                          "of synthetic videos, without --videos. Default "
+                          "is 640x360,1280x720,1920x1080"))
+parser.add_argument('--plot-3d',
+                    dest='plot_3d',
+                    type=string_list, default=['true', 'false'],
+                    help="Comma-separated --plot-3d values. Default is true,false")
+parser.add_argument('--scales',
+                    dest='scales',
+                    type=int_list, default=[100, 50],
+                    help="Comma-separated output --scale percentages. Default is 100,50")
+parser.add_argument('--codecs',
+                    dest='codecs',
+                    type=string_list, default=['mp4v'],
+                    help="Comma-separated output codecs. Default is mp4v")
+parser.add_argument('--backends',
+                    dest='backends',
+                    type=string_list, default=None,
+                    help=("Comma-separated pose backends - fake (replay "
+                          "canned landmarks) and/or mediapipe. Default is "
+                          "both with --videos, otherwise just fake - as "
+                          "MediaPipe finds no pose in synthetic videos, "
+                          "so would write no frames"))
+parser.add_argument('-td', '--training-data',
+                    dest='training_data_dir',
+                    type=str, default='../data/poses/training/')
+parser.add_argument('-o', '--output-file',
+                    dest='output_file',
+                    type=str, default=None,
+                    help=("Also write every result to this file, as CSV if "
+                          "it ends in .csv, otherwise JSON"))
+
+# guarded, as each run is in a spawned process, which imports this module
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    backends = args.backends or (list(BACKENDS) if args.videos else ['fake'])
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='mt-trainer-throughput-') as work_dir:
+        video_files = list(args.videos) or [
+            write_synthetic_video(
+                os.path.join(work_dir, f"synthetic-{width}x{height}.mp4"),
+                width, height, args.frames)
+            for width, height in args.resolutions]
+
+        for video_file in video_files:
+            for plot_3d, scale, codec, backend in itertools.product(
+                    args.plot_3d, args.scales, args.codecs, backends):
+                output_file = os.path.join(
+                    work_dir, f"output{output_extension(codec)}")
+                options = annotate_video_parser.parse_args([
+                    video_file,
+                    '-o', output_file,
+                    '--plot-3d', plot_3d,
+                    '--scale', str(scale),
+                    '--codec', codec,
+                    '--landmark-cache', 'false',
+                    '--training-data', args.training_data_dir,
+                ])
+                try:
+                    result = run_in_fresh_process(options, backend, args.frames)
+                except ValueError as e:
+                    sys.exit(f"benchmark_throughput.py: {e}")
+                result.update({
+                    'video': os.path.basename(video_file),
+                    'plot_3d': plot_3d,
+                    'scale': scale,
+                    'codec': codec,
+                    'backend': backend,
+                })
+                results.append(result)
+                print(f"{result['video']} --plot-3d {plot_3d} --scale {scale} "
+                      f"--codec {codec} [{backend}]: {summary(result)}")
+
+    if args.output_file:
+        if args.output_file.lower().endswith('.csv'):
+            stages = sorted({name for result in results
+                             for name in result['stage_ms_per_frame']})
+            columns = (['video', 'plot_3d', 'scale', 'codec', 'backend',
+                        'frames', 'seconds', 'fps', 'peak_rss_mb', 'output_bytes'] +
+                       [f"{name}_ms" for name in stages])
+            with open(args.output_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+                writer.writeheader()
+                for result in results:
+                    writer.writerow(dict(result, **{
+                        f"{name}_ms": ms
+                        for name, ms in result['stage_ms_per_frame'].items()}))
+        else:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        print('Results written to', args.output_file)
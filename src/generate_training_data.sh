@@ -19,5 +19,5 @@ do
     echo "directory: $directory"
     technique=$(basename $directory)
     mkdir -p $OUTPUT_DIR/$technique
-    ./tag_image.py -o $OUTPUT_DIR -t $technique $directory/*
+    ./tag_image.py -o $OUTPUT_DIR -t $technique "$directory"
 done
\ No newline at end of file
@@ -0,0 +1,141 @@
+'''
+  Adaptive, motion-gated pose inference - only running inference on
+  frames where something has moved since the last inferred frame, and
+  interpolating the poses of the frames in between.
+'''
+import cv2
+import numpy as np
+
+from mt_trainer.pipeline import Batch
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+class MotionGate:
+    '''
+      Decides whether a frame needs inference, by comparing a small
+      greyscale thumbnail of it to that of the last frame which was
+      inferred, and counting the pixels which changed - so that a small
+      subject moving in a wide shot counts, however little of the frame
+      it covers, while noise spread thinly over the whole frame doesn't.
+
+      threshold    - difference in grey level (0-255) above which a
+                     thumbnail pixel counts as changed
+      min_changed  - fraction of the thumbnail's pixels which must have
+                     changed for a frame to be inferred
+      max_stride   - a frame is always inferred if this many frames have
+                     passed since the last one, to bound the drift
+      thumbnail_width - width in pixels of the thumbnails compared (at
+                     most that of the frames)
+    '''
+    def __init__(self, threshold=12.0, min_changed=0.0005, max_stride=5,
+                 thumbnail_width=128):
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.max_stride = max(1, max_stride)
+        self.thumbnail_width = thumbnail_width
+        self.last_thumbnail = None
+        self.frames_since_inferred = 0
+
+    def thumbnail(self, image):
+        height, width = image.shape[0:2]
+        thumbnail_width = min(self.thumbnail_width, width)
+        size = (thumbnail_width,
+                max(1, int(round(height * thumbnail_width / width))))
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def motion(self, thumbnail):
+        '''
+          Fraction of the thumbnail's pixels whose grey level differs from
+          that of the last inferred frame by more than threshold
+        '''
+        difference = cv2.absdiff(thumbnail, self.last_thumbnail)
+        return np.count_nonzero(difference > self.threshold) / difference.size
+
+    def should_infer(self, image):
+        '''
+          True if the given frame should be inferred - and if so, it
+          becomes the frame that later ones are compared to
+        '''
+        thumbnail = self.thumbnail(image)
+        self.frames_since_inferred += 1
+        if (self.last_thumbnail is None or
+                self.frames_since_inferred >= self.max_stride or
+                self.motion(thumbnail) > self.min_changed):
+            self.last_thumbnail = thumbnail
+            self.frames_since_inferred = 0
+            return True
+        return False
+
+
+class AdaptiveInference:
+    '''
+      A pipeline stage which takes (frame number, image) and passes on
+      (frame number, image, pose) - running infer(frame_number, image)
+      only on the frames that the MotionGate picks.
+
+      Frames which are skipped are held back until the next inferred
+      frame, then passed on with their poses interpolated between those
+      of the inferred frames either side, so frames come out in order
+      but up to max_stride frames late. At the end of the stream, the
+      last frame held back is inferred, so that the others still have
+      a pose to interpolate towards
+
+      inferred / interpolated - counts of frames of each kind so far
+    '''
+    def __init__(self, infer, gate=None):
+        self.infer = infer
+        self.gate = gate or MotionGate()
+        self.last_inferred = None
+        self.pending = []
+        self.inferred = 0
+        self.interpolated = 0
+
+    @property
+    def inference_ratio(self):
+        ''' Fraction of the frames so far which were actually inferred '''
+        total = self.inferred + self.interpolated
+        return self.inferred / total if total else 0.0
+
+    def __call__(self, item):
+        frame_number, image = item
+        if not self.gate.should_infer(image):
+            self.pending.append(item)
+            return Batch()
+        return self.release(frame_number, image)
+
+    def flush(self):
+        ''' Release any frames still held back at the end of the stream '''
+        if not self.pending:
+            return Batch()
+        frame_number, image = self.pending.pop()
+        return self.release(frame_number, image)
+
+    def release(self, frame_number, image):
+        '''
+          Infer the pose of the given frame, and return it after all the
+          frames held back before it, with their poses interpolated
+        '''
+        pose = self.infer(frame_number, image)
+        self.inferred += 1
+        batch = Batch()
+        if self.pending:
+            start_frame, start_pose = self.last_inferred or \
+                (self.pending[0][0] - 1, None)
+            for pending_frame, pending_image in self.pending:
+                fraction = (pending_frame - start_frame) / (frame_number - start_frame)
+                batch.append((pending_frame, pending_image,
+                              QuantifiedPose.interpolate(start_pose, pose,
+                                                         fraction)))
+            self.interpolated += len(self.pending)
+            self.pending = []
+        batch.append((frame_number, image, pose))
+        self.last_inferred = (frame_number, pose)
+        return batch
+
+    def summary(self):
+        return (f"inference run on {self.inferred} frames, interpolated for "
+                f"{self.interpolated} - an inference ratio of "
+                f"{100.0 * self.inference_ratio:.1f}%")
@@ -0,0 +1,59 @@
+'''
+  Vectorised calculation of body angles from pose landmarks
+'''
+import numpy as np
+
+
+def landmarks_to_array(landmark_list):
+    '''
+      Convert the given MediaPipe LandmarkList (or plain list of landmarks)
+      to an (n, 3) array of x, y, z co-ordinates
+    '''
+    landmarks = getattr(landmark_list, 'landmark', landmark_list)
+    return np.array([(l.x, l.y, l.z) for l in landmarks], dtype=np.float64)
+
+
+class AngleEngine:
+    '''
+      Calculates a fixed set of angles from an array of landmark
+      co-ordinates.
+
+      Each angle is defined by a triplet of landmark indices (a, b, c) -
+      it's the angle at b between the vectors b->c and b->a.
+      The triplets are stored as index arrays, so that all the angles
+      can be calculated with a handful of numpy operations.
+    '''
+    def __init__(self, angle_landmarks):
+        '''
+          angle_landmarks - dict of angle name => (a, b, c) landmark indices.
+          The angles are always returned in the order of this dict
+        '''
+        self.names = tuple(angle_landmarks.keys())
+        triplets = np.array(list(angle_landmarks.values()), dtype=np.intp)
+        self.ends = triplets[:, 0]
+        self.vertices = triplets[:, 1]
+        self.starts = triplets[:, 2]
+
+    def calculate(self, landmarks):
+        '''
+          Return the angles, in degrees, for the given landmark co-ordinates.
+          landmarks can be a single pose - shape (33, 3) - giving an array
+          of shape (n_angles,), or a stack of poses - shape (N, 33, 3) -
+          giving an array of shape (N, n_angles)
+        '''
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        vertices = landmarks[..., self.vertices, :]
+        vector1 = landmarks[..., self.starts, :] - vertices
+        vector2 = landmarks[..., self.ends, :] - vertices
+
+        dot = np.einsum('...ij,...ij->...i', vector1, vector2)
+        mod1mod2 = (np.linalg.norm(vector1, axis=-1) *
+                    np.linalg.norm(vector2, axis=-1))
+        # rounding errors can push the cosine just outside [-1, 1]
+        cosines = np.clip(dot / mod1mod2, -1.0, 1.0)
+
+        return np.degrees(np.arccos(cosines))
+
+    def calculate_dict(self, landmarks):
+        ''' As calculate(), but for a single pose, as a dict of name => angle '''
+        return dict(zip(self.names, self.calculate(landmarks).tolist()))
@@ -0,0 +1,118 @@
+import cv2
+
+from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.text_rendering import Cv2TextRenderer
+
+
+class AnnotationPanel:
+    '''
+      The panel of frame number, body angles & pose classification that
+      goes alongside each annotated frame:
+
+      Frame #123
+      left_ankle_extension           97
+      ...
+      right_shoulder_elevation       12
+
+      Pose: jab (98.7%)
+
+      The labels never change, so they're rendered once into a template.
+      The panel image is re-used for every frame - only the parts of it
+      that were written to for the last frame are restored from the
+      template before the next one is rendered.
+
+      Renders the same image as FrameProcessor.render_angles et al
+    '''
+    def __init__(self,
+                 processor,
+                 font_size=12,
+                 text_renderer=None,
+                 color=(255, 255, 255),
+                 thickness=1,
+                 value_font_face=cv2.FONT_HERSHEY_DUPLEX):
+        '''
+          value_font_face - the font which the angle values are measured
+                            in, to right-align them
+        '''
+        self.font_size = font_size
+        self.text_renderer = text_renderer or Cv2TextRenderer()
+        self.color = color
+        self.thickness = thickness
+        self.value_font_face = value_font_face
+
+        self.template = processor.make_panel_for_angles(font_size=font_size)
+        self.height, self.width = self.template.shape[0:2]
+
+        # same positions as FrameAnnotator & FrameProcessor.render_angles
+        self.frame_number_top = font_size + 2
+        first_label_top = font_size * 2 + font_size
+        self.label_tops = [first_label_top + i * (font_size + 2)
+                           for i in range(len(QuantifiedPose.ANGLE_NAMES))]
+        self.prediction_top = self.height - (font_size + 2)
+
+        for label, top in zip(QuantifiedPose.ANGLE_NAMES, self.label_tops):
+            self.text_renderer.render(label,
+                                      self.template,
+                                      top=top,
+                                      left=0,
+                                      pixel_height=font_size,
+                                      color=color,
+                                      thickness=thickness)
+
+        self.image = self.template.copy()
+        # (top, bottom, left, right) of each region drawn on since the
+        # image was last a copy of the template
+        self.dirty_regions = []
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    def clear(self):
+        ''' Restore every region drawn on since the last clear() '''
+        for top, bottom, left, right in self.dirty_regions:
+            self.image[top:bottom, left:right] = \
+                self.template[top:bottom, left:right]
+        self.dirty_regions = []
+
+    def render_text(self, string, top, left):
+        ''' Render the given string, and remember where it was drawn '''
+        box_top, box_bottom, box_left, box_right = self.text_renderer.text_box(
+            string, top=top, left=left,
+            pixel_height=self.font_size, thickness=self.thickness)
+        self.dirty_regions.append((max(0, box_top), max(0, box_bottom),
+                                   max(0, box_left), max(0, box_right)))
+        self.text_renderer.render(string,
+                                  self.image,
+                                  top=top,
+                                  left=left,
+                                  pixel_height=self.font_size,
+                                  color=self.color,
+                                  thickness=self.thickness)
+
+    def render(self, pose, frame_number, prediction=None):
+        '''
+          Render the given frame number, the angles of the given
+          QuantifiedPose, and the prediction (if any) into the panel.
+          Returns the panel image - which is overwritten by the next call
+          to render(), so copy it if it needs to outlive that
+        '''
+        self.clear()
+        self.render_text('Frame #' + str(int(frame_number)),
+                         top=self.frame_number_top, left=2)
+
+        for top, value in zip(self.label_tops, pose.rounded_angles().values()):
+            # right-aligned by the width of the value as a float, as
+            # FrameProcessor.render_angles does
+            value_width = self.text_renderer.pixel_width(
+                str(value),
+                self.font_size,
+                font_face=self.value_font_face,
+                thickness=self.thickness)
+            self.render_text(str(int(value)),
+                             top=top, left=self.width - value_width)
+
+        if prediction:
+            self.render_text(prediction, top=self.prediction_top, left=2)
+
+        return self.image
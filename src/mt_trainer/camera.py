@@ -2,7 +2,7 @@ import numpy as np
 import cv2
 
 class Camera:
-  
+
     def __init__(self,
                  focal_length: int = 400,
                  image_width: int = 640,
@@ -15,27 +15,42 @@ class Camera:
         self.image_height = image_height
         self.position = position
         self.rotation_vector = rotation_vector
+        # (key, matrix) - rebuilt only if the focal length or image size
+        # change
+        self._intrinsics = (None, None)
 
     def intrinsic_matrix(self):
-        intrinsic_matrix = np.array([ 
-            [self.focal_length, 0, self.image_width/2], 
-            [0, self.focal_length, self.image_height/2], 
-            [0, 0, 1] 
-        ])
+        key = (self.focal_length, self.image_width, self.image_height)
+        cached_key, intrinsic_matrix = self._intrinsics
+        if cached_key != key:
+            intrinsic_matrix = np.array([
+                [self.focal_length, 0, self.image_width/2],
+                [0, self.focal_length, self.image_height/2],
+                [0, 0, 1]
+            ])
+            self._intrinsics = (key, intrinsic_matrix)
         return intrinsic_matrix
-    
-    def project_3d_point(self, point):
-        projected_point = cv2.projectPoints(point, 
-                                   self.rotation_vector, self.position.reshape(-1, 1),
-                                   self.intrinsic_matrix(), 
+
+    def project_points_array(self, points):
+        '''
+          Project the given (n, 3) array of 3d points onto the image, in
+          one call to cv2.projectPoints.
+          Returns an (n, 2) int32 array of image-space 2d points
+        '''
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        if len(points) == 0:
+            return np.zeros((0, 2), np.int32)
+        projected_points, _ = cv2.projectPoints(points,
+                                   self.rotation_vector,
+                                   np.asarray(self.position, dtype=np.float32),
+                                   self.intrinsic_matrix(),
                                    None)
-      
-        # cv2.projectPoints returns a complicated array of arrays
-        # we only want the first element (the projected point)
-        projected_point = projected_point[0].flatten()
+        # cv2.projectPoints returns an (n, 1, 2) array
+        return np.rint(projected_points.reshape(-1, 2)).astype(np.int32)
+
+    def project_3d_point(self, point):
+        projected_point = self.project_points_array([point])[0]
+        return (int(projected_point[0]), int(projected_point[1]))
 
-        return ( int(round(projected_point[0], 0)),
-          int(round(projected_point[1], 0)) )
-    
     def project_3d_points(self, points):
-        return [self.project_3d_point(x) for x in points]
+        return [(int(x), int(y)) for x, y in self.project_points_array(points)]
@@ -0,0 +1,153 @@
+import cv2
+
+from mt_trainer.annotation_panel import AnnotationPanel
+from mt_trainer.layout import Layout
+from mt_trainer.metrics import NULL_METRICS
+from mt_trainer.text_rendering import Cv2TextRenderer
+
+
+class FrameAnnotator:
+    '''
+      Turns a frame and the QuantifiedPose detected in it into one
+      annotated output frame:
+
+      -----------------------------------------------------
+      | video, with landmarks  | frame no, body angles    |
+      |                        | & pose classification    |
+      | 3d landmarks (optional)| (empty space)            |
+      -----------------------------------------------------
+
+      Keeps track of how many successive frames have had the same pose
+      classification, so frames must be passed to annotate() in order
+
+      Each part is drawn straight into its region of an output frame
+      allocated up front by the layout. There are canvas_count of them,
+      used in turn - so a frame returned by annotate() is only valid
+      until canvas_count more frames have been annotated
+
+      If given Metrics, each part is timed - as composite_video,
+      draw_landmarks, classification, panel_render, composite_panel and
+      plot_3d spans
+    '''
+    def __init__(self,
+                 processor,
+                 classifier,
+                 layout,
+                 font_size=12,
+                 classification_confidence_threshold=0.98,
+                 frames_for_classification=3,
+                 plotter=None,
+                 camera=None,
+                 text_renderer=None,
+                 canvas_count=1,
+                 metrics=None):
+        self.processor = processor
+        self.classifier = classifier
+        self.layout = layout
+        self.font_size = font_size
+        self.classification_confidence_threshold = \
+            classification_confidence_threshold
+        self.frames_for_classification = frames_for_classification
+        self.plotter = plotter
+        self.camera = camera
+        self.text_renderer = text_renderer or Cv2TextRenderer()
+        self.panel = AnnotationPanel(processor,
+                                     font_size=font_size,
+                                     text_renderer=self.text_renderer)
+
+        self.canvases = layout.canvases(canvas_count)
+        self.metrics = metrics or NULL_METRICS
+
+        self.output_frame_number = 1
+        # the prediction shown on the last frame annotated, if any
+        self.last_prediction = None
+        self.last_classification = None
+        self.frames_with_this_classification = 0
+
+    def annotate(self, image, pose, frame_number=None):
+        '''
+          Return the annotated output frame for the given image and the
+          pose detected in it, or None if no pose was detected.
+          The output frame is in the same colour order as the image -
+          so give it BGR frames to get frames ready for cv2.VideoWriter.
+          frame_number is shown in the panel - if not given, it's the
+          number of frames annotated so far
+        '''
+        if not pose:
+            return None
+
+        metrics = self.metrics
+        canvas = next(self.canvases)
+        video = self.layout.video_view(canvas)
+
+        # scale the frame straight into the canvas, then draw the
+        # landmarks on it there - at output resolution, with no copy
+        output_height, output_width = video.shape[0:2]
+        with metrics.span('composite_video'):
+            if image.shape[0:2] == (output_height, output_width):
+                video[...] = image
+            else:
+                cv2.resize(image,
+                           (output_width, output_height),
+                           dst=video,
+                           interpolation=cv2.INTER_AREA)
+        with metrics.span('draw_landmarks'):
+            self.processor.draw_landmarks(pose.image_landmarks, video,
+                                          output_image=video)
+
+        # render the frame number, body angles & prediction into the panel
+        if frame_number is None:
+            frame_number = self.output_frame_number
+        with metrics.span('classification'):
+            self.last_prediction = self.prediction_for(pose)
+        with metrics.span('panel_render'):
+            panel = self.panel.render(pose, frame_number, self.last_prediction)
+        with metrics.span('composite_panel'):
+            self.layout.annotation_panel_view(canvas)[...] = panel
+
+        # plot the pose as a connected skeleton if required
+        if self.plotter:
+            with metrics.span('plot_3d'):
+                image_3d = self.layout.world_landmarks_view(canvas)
+                # white background
+                image_3d.fill(Layout.WORLD_LANDMARKS_BACKGROUND)
+                # straight from the pose's arrays - no need to build the
+                # world landmarks LandmarkList
+                self.plotter.plot_3d_array_on_image(
+                    image_3d,
+                    pose.world_array,
+                    visibility=pose.visibility,
+                    camera=self.camera)
+
+        self.output_frame_number += 1
+        return canvas
+
+    def prediction_for(self, pose):
+        '''
+          Classify the given pose, and return the text to display for it -
+          but only if the same classification has persisted for at least
+          frames_for_classification successive frames. Otherwise None
+        '''
+        classification = self.classifier.classify(
+            pose,
+            threshold=self.classification_confidence_threshold,
+            max_results=1
+        )
+        # we get an array back, it might be empty
+        if not classification:
+            return None
+
+        technique, confidence = classification[0]
+        if technique == self.last_classification:
+            self.frames_with_this_classification += 1
+        else:
+            self.frames_with_this_classification = 1
+        self.last_classification = technique
+
+        # only output the classification if it's been constant for
+        # at least the required number of frames
+        if self.frames_with_this_classification < self.frames_for_classification:
+            return None
+
+        confidence_pct = str(round(100.0 * confidence, 2))
+        return f"Pose: {technique} ({confidence_pct}%)"
@@ -3,7 +3,9 @@ import mediapipe as mp
 import pdb
 import numpy as np
 
+from mt_trainer.metrics import NULL_METRICS
 from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.roi_tracking import RoiTracker
 from mt_trainer.text_rendering import Cv2TextRenderer
 
 
@@ -13,35 +15,191 @@ class FrameProcessor:
     '''
     def __init__(self,
                  min_detection_confidence=0.5,
-                 min_tracking_confidence=0.5):
-        self.pose_landmarker = mp.solutions.pose.Pose(
-            min_detection_confidence=min_detection_confidence,
-            min_tracking_confidence=min_tracking_confidence
-        )
+                 min_tracking_confidence=0.5,
+                 static_image_mode=False,
+                 model_complexity=1,
+                 smooth_landmarks=True,
+                 enable_segmentation=False,
+                 inference_max_side=None,
+                 inference_scale=None,
+                 roi=False,
+                 roi_padding=0.25):
+        '''
+          static_image_mode - treat every image as unrelated to the last,
+          rather than tracking the pose from frame to frame. Right for
+          stills, wrong for video
+          model_complexity - 0, 1 or 2. Higher is more accurate, but slower
+          smooth_landmarks - filter landmarks across frames to reduce
+          jitter (only when not in static_image_mode)
+          enable_segmentation - also generate a segmentation mask of the
+          person. We don't use it, so it's only worth the cost if
+          something else will
+          inference_max_side, inference_scale - shrink images before
+          inference, so that their longest side is at most
+          inference_max_side pixels, or by inference_scale (e.g. 0.5).
+          Whichever gives the smaller image wins. Images are never enlarged
+          roi - only give the landmarker the region around the pose found
+          in the last frame (padded by roi_padding - see RoiTracker),
+          falling back to the whole frame when that doesn't work. The
+          region gets a landmarker of its own - see landmarker_for
+        '''
+        self.settings = {
+            'min_detection_confidence': min_detection_confidence,
+            'min_tracking_confidence': min_tracking_confidence,
+            'static_image_mode': static_image_mode,
+            'model_complexity': model_complexity,
+            'smooth_landmarks': smooth_landmarks,
+            'enable_segmentation': enable_segmentation,
+        }
+        self.inference_max_side = inference_max_side
+        self.inference_scale = inference_scale
+        self.roi_tracker = RoiTracker(padding=roi_padding) if roi else None
+        # times inference_resize, colour_conversion & inference - see Metrics
+        self.metrics = NULL_METRICS
+        self._pose_landmarker = None
+        self._crop_landmarker = None
+        self._crop_box = None
+
+    def _new_landmarker(self):
+        return mp.solutions.pose.Pose(**self.settings)
+
+    @property
+    def pose_landmarker(self):
+        '''
+          The MediaPipe pose landmarker - only created when first needed,
+          as it's expensive, and not needed at all to draw or render
+        '''
+        if self._pose_landmarker is None:
+            self._pose_landmarker = self._new_landmarker()
+        return self._pose_landmarker
+
+    def landmarker_for(self, box):
+        '''
+          The landmarker to find the pose in the given box of an image
+          with - or in the whole image, if box is None.
+          Out of static image mode, a landmarker tracks (and smooths) the
+          landmarks from one image to the next in that image's own
+          coordinates - so a crop and the whole frame can't share one,
+          and nor can two different crops. So crops get a landmarker of
+          their own, which is started afresh whenever the box moves -
+          rarely, as RoiTracker only moves it when the pose nears its edge
+        '''
+        if box is None or self.settings['static_image_mode']:
+            return self.pose_landmarker
+        if box != self._crop_box:
+            self._release_crop_landmarker()
+        if self._crop_landmarker is None:
+            self._crop_landmarker = self._new_landmarker()
+            self._crop_box = box
+        return self._crop_landmarker
+
+    def _release_crop_landmarker(self):
+        if self._crop_landmarker is not None:
+            self._crop_landmarker.close()
+            self._crop_landmarker = None
+        self._crop_box = None
 
     def release(self):
-        self.pose_landmarker.close()
+        if self._pose_landmarker is not None:
+            self._pose_landmarker.close()
+            self._pose_landmarker = None
+        self._release_crop_landmarker()
 
-    def quantify_pose(self, rgb_image):
+    def quantify_pose(self, rgb_image, bgr=False):
         '''
           Return a QuantifiedPose object encapsulating all that has been
           inferred about the pose of the main recognised person in the given
-          rgb_image (if any)
+          rgb_image (if any).
+          If bgr is True, the image is in OpenCV's BGR order, and is
+          converted to RGB just for inference
         '''
-        results = self.pose_landmarker.process(rgb_image)
+        tracker = self.roi_tracker
+        if tracker is None:
+            return self.quantify_pose_in(rgb_image, bgr=bgr)
+
+        height, width = rgb_image.shape[0:2]
+        if tracker.box is not None:
+            pose = self.quantify_pose_in(rgb_image, tracker.box, bgr=bgr)
+            if tracker.accept(pose, width, height):
+                tracker.hits += 1
+                tracker.update(pose, width, height)
+                return pose
+            tracker.fallbacks += 1
+
+        pose = self.quantify_pose_in(rgb_image, bgr=bgr)
+        tracker.update(pose, width, height)
+        return pose
+
+    def quantify_pose_in(self, rgb_image, box=None, bgr=False):
+        '''
+          As quantify_pose, but only looking at the given box (left, top,
+          right, bottom) of the image, if given. Image landmarks are
+          always normalised to the whole image
+        '''
+        height, width = rgb_image.shape[0:2]
+        if box is not None:
+            left, top, right, bottom = box
+            rgb_image = rgb_image[top:bottom, left:right]
+        # shrink first, so there's less to convert
+        with self.metrics.span('inference_resize'):
+            rgb_image = self.inference_image(rgb_image)
+        with self.metrics.span('colour_conversion'):
+            if bgr:
+                rgb_image = cv2.cvtColor(rgb_image, cv2.COLOR_BGR2RGB)
+            elif box is not None:
+                rgb_image = np.ascontiguousarray(rgb_image)
+        # image landmarks are normalised to the image size, and shrinking
+        # keeps the aspect ratio, so they map straight back onto the
+        # full-resolution image
+        with self.metrics.span('inference'):
+            results = self.landmarker_for(box).process(rgb_image)
         if results.pose_world_landmarks:
             quant_pose = QuantifiedPose(results.pose_world_landmarks,
                                         results.pose_landmarks)
+            if box is not None:
+                quant_pose = RoiTracker.remap(quant_pose, box, width, height)
             return quant_pose
         else:
             return None
 
-    def draw_landmarks(self, landmarks, rgb_image):
+    def inference_size(self, width, height):
+        '''
+          Return the (width, height) that an image of the given size is
+          shrunk to before inference - or None if it isn't shrunk
+        '''
+        scale = 1.0
+        if self.inference_max_side:
+            scale = min(scale, self.inference_max_side / max(width, height))
+        if self.inference_scale:
+            scale = min(scale, self.inference_scale)
+        if scale >= 1.0:
+            return None
+        return (max(1, int(round(width * scale))),
+                max(1, int(round(height * scale))))
+
+    def inference_image(self, image):
+        ''' Return the given image, shrunk for inference if required '''
+        size = self.inference_size(image.shape[1], image.shape[0])
+        if size is None:
+            return image
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def draw_landmarks(self, landmarks, rgb_image, output_image=None):
         '''
           Return a copy of the image with landmarks drawn & connected
-          Can only do this on a copy - the mp_image.numpy_view() is immutable
+          Can only do this on a copy - the mp_image.numpy_view() is immutable.
+          The copy goes into output_image (e.g. a region of a Layout
+          canvas) if given - it must be the same shape as rgb_image.
+          If the caller owns the image, passing it as output_image too
+          draws on it in place, with no copy at all.
+          The landmark colours are MediaPipe's, which are in BGR order
         '''
-        rgb_image_copy = np.copy(rgb_image)
+        if output_image is None:
+            rgb_image_copy = np.copy(rgb_image)
+        else:
+            if output_image is not rgb_image:
+                output_image[...] = rgb_image
+            rgb_image_copy = output_image
         style = mp.solutions.drawing_styles.get_default_pose_landmarks_style()
         mp.solutions.drawing_utils.draw_landmarks(
             rgb_image_copy,
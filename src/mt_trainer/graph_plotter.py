@@ -19,7 +19,8 @@ class GraphPlotter:
     def __init__(self, figure=None, axes=None) -> None:
         self.figure = figure
         self.axes = axes
-        
+        self.connection_arrays = {}
+
         mplstyle.use('fast')
         pass
     
@@ -32,39 +33,90 @@ class GraphPlotter:
                                    connections: Optional[List[Tuple[int, int]]] = mp.solutions.pose.POSE_CONNECTIONS,
                                    camera: Camera = None,
                                   ):
+        '''
+          Plot the given landmarks on the image, as a connected skeleton
+          projected through the given camera - see plot_3d_array_on_image
+        '''
+        landmarks = landmark_list.landmark
+        coords = np.array([(l.x, l.y, l.z) for l in landmarks],
+                          dtype=np.float32).reshape(-1, 3)
+        visibility = None
+        presence = None
+        if len(landmarks) and landmarks[0].HasField('visibility'):
+            visibility = np.array([l.visibility for l in landmarks],
+                                  dtype=np.float32)
+        if len(landmarks) and landmarks[0].HasField('presence'):
+            presence = np.array([l.presence for l in landmarks],
+                                dtype=np.float32)
+        return self.plot_3d_array_on_image(image,
+                                           coords,
+                                           visibility=visibility,
+                                           presence=presence,
+                                           connections=connections,
+                                           camera=camera)
 
+    def plot_3d_array_on_image(self,
+                               image: np.ndarray,
+                               coords: np.ndarray,
+                               visibility: Optional[np.ndarray] = None,
+                               presence: Optional[np.ndarray] = None,
+                               connections: Optional[List[Tuple[int, int]]] = mp.solutions.pose.POSE_CONNECTIONS,
+                               camera: Camera = None,
+                              ):
+        '''
+          Plot the given (n, 3) array of landmarks - normalised world
+          co-ords (-1:1, -1:1, -1:1) - on the image, as a connected skeleton.
+          Landmarks are projected in one go, and the connections drawn with
+          one cv2.polylines call.
+          Landmarks whose visibility or presence (if given) are below
+          MediaPipe's drawing thresholds are skipped, as are their
+          connections
+        '''
         camera = camera or Camera(image_width=image.shape[1],
                                   image_height=image.shape[0])
-        points_2d = {}
+        coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        num_landmarks = len(coords)
+
         # skip landmarks that either aren't present, or aren't visible
-        for idx, landmark in enumerate(landmark_list.landmark):
-          
-            if ((landmark.HasField('visibility') and
-                landmark.visibility < mp.solutions.drawing_utils._VISIBILITY_THRESHOLD) or
-                (landmark.HasField('presence') and
-                landmark.presence < mp.solutions.drawing_utils._PRESENCE_THRESHOLD)):
-                continue
+        shown = np.ones(num_landmarks, dtype=bool)
+        if visibility is not None:
+            shown &= np.asarray(visibility) >= \
+                mp.solutions.drawing_utils._VISIBILITY_THRESHOLD
+        if presence is not None:
+            shown &= np.asarray(presence) >= \
+                mp.solutions.drawing_utils._PRESENCE_THRESHOLD
+
+        # project to image-space 2d co-ords
+        points_2d = camera.project_points_array(coords)
 
-            # project from normalised world co-ords (-1:1, -1:1, -1:1)
-            # to image-space 2d co-ords
-            point_2d = camera.project_3d_point(vector_maths.landmark_to_vector(landmark))
-            points_2d[idx] = point_2d
+        for point_2d in points_2d[shown].tolist():
+            cv2.circle(image, tuple(point_2d), 4, (0, 0, 0), -1)
 
-            image = cv2.circle(image, point_2d, 4, (0, 0, 0), -1)
-        
         if connections:
-            num_landmarks = len(landmark_list.landmark)
-            for connection in connections:
-                start_idx = connection[0]
-                end_idx = connection[1]
-                if not (0 <= start_idx < num_landmarks and 0 <= end_idx < num_landmarks):
-                    raise ValueError(f'Landmark index is out of range. Invalid connection '
-                                    f'from landmark #{start_idx} to landmark #{end_idx}.')
-                if start_idx in points_2d and end_idx in points_2d:
-                    landmark_pair = [
-                        points_2d[start_idx], points_2d[end_idx]
-                    ]
-                    
-                    cv2.line(image, landmark_pair[0], landmark_pair[1], (64, 64, 64), 1)
-            
+            pairs = self.connection_array(connections)
+            if len(pairs) and (pairs.min() < 0 or pairs.max() >= num_landmarks):
+                start_idx, end_idx = pairs[
+                    ((pairs < 0) | (pairs >= num_landmarks)).any(axis=1)][0]
+                raise ValueError(f'Landmark index is out of range. Invalid connection '
+                                f'from landmark #{start_idx} to landmark #{end_idx}.')
+            pairs = pairs[shown[pairs].all(axis=1)]
+            if len(pairs):
+                # (k, 2, 2) - a two-point polyline per connection
+                segments = points_2d[pairs]
+                cv2.polylines(image, list(segments), False, (64, 64, 64), 1)
+
         return image
+
+    def connection_array(self, connections):
+        '''
+          Return the given connections as a (k, 2) int array of
+          landmark indices - cached, as it's usually the same set
+          of connections every time
+        '''
+        key = id(connections)
+        cached = self.connection_arrays.get(key)
+        if cached is None or cached[0] is not connections:
+            pairs = np.array(list(connections), dtype=np.intp).reshape(-1, 2)
+            cached = (connections, pairs)
+            self.connection_arrays[key] = cached
+        return cached[1]
@@ -0,0 +1,310 @@
+'''
+  Tagging still images with the technique they show - detecting the pose
+  in each, and saving it as JSON training data under a folder named after
+  the technique - in bulk, spread across a pool of worker processes.
+'''
+import glob
+import os
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.metrics import Metrics
+
+IMAGE_EXTENSIONS = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+OUTPUT_EXTENSION = '.json'
+# between the directories of an image's relative path, in its output's name
+OUTPUT_SEPARATOR = '__'
+
+# the FrameProcessor of this worker process - see _init_worker
+_worker_processor = None
+
+
+class TagReport:
+    '''
+      What happened to each image when tagging:
+
+      tagged     - list of (image, output file) for images with a pose
+      no_pose    - list of images in which no pose was found
+      unreadable - list of images which couldn't be decoded
+      up_to_date - list of images whose output is newer than the image,
+                   so weren't tagged again
+      metrics    - how long decoding, inference & saving took (see
+                   Metrics) - disabled, so empty, unless asked for
+    '''
+    def __init__(self, tagged=None, no_pose=None, unreadable=None,
+                 up_to_date=None, metrics=None):
+        self.tagged = list(tagged or [])
+        self.no_pose = list(no_pose or [])
+        self.unreadable = list(unreadable or [])
+        self.up_to_date = list(up_to_date or [])
+        self.metrics = metrics or Metrics(enabled=False)
+
+    @staticmethod
+    def merge(reports):
+        ''' Combine the given reports into one, preserving their order '''
+        reports = list(reports)
+        merged = TagReport(metrics=Metrics(
+            enabled=any(report.metrics for report in reports)))
+        for report in reports:
+            merged.tagged.extend(report.tagged)
+            merged.no_pose.extend(report.no_pose)
+            merged.unreadable.extend(report.unreadable)
+            merged.up_to_date.extend(report.up_to_date)
+            merged.metrics.merge(report.metrics)
+        return merged
+
+    def summary(self):
+        return (f"{len(self.tagged)} images tagged, "
+                f"{len(self.up_to_date)} already up-to-date, "
+                f"{len(self.no_pose)} with no pose found, "
+                f"{len(self.unreadable)} unreadable")
+
+    def __str__(self):
+        lines = [self.summary()]
+        lines += ['  no pose found in ' + file for file in self.no_pose]
+        lines += ['  could not read ' + file for file in self.unreadable]
+        return '\n'.join(lines)
+
+
+def is_image_file(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def images_in(directory):
+    ''' Every image file anywhere under the given directory, sorted '''
+    return sorted(
+        os.path.join(dirpath, f)
+        for (dirpath, dirnames, filenames) in os.walk(directory)
+        for f in filenames
+        if is_image_file(f)
+    )
+
+
+def read_manifest(manifest_file):
+    '''
+      The inputs listed in the given manifest - one per line, ignoring
+      blank lines and #comments. Relative paths are relative to the
+      manifest's own directory
+    '''
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    inputs = []
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                inputs.append(os.path.join(base_dir, line))
+    return inputs
+
+
+class ImageInput(namedtuple('ImageInput', ['path', 'name'])):
+    '''
+      An image to tag, and the name its output is saved under - see
+      expand_inputs. An image given as just a path is named after its
+      file name
+    '''
+    @classmethod
+    def of(cls, image):
+        if isinstance(image, cls):
+            return image
+        return cls(image, os.path.basename(image))
+
+
+def relative_name(path, root):
+    ''' path relative to root, with its separators replaced by OUTPUT_SEPARATOR '''
+    return os.path.relpath(path, root or os.curdir).replace(os.sep,
+                                                            OUTPUT_SEPARATOR)
+
+
+def glob_root(pattern):
+    ''' The directory a glob pattern searches under - its part with no wildcards '''
+    root = pattern
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root
+
+
+def expand_inputs(inputs, manifest_file=None):
+    '''
+      Expand the given inputs - image files, directories (searched
+      recursively for images) or glob patterns - plus anything listed in
+      manifest_file, into a list of ImageInputs, without duplicates.
+
+      Each image is named after its path relative to the directory, or
+      the part of the glob without wildcards, it was found under - so
+      jab/a.png and jab/more/a.png in the directory jab are a.png and
+      more__a.png. An image given on its own is named after its file name.
+      So the same input always gives an image the same name, whatever
+      else is tagged with it.
+
+      The inputs are expanded in the order given, manifest last. The
+      images each directory or glob expands to are sorted by path, so
+      e.g. dir/c.png comes before dir/jab/a.png. A file met more than
+      once keeps its first place, and name
+    '''
+    inputs = list(inputs)
+    if manifest_file:
+        inputs += read_manifest(manifest_file)
+
+    images = []
+    for item in inputs:
+        if os.path.isdir(item):
+            images += [ImageInput(path, relative_name(path, item))
+                       for path in images_in(item)]
+        elif glob.has_magic(item):
+            root = glob_root(item)
+            for match in sorted(glob.glob(item, recursive=True)):
+                if os.path.isdir(match):
+                    images += [ImageInput(path, relative_name(path, root))
+                               for path in images_in(match)]
+                elif is_image_file(match):
+                    images.append(ImageInput(match, relative_name(match, root)))
+        else:
+            # given explicitly, so let it fail later if it's not an image
+            images.append(ImageInput.of(item))
+
+    first = {}
+    for image in images:
+        first.setdefault(image.path, image)
+    return list(first.values())
+
+
+def output_file_name(image, output_dir):
+    ''' Where the pose found in the given image (or ImageInput) is saved '''
+    return os.path.join(
+        output_dir,
+        ImageInput.of(image).name + OUTPUT_EXTENSION
+    )
+
+
+def check_output_names(images, output_dir):
+    '''
+      Raise ValueError if any two of the given images (or ImageInputs)
+      would be saved as the same output file - e.g. jab/a.png and
+      cross/a.png, given on their own
+    '''
+    paths_of = {}
+    for image in images:
+        image = ImageInput.of(image)
+        paths_of.setdefault(output_file_name(image, output_dir), []).append(
+            image.path)
+    collisions = [f"{' and '.join(paths)} would both be saved as {output_file}"
+                  for output_file, paths in paths_of.items()
+                  if len(paths) > 1]
+    if collisions:
+        raise ValueError('\n'.join(collisions))
+
+
+def is_up_to_date(input_file, output_file):
+    ''' True if output_file exists, and is newer than input_file '''
+    try:
+        return os.path.getmtime(output_file) >= os.path.getmtime(input_file)
+    except OSError:
+        return False
+
+
+def _init_worker(settings):
+    ''' Give this worker process its own (static image mode) landmarker '''
+    global _worker_processor
+    _worker_processor = FrameProcessor(**settings)
+
+
+def tag_image_files(images, output_dir, processor=None,
+                    collect_metrics=False):
+    '''
+      Detect the pose in each of the given image files (or ImageInputs),
+      and save each one found into output_dir - see output_file_name.
+      The poses are all detected before any are written, so the writes
+      happen together at the end.
+      Runs in a worker process (using its processor, see _init_worker),
+      so it must be a module-level function.
+      Returns a TagReport - with its metrics filled in if collect_metrics
+    '''
+    processor = processor or _worker_processor
+    metrics = Metrics(enabled=collect_metrics)
+    report = TagReport(metrics=metrics)
+    poses = []
+    for image_input in map(ImageInput.of, images):
+        with metrics.span('decode'):
+            image = cv2.imread(image_input.path)
+        if image is None:
+            report.unreadable.append(image_input.path)
+            continue
+        with metrics.span('quantify_pose'):
+            pose = processor.quantify_pose(image, bgr=True)
+        if pose:
+            poses.append((image_input, pose))
+        else:
+            report.no_pose.append(image_input.path)
+
+    if poses:
+        os.makedirs(output_dir, exist_ok=True)
+    for image_input, pose in poses:
+        output_file = output_file_name(image_input, output_dir)
+        with metrics.span('save'):
+            pose.save(output_file)
+        report.tagged.append((image_input.path, output_file))
+    return report
+
+
+def _tag_image_files_args(args):
+    return tag_image_files(*args)
+
+
+def tag_images(images, output_dir, settings=None, workers=None,
+               chunk_size=32, force=False, collect_metrics=False):
+    '''
+      Tag each of the given image files (or ImageInputs, see
+      expand_inputs), saving the pose found in each into output_dir.
+      Images whose output is already up-to-date are skipped, unless force
+      is True. Raises ValueError if two images would be saved as the same
+      file - see check_output_names.
+
+      The images are split into chunks of chunk_size, which are decoded
+      and tagged in parallel by a pool of worker processes (default: one
+      per CPU), each with its own FrameProcessor, in static image mode,
+      with the given settings.
+      If there's only one chunk, or workers is 1, it's all done in this
+      process instead.
+
+      Returns a TagReport - with the metrics of every worker merged into
+      its metrics, if collect_metrics
+    '''
+    images = [ImageInput.of(image) for image in images]
+    check_output_names(images, output_dir)
+    settings = dict(settings or {}, static_image_mode=True)
+    report = TagReport()
+    to_tag = []
+    for image in images:
+        if not force and is_up_to_date(
+                image.path, output_file_name(image, output_dir)):
+            report.up_to_date.append(image.path)
+        else:
+            to_tag.append(image)
+
+    chunks = [(to_tag[i:i + chunk_size], output_dir, None, collect_metrics)
+              for i in range(0, len(to_tag), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    if workers <= 1:
+        processor = FrameProcessor(**settings)
+        try:
+            parts = [tag_image_files(chunk_images, output_dir,
+                                     processor=processor,
+                                     collect_metrics=collect_metrics)
+                     for chunk_images, output_dir, _, _ in chunks]
+        finally:
+            processor.release()
+    else:
+        # spawn rather than fork - each worker gets a clean MediaPipe
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(settings,)) as pool:
+            parts = list(pool.map(_tag_image_files_args, chunks))
+
+    return TagReport.merge([report] + parts)
@@ -0,0 +1,174 @@
+'''
+  Comparing pose inference settings on the same frames - how fast each
+  one is, and how far the body angles it finds drift from those found
+  with reference settings (e.g. full resolution).
+'''
+from time import perf_counter
+
+import numpy as np
+
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.metrics import NULL_METRICS
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+class InferenceBenchmark:
+    '''
+      The result of running inference with one set of settings:
+
+      name     - what to call these settings in reports
+      settings - the FrameProcessor settings used
+      poses    - the QuantifiedPose (or None) found in each frame
+      seconds  - total time spent in inference
+      drift    - (n, 14) absolute difference in degrees between each angle
+                 and the reference, for the n frames where both found a
+                 pose (None for the reference itself)
+      agreement - fraction of the frames in which the reference found a
+                  pose, that these settings found one too
+    '''
+    def __init__(self, name, settings, poses, seconds):
+        self.name = name
+        self.settings = settings
+        self.poses = poses
+        self.seconds = seconds
+        self.drift = None
+        self.agreement = None
+
+    @property
+    def detected(self):
+        return sum(1 for pose in self.poses if pose)
+
+    @property
+    def fps(self):
+        return len(self.poses) / self.seconds if self.seconds else 0.0
+
+    @property
+    def mean_drift(self):
+        if self.drift is None or not len(self.drift):
+            return None
+        return float(self.drift.mean())
+
+    @property
+    def max_drift(self):
+        if self.drift is None or not len(self.drift):
+            return None
+        return float(self.drift.max())
+
+    def compare_to(self, reference):
+        ''' Work out drift & agreement against the reference benchmark '''
+        pairs = [(pose, ref) for pose, ref in zip(self.poses, reference.poses)
+                 if ref]
+        both = [(pose, ref) for pose, ref in pairs if pose]
+        self.agreement = len(both) / len(pairs) if pairs else None
+        self.drift = np.array(
+            [np.abs(pose.angle_array - ref.angle_array) for pose, ref in both],
+            dtype=np.float32).reshape(-1, len(QuantifiedPose.ANGLE_NAMES))
+        return self
+
+    def worst_angles(self, n=3):
+        ''' The n angles with the largest mean drift, as (name, degrees) '''
+        if self.drift is None or not len(self.drift):
+            return []
+        means = self.drift.mean(axis=0)
+        worst = np.argsort(means)[::-1][:n]
+        return [(QuantifiedPose.ANGLE_NAMES[i], float(means[i]))
+                for i in worst]
+
+    def summary(self):
+        line = (f"{self.name}: {self.fps:.1f} fps, "
+                f"pose found in {self.detected}/{len(self.poses)} frames")
+        if self.agreement is not None:
+            line += f", {100.0 * self.agreement:.1f}% agreement"
+        if self.mean_drift is not None:
+            worst = ', '.join(f"{name} {degrees:.1f}"
+                              for name, degrees in self.worst_angles())
+            line += (f", angle drift mean {self.mean_drift:.2f} "
+                     f"max {self.max_drift:.1f} degrees (worst: {worst})")
+        return line
+
+    def __str__(self):
+        return self.summary()
+
+
+def run_inference(name, settings, frames, bgr=True, metrics=None):
+    '''
+      Run pose inference on each of the given frames in turn, with a new
+      FrameProcessor with the given settings. If given Metrics, the time
+      for each frame is recorded as a span with the given name.
+      Returns an InferenceBenchmark
+    '''
+    metrics = metrics or NULL_METRICS
+    processor = FrameProcessor(**settings)
+    poses = []
+    seconds = 0.0
+    try:
+        # load the model before the clock starts
+        processor.pose_landmarker
+        for frame in frames:
+            start = perf_counter()
+            poses.append(processor.quantify_pose(frame, bgr=bgr))
+            elapsed = perf_counter() - start
+            metrics.record(name, elapsed)
+            seconds += elapsed
+    finally:
+        processor.release()
+    return InferenceBenchmark(name, settings, poses, seconds)
+
+
+def benchmark_inference(frames, candidates, reference_settings=None, bgr=True,
+                        metrics=None):
+    '''
+      Run inference on the given frames once with reference_settings
+      (default: FrameProcessor defaults - i.e. full resolution), then once
+      with each of the candidates - a dict of name => FrameProcessor
+      settings.
+      Returns (reference, [candidate]) InferenceBenchmarks, with each
+      candidate compared to the reference. The time per frame of each is
+      recorded into metrics, if given, as a span named after it
+    '''
+    frames = list(frames)
+    reference = run_inference('reference', reference_settings or {},
+                              frames, bgr=bgr, metrics=metrics)
+    results = [run_inference(name, settings, frames, bgr=bgr,
+                             metrics=metrics).compare_to(reference)
+               for name, settings in candidates.items()]
+    return reference, results
+
+
+def choose_model_complexity(results, target_fps):
+    '''
+      Of the given InferenceBenchmarks - one per model complexity - return
+      the highest complexity which ran at target_fps or more, or the
+      fastest one if none did
+    '''
+    by_complexity = sorted(results,
+                           key=lambda result: result.settings['model_complexity'],
+                           reverse=True)
+    for result in by_complexity:
+        if result.fps >= target_fps:
+            return result.settings['model_complexity']
+    return max(results, key=lambda result: result.fps).settings['model_complexity']
+
+
+def auto_tune_model_complexity(frames, target_fps, settings=None,
+                               complexities=(2, 1, 0), bgr=True):
+    '''
+      Benchmark each of the given model complexities on the given frames,
+      with otherwise the given FrameProcessor settings, comparing the
+      angles each finds to those of the most complex (so most accurate).
+      Returns (the most accurate complexity which meets target_fps - see
+      choose_model_complexity, [InferenceBenchmark for each complexity])
+    '''
+    frames = list(frames)
+    settings = dict(settings or {})
+    complexities = sorted(complexities, reverse=True)
+    reference = run_inference(f"model complexity {complexities[0]}",
+                              dict(settings, model_complexity=complexities[0]),
+                              frames, bgr=bgr)
+    results = [reference] + [
+        run_inference(f"model complexity {complexity}",
+                      dict(settings, model_complexity=complexity),
+                      frames, bgr=bgr).compare_to(reference)
+        for complexity in complexities[1:]
+    ]
+    return choose_model_complexity(results, target_fps), results
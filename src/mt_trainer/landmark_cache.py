@@ -0,0 +1,175 @@
+'''
+  A sidecar file holding the pose landmarks detected in each frame of a
+  video, so that re-rendering or re-classifying the video can replay them
+  instead of running pose inference again.
+'''
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from mt_trainer.quantified_pose import QuantifiedPose
+
+N_LANDMARKS = 33
+CONTENT_HASH_CHUNK_SIZE = 1 << 20
+
+
+class LandmarkCache:
+    '''
+      One fixed-size record per frame of the video, in a memory-mapped
+      .npy file - so a frame can be looked up, or stored, without reading
+      or writing the rest of the file.
+
+      Each record's status is one of:
+        NOT_PROCESSED - we don't know yet
+        POSE          - a pose was detected, and its landmarks are stored
+        NO_POSE       - inference ran, but didn't detect a pose
+
+      The file name includes a key derived from the video's content and
+      the settings that affect inference (see cache_key), so changing
+      either one means a different file
+    '''
+    NOT_PROCESSED = 0
+    POSE = 1
+    NO_POSE = 2
+
+    RECORD = np.dtype([
+        ('status', np.uint8),
+        ('world', np.float32, (N_LANDMARKS, 3)),
+        ('image', np.float32, (N_LANDMARKS, 3)),
+        ('visibility', np.float32, (N_LANDMARKS,)),
+    ])
+
+    def __init__(self, path, frame_count):
+        '''
+          Open the cache file at path, creating it with room for
+          frame_count frames if it doesn't exist yet
+        '''
+        self.path = path
+        if not os.path.exists(path):
+            self.create(path, frame_count)
+        self.records = np.load(path, mmap_mode='r+')
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def create(path, frame_count):
+        '''
+          Create an empty cache file, via a temporary file - so that
+          nothing ever opens a half-created one
+        '''
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        records = np.lib.format.open_memmap(temp_path, mode='w+',
+                                            dtype=LandmarkCache.RECORD,
+                                            shape=(frame_count,))
+        records.flush()
+        del records
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def for_video(video_file, frame_count, settings, cache_dir=None):
+        '''
+          Open (or create) the cache for the given video file & inference
+          settings. It lives alongside the video, unless cache_dir is given
+        '''
+        return LandmarkCache(
+            LandmarkCache.path_for(video_file, settings, cache_dir),
+            frame_count)
+
+    @staticmethod
+    def path_for(video_file, settings, cache_dir=None):
+        directory = cache_dir or os.path.dirname(os.path.abspath(video_file))
+        return os.path.join(
+            directory,
+            f"{os.path.basename(video_file)}."
+            f"{LandmarkCache.cache_key(video_file, settings)[:16]}"
+            ".landmarks.npy")
+
+    @staticmethod
+    def cache_key(video_file, settings):
+        '''
+          A hash of the video file's content and the given dict of
+          inference settings
+        '''
+        digest = hashlib.sha1(content_hash(video_file).encode('utf-8'))
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def __len__(self):
+        return len(self.records)
+
+    def status(self, frame_number):
+        if not 0 <= frame_number < len(self.records):
+            return self.NOT_PROCESSED
+        return int(self.records['status'][frame_number])
+
+    def get(self, frame_number):
+        '''
+          Return (status, pose) for the given frame - pose is None unless
+          status is POSE
+        '''
+        status = self.status(frame_number)
+        if status != self.POSE:
+            return status, None
+
+        record = self.records[frame_number]
+        return status, QuantifiedPose.from_arrays(record['world'],
+                                                  record['image'],
+                                                  record['visibility'])
+
+    def put(self, frame_number, pose):
+        '''
+          Store the given pose (or None, if no pose was detected) for the
+          given frame. Frames beyond the end of the cache are ignored -
+          the frame count of a video is only an estimate
+        '''
+        if not 0 <= frame_number < len(self.records):
+            return
+
+        record = self.records[frame_number:frame_number + 1]
+        if pose is None or pose.world_array is None:
+            record['status'] = self.NO_POSE
+            return
+
+        record['world'] = pose.world_array
+        if pose.image_array is not None:
+            record['image'] = pose.image_array
+        if pose.visibility is not None:
+            record['visibility'] = pose.visibility
+        # status last, so an interrupted write never looks complete
+        record['status'] = self.POSE
+
+    def quantify_pose(self, processor, frame_number, image, bgr=False):
+        '''
+          As FrameProcessor.quantify_pose, but replays the result from the
+          cache if the frame has been processed before - in which case a
+          BGR image doesn't even need converting
+        '''
+        status, pose = self.get(frame_number)
+        if status != self.NOT_PROCESSED:
+            self.hits += 1
+            return pose
+
+        self.misses += 1
+        pose = processor.quantify_pose(image, bgr=bgr)
+        self.put(frame_number, pose)
+        return pose
+
+    def is_complete(self, first_frame, stop_frame):
+        ''' True if every frame in the given range has been processed '''
+        return bool(np.all(
+            self.records['status'][first_frame:stop_frame] != self.NOT_PROCESSED
+        ))
+
+    def flush(self):
+        self.records.flush()
+
+
+def content_hash(path):
+    ''' SHA-1 of the given file's content '''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CONTENT_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
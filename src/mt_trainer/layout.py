@@ -1,4 +1,26 @@
+import numpy as np
+
+
 class Layout:
+    '''
+      Where each part of an output frame goes, and the canvases to draw
+      them on.
+
+      default layout:
+      -------------------------------------
+      |video           | annotation panel |
+      -------------------------------------
+
+      But if we're given world_landmarks, we'll lay it out like this:
+      -------------------------------------
+      |video           | annotation panel |
+      |world_landmarks | (empty space)    |
+      -------------------------------------
+
+      Sizes are (width, height). Each region is (top, bottom, left, right)
+      in the output frame
+    '''
+    WORLD_LANDMARKS_BACKGROUND = 255
 
     def __init__(self,
                  video_size,
@@ -6,26 +28,75 @@ class Layout:
                  world_landmarks_panel_size=None,
                  padding=2
                  ):
-      self.video_size = video_size
-      self.annotation_panel_size = annotation_panel_size
-      self.world_landmarks_panel_size = world_landmarks_panel_size
-      
-      self.total_width = video_size[0] + padding + annotation_panel_size[0]
-      
-      # default layout:
-      # -------------------------------------
-      # |video           | annotation panel |
-      # -------------------------------------
-      #
-      # But if we're given world_landmarks, we'll lay it out like this:
-      # -------------------------------------
-      # |video           | annotation panel |
-      # |world_landmarks | (empty space)    |
-      # -------------------------------------
-      if self.world_landmarks_panel_size:
-          self.total_height = video_size[1] + padding + world_landmarks_panel_size[1]
-      else:
-          self.total_height = video_size[1]
-
-      pass
+        self.video_size = video_size
+        self.annotation_panel_size = annotation_panel_size
+        self.world_landmarks_panel_size = world_landmarks_panel_size
+        self.padding = padding
+
+        self.total_width = video_size[0] + padding + annotation_panel_size[0]
+        # the top row is as tall as the taller of the video and the panel
+        top_row_height = max(video_size[1], annotation_panel_size[1])
+
+        self.video_region = (0, video_size[1], 0, video_size[0])
+        panel_left = video_size[0] + padding
+        self.annotation_panel_region = (0,
+                                        annotation_panel_size[1],
+                                        panel_left,
+                                        panel_left + annotation_panel_size[0])
+
+        if self.world_landmarks_panel_size:
+            world_top = top_row_height + padding
+            self.world_landmarks_region = (
+                world_top,
+                world_top + world_landmarks_panel_size[1],
+                0,
+                world_landmarks_panel_size[0])
+            self.total_height = world_top + world_landmarks_panel_size[1]
+            self.total_width = max(self.total_width,
+                                   world_landmarks_panel_size[0])
+        else:
+            self.world_landmarks_region = None
+            self.total_height = top_row_height
+
+    def new_canvas(self):
+        '''
+          Allocate a whole output frame (BGR) - black, apart from a white
+          background for the world landmarks, if any
+        '''
+        canvas = np.zeros((self.total_height, self.total_width, 3), np.uint8)
+        if self.world_landmarks_region:
+            self.world_landmarks_view(canvas).fill(
+                self.WORLD_LANDMARKS_BACKGROUND)
+        return canvas
+
+    def canvases(self, count):
+        '''
+          Allocate count output frames, and yield them round-robin forever.
+          Each frame is handed out again count frames later, so count must
+          be more than the number of frames that are in use (e.g. queued
+          for encoding) at any one time
+        '''
+        pool = [self.new_canvas() for _ in range(max(1, count))]
+        while True:
+            yield from pool
+
+    @staticmethod
+    def view(canvas, region):
+        ''' Return a writable view of the given region of canvas '''
+        top, bottom, left, right = region
+        return canvas[top:bottom, left:right]
+
+    def video_view(self, canvas):
+        return self.view(canvas, self.video_region)
+
+    def annotation_panel_view(self, canvas):
+        return self.view(canvas, self.annotation_panel_region)
 
+    def world_landmarks_view(self, canvas):
+        '''
+          Return the view of the world landmarks region of canvas, or None
+          if the layout doesn't have one
+        '''
+        if self.world_landmarks_region is None:
+            return None
+        return self.view(canvas, self.world_landmarks_region)
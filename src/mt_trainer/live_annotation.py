@@ -0,0 +1,274 @@
+'''
+  Annotating a live stream - a camera, a stream URL, or a video file
+  replayed at its own frame rate as a stand-in - with a bounded latency.
+
+  Unlike annotate_frames, which must process every frame, frames that
+  can't be processed in time are dropped rather than queued: a capture
+  thread only ever keeps the newest frame, and frames which are already
+  older than the latency budget by the time they could be processed are
+  skipped.
+'''
+import json
+import os
+import sys
+import threading
+from time import perf_counter, sleep
+
+import cv2
+import numpy as np
+
+from mt_trainer.camera import Camera
+from mt_trainer.frame_annotator import FrameAnnotator
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.graph_plotter import GraphPlotter
+from mt_trainer.metrics import NULL_METRICS
+from mt_trainer.video_annotation import (FONT_SIZE, inference_settings,
+                                         make_classifier, make_layout,
+                                         make_text_renderer, print_debug_line)
+
+WINDOW_NAME = 'mt-trainer'
+
+
+def open_capture(source):
+    '''
+      Open the given source - a camera index (e.g. '0'), a stream URL or
+      a video file - as a cv2.VideoCapture
+    '''
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise IOError(f"Could not open {source}")
+    return cap
+
+
+class LatestFrameSource:
+    '''
+      Reads frames from the given source in its own thread, keeping only
+      the newest - so however slow the consumer is, next_frame() always
+      gets the freshest frame, and never a backlog.
+
+      replay - pace the reads to the source's frame rate, as a live
+               source would deliver them. By default, only for files
+
+      captured - number of frames read so far
+      dropped  - number of frames which were replaced by a newer one
+                 before anything asked for them
+    '''
+    def __init__(self, source, replay=None):
+        self.cap = open_capture(source)
+        if replay is None:
+            replay = not str(source).isdigit() and os.path.exists(source)
+        self.replay = replay
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.captured = 0
+        self.dropped = 0
+        self._latest = None
+        self._last_returned = -1
+        self._ended = False
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='live-capture',
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        start = perf_counter()
+        try:
+            while not self._stop.is_set():
+                if self.replay:
+                    delay = start + self.captured / self.fps - perf_counter()
+                    if delay > 0:
+                        sleep(delay)
+                ok, image = self.cap.read()
+                captured_at = perf_counter()
+                if not ok:
+                    break
+                with self._condition:
+                    if (self._latest is not None and
+                            self._latest[0] > self._last_returned):
+                        self.dropped += 1
+                    self._latest = (self.captured, captured_at, image)
+                    self.captured += 1
+                    self._condition.notify_all()
+        finally:
+            with self._condition:
+                self._ended = True
+                self._condition.notify_all()
+
+    def next_frame(self):
+        '''
+          Wait for a frame newer than the last one returned, and return
+          (sequence number, perf_counter() time it was captured, BGR image)
+          - or None once the source has ended
+        '''
+        with self._condition:
+            while not self._has_new_frame() and not self._ended:
+                self._condition.wait()
+            if not self._has_new_frame():
+                return None
+            self._last_returned = self._latest[0]
+            return self._latest
+
+    def _has_new_frame(self):
+        return self._latest is not None and self._latest[0] > self._last_returned
+
+    def release(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.cap.release()
+
+
+class LatencyStats:
+    ''' End-to-end latencies of processed frames, in seconds '''
+    def __init__(self):
+        self.latencies = []
+
+    def add(self, seconds):
+        self.latencies.append(seconds)
+
+    def percentile(self, pct):
+        return float(np.percentile(self.latencies, pct)) if self.latencies else 0.0
+
+    def summary(self):
+        if not self.latencies:
+            return 'no frames processed'
+        return (f"capture-to-overlay latency (ms): "
+                f"mean {1000 * np.mean(self.latencies):.1f}, "
+                f"p50 {1000 * self.percentile(50):.1f}, "
+                f"p95 {1000 * self.percentile(95):.1f}, "
+                f"max {1000 * max(self.latencies):.1f}")
+
+
+def live_video_size(options, source):
+    ''' [width, height] of the video part of each output frame '''
+    return [
+        options.output_width or int(source.frame_width * 0.01 * options.output_scale),
+        options.output_height or int(source.frame_height * 0.01 * options.output_scale),
+    ]
+
+
+def annotate_live(options, output_file=None, metrics=None, profiler=None):
+    '''
+      Annotate options.input_file live, for as long as it delivers frames
+      (or up to options.max_frames processed frames), showing each
+      annotated frame in a window if options.display is 'true', writing
+      them to output_file if given, and printing a JSON line per frame if
+      options.json_lines is 'true'.
+
+      Frames older than options.latency_budget milliseconds by the time
+      they could be processed are dropped.
+      If given Metrics, each stage of each frame is timed into it, as is
+      the capture-to-overlay latency, and dropped frames are counted.
+      If given a Profiler, it's ticked as each frame is processed.
+      Returns the LatencyStats of the processed frames
+    '''
+    metrics = metrics or NULL_METRICS
+    source = LatestFrameSource(options.input_file)
+    video_size = live_video_size(options, source)
+    budget = options.latency_budget / 1000.0
+
+    processor = FrameProcessor(**inference_settings(options))
+    processor.metrics = metrics
+    classifier = make_classifier(options)
+    layout = make_layout(processor, video_size, options.plot_3d == 'true')
+    plotter = None
+    camera = None
+    if options.plot_3d == 'true':
+        plotter = GraphPlotter()
+        camera = Camera(image_width=video_size[0],
+                        image_height=video_size[1])
+    # frames are written or shown before the next one is annotated, so
+    # one canvas is enough
+    annotator = FrameAnnotator(
+        processor,
+        classifier,
+        layout,
+        font_size=FONT_SIZE,
+        classification_confidence_threshold=options.classification_confidence_threshold,
+        frames_for_classification=options.frames_for_classification,
+        plotter=plotter,
+        camera=camera,
+        text_renderer=make_text_renderer(options),
+        metrics=metrics,
+    )
+
+    out = None
+    if output_file:
+        out = cv2.VideoWriter(output_file,
+                              cv2.VideoWriter_fourcc(*(options.codec or 'mp4v')),
+                              options.fps or source.fps,
+                              (layout.total_width, layout.total_height))
+        if not out.isOpened():
+            source.release()
+            raise IOError(f"Could not create the output video file {output_file}")
+
+    stats = LatencyStats()
+    stale = 0
+    source.start()
+    try:
+        while options.max_frames is None or len(stats.latencies) < options.max_frames:
+            frame = source.next_frame()
+            if frame is None:
+                break
+            sequence, captured_at, image = frame
+            if perf_counter() - captured_at > budget:
+                stale += 1
+                continue
+
+            pose = processor.quantify_pose(image, bgr=True)
+            output_image = annotator.annotate(image, pose,
+                                              frame_number=sequence + 1)
+            latency = perf_counter() - captured_at
+            stats.add(latency)
+            metrics.record('latency', latency)
+            if profiler:
+                profiler.tick()
+
+            if output_image is not None:
+                annotator.text_renderer.render(
+                    f"latency {1000 * latency:.0f}ms",
+                    layout.video_view(output_image),
+                    top=video_size[1] - 4,
+                    left=4,
+                    pixel_height=FONT_SIZE,
+                    color=(255, 255, 255))
+                if out is not None:
+                    with metrics.span('encode'):
+                        out.write(output_image)
+
+            if options.json_lines == 'true':
+                print(json.dumps({
+                    'frame': sequence,
+                    'latency_ms': round(1000 * latency, 1),
+                    'pose': pose is not None,
+                    'prediction': annotator.last_prediction,
+                    'angles': pose.rounded_angles() if pose else None,
+                }), flush=True)
+
+            if options.display == 'true':
+                cv2.imshow(WINDOW_NAME,
+                           output_image if output_image is not None else image)
+                if cv2.waitKey(1) & 0xFF in (ord('q'), 27):
+                    break
+    finally:
+        source.release()
+        metrics.count('frames_dropped_while_busy', source.dropped)
+        metrics.count('frames_over_latency_budget', stale)
+        processor.release()
+        if out is not None:
+            out.release()
+        if options.display == 'true':
+            cv2.destroyAllWindows()
+
+    print_debug_line(options,
+                     '\nCaptured', source.captured, 'frames, processed',
+                     len(stats.latencies), '- dropped', source.dropped,
+                     'while busy and', stale, 'over the latency budget\n')
+    print(stats.summary(), file=sys.stderr if options.json_lines == 'true' else sys.stdout)
+    return stats
@@ -0,0 +1,180 @@
+'''
+  Timing named spans of work - decode, inference, render, encode etc -
+  once per frame, and reporting the distribution of each as JSON or CSV,
+  so runs can be compared across machines and over time.
+'''
+import csv
+import json
+import platform
+import threading
+from contextlib import contextmanager
+from time import perf_counter, time
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class Metrics:
+    '''
+      Records how long each named span takes, every time it runs.
+      Safe to record from several threads at once (e.g. the stages of a
+      Pipeline).
+
+      with metrics.span('inference'):
+          pose = processor.quantify_pose(image)
+
+      counters are for things which are counted rather than timed, e.g.
+      frames dropped.
+      A disabled Metrics (see NULL_METRICS) records nothing, and costs
+      next to nothing
+    '''
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.samples = {}
+        self.counters = {}
+        self.started_at = time()
+        self._start = perf_counter()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return self.enabled
+
+    def __getstate__(self):
+        # so it can be returned from a worker process - locks can't be pickled
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def timed(self, iterable, name):
+        '''
+          Yield the items of the given iterable, timing how long each one
+          takes to produce as the named span - e.g. decoding frames
+        '''
+        iterator = iter(iterable)
+        while True:
+            with self.span(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record(self, name, seconds):
+        ''' Record one run of the named span, which took seconds '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        '''
+          Add the samples and counters of another Metrics - or of the
+          (samples, counters) it was pickled as, see state() - to these
+        '''
+        if not self.enabled:
+            return self
+        samples, counters = other if isinstance(other, tuple) else other.state()
+        with self._lock:
+            for name, values in samples.items():
+                self.samples.setdefault(name, []).extend(values)
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+        return self
+
+    def state(self):
+        ''' (samples, counters) - small & plain enough to send between processes '''
+        with self._lock:
+            return ({name: list(values) for name, values in self.samples.items()},
+                    dict(self.counters))
+
+    def stats(self, name):
+        '''
+          Summary of the named span: count, and total / mean / max /
+          percentiles of its durations, in milliseconds
+        '''
+        values = np.array(self.samples.get(name, []), dtype=np.float64) * 1000.0
+        if not len(values):
+            return {'count': 0}
+        stats = {
+            'count': int(len(values)),
+            'total_ms': float(values.sum()),
+            'mean_ms': float(values.mean()),
+        }
+        for pct, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            stats[f"p{pct}_ms"] = float(value)
+        stats['max_ms'] = float(values.max())
+        return stats
+
+    def report(self, **run_info):
+        '''
+          The whole run as a dict - when & where it ran, anything given
+          as run_info (e.g. the options), the wall time, counters, and the
+          stats of every span
+        '''
+        return {
+            'started_at': self.started_at,
+            'wall_time_s': perf_counter() - self._start,
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'run': run_info,
+            'counters': dict(self.counters),
+            'spans': {name: self.stats(name) for name in sorted(self.samples)},
+        }
+
+    def summary(self):
+        ''' One line per span, for humans '''
+        lines = []
+        for name in sorted(self.samples):
+            stats = self.stats(name)
+            lines.append(f"{name}: {stats['count']} x mean {stats['mean_ms']:.2f}ms "
+                         f"p50 {stats['p50_ms']:.2f} p95 {stats['p95_ms']:.2f} "
+                         f"p99 {stats['p99_ms']:.2f} max {stats['max_ms']:.2f}")
+        lines += [f"{name}: {n}" for name, n in sorted(self.counters.items())]
+        return '\n'.join(lines)
+
+    def write(self, filepath, **run_info):
+        '''
+          Write the report (see report()) to filepath - as CSV, with one
+          row per span, if it ends in .csv, otherwise as JSON
+        '''
+        report = self.report(**run_info)
+        if filepath.lower().endswith('.csv'):
+            columns = (['span', 'count', 'total_ms', 'mean_ms'] +
+                       [f"p{pct}_ms" for pct in PERCENTILES] + ['max_ms'])
+            with open(filepath, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                for name, stats in report['spans'].items():
+                    writer.writerow(dict(stats, span=name))
+                for name, n in report['counters'].items():
+                    writer.writerow({'span': name, 'count': n})
+        else:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, default=str)
+        return report
+
+
+# records nothing - the default wherever metrics are optional
+NULL_METRICS = Metrics(enabled=False)
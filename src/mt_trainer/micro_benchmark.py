@@ -0,0 +1,191 @@
+'''
+  Micro-benchmarks of the hot paths of mt_trainer - angle calculation,
+  similarity & classification, saving & loading poses, 3D projection &
+  plotting, panel rendering and compositing - on synthetic landmarks, so
+  no MediaPipe model or video is needed.
+
+  Results can be saved as a baseline, and later runs compared to it, so
+  that optimisations are measurable, and regressions get noticed.
+'''
+import json
+import os
+import platform
+import timeit
+from time import time
+
+import numpy as np
+
+from mt_trainer.camera import Camera
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.graph_plotter import GraphPlotter
+from mt_trainer.pose_classifier import PoseClassifier
+from mt_trainer.quantified_pose import QuantifiedPose
+
+N_LANDMARKS = 33
+
+# how much slower (or faster) than the baseline, as a fraction, counts as
+# a change rather than noise
+DEFAULT_TOLERANCE = 0.25
+
+
+def synthetic_pose(rng):
+    '''
+      A QuantifiedPose with random - but reproducible, for a given rng -
+      world & image landmarks and visibility, and the angles between them
+    '''
+    return QuantifiedPose.from_arrays(
+        world_array=rng.normal(scale=0.3, size=(N_LANDMARKS, 3)),
+        image_array=rng.random(size=(N_LANDMARKS, 3)),
+        visibility=rng.uniform(0.5, 1.0, size=N_LANDMARKS))
+
+
+def hot_path_benchmarks(work_dir, seed=0, techniques=20):
+    '''
+      A dict of benchmark name => function of no arguments, which runs
+      that hot path once on synthetic fixtures.
+      Poses are saved into, and loaded from, work_dir
+    '''
+    rng = np.random.default_rng(seed)
+    pose = synthetic_pose(rng)
+    other_pose = synthetic_pose(rng)
+    classifier = PoseClassifier(pose_archetypes={
+        f"technique-{i}": synthetic_pose(rng) for i in range(techniques)
+    })
+
+    pose_file = os.path.join(work_dir, 'pose.json')
+    pose.save(pose_file)
+    save_file = os.path.join(work_dir, 'saved-pose.json')
+
+    camera = Camera(image_width=640, image_height=480)
+    plotter = GraphPlotter()
+    plot_image = np.full((480, 640, 3), 255, np.uint8)
+    world_landmarks = pose.world_landmarks
+
+    processor = FrameProcessor()
+    frame = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    panel = processor.make_panel_for_angles()
+
+    return {
+        'QuantifiedPose.calculate_angles': pose.calculate_angles,
+        'QuantifiedPose.similarity_to': lambda: pose.similarity_to(other_pose),
+        'PoseClassifier.classify': lambda: classifier.classify(pose),
+        'QuantifiedPose.save': lambda: pose.save(save_file),
+        'QuantifiedPose.load': lambda: QuantifiedPose.load(pose_file),
+        'Camera.project_3d_points':
+            lambda: camera.project_3d_points(pose.world_array),
+        'GraphPlotter.plot_3d_landmarks_on_image':
+            lambda: plotter.plot_3d_landmarks_on_image(
+                image=plot_image, landmark_list=world_landmarks, camera=camera),
+        'FrameProcessor.render_angles': lambda: processor.render_angles(pose),
+        'FrameProcessor.append_image_to_rhs':
+            lambda: processor.append_image_to_rhs(frame, panel),
+        'FrameProcessor.append_image_to_bottom_left':
+            lambda: processor.append_image_to_bottom_left(frame, frame),
+    }
+
+
+def time_call(function, repeat=7):
+    '''
+      Time the given function of no arguments, as timeit does: call it
+      enough times in a row to take at least 0.2 seconds, repeat that
+      repeat times, and return the seconds per call of each repeat
+    '''
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return [seconds / number for seconds in timer.repeat(repeat, number)]
+
+
+def run_benchmarks(benchmarks, repeat=7, names=None):
+    '''
+      Time each of the given benchmarks (see hot_path_benchmarks) - or
+      just those whose names contain any of the given names.
+      Returns a dict of benchmark name => {median_us, best_us, repeat},
+      in microseconds per call
+    '''
+    results = {}
+    for name, function in benchmarks.items():
+        if names and not any(part in name for part in names):
+            continue
+        per_call = np.array(time_call(function, repeat)) * 1e6
+        results[name] = {
+            'median_us': float(np.median(per_call)),
+            'best_us': float(per_call.min()),
+            'repeat': len(per_call),
+        }
+    return results
+
+
+def save_baseline(filepath, results):
+    ''' Save the given results (see run_benchmarks) as JSON, with where & when they ran '''
+    doc = {
+        'saved_at': time(),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+    return doc
+
+
+def load_baseline(filepath):
+    ''' The results saved in the given baseline file - see save_baseline '''
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+class Comparison:
+    '''
+      How one benchmark compares to its baseline:
+
+      name        - the benchmark
+      baseline_us - median microseconds per call in the baseline, or None
+                    if it wasn't in the baseline
+      current_us  - median microseconds per call now
+      change      - (current - baseline) / baseline, e.g. 0.1 = 10% slower
+      status      - 'slower' / 'faster' if the change is beyond the
+                    tolerance, otherwise 'unchanged' - or 'new'
+    '''
+    def __init__(self, name, baseline_us, current_us, tolerance):
+        self.name = name
+        self.baseline_us = baseline_us
+        self.current_us = current_us
+        if baseline_us is None:
+            self.change = None
+            self.status = 'new'
+        else:
+            self.change = (current_us - baseline_us) / baseline_us
+            if self.change > tolerance:
+                self.status = 'slower'
+            elif self.change < -tolerance:
+                self.status = 'faster'
+            else:
+                self.status = 'unchanged'
+
+    @property
+    def regressed(self):
+        return self.status == 'slower'
+
+    def __str__(self):
+        line = f"{self.name}: {self.current_us:.1f}us"
+        if self.change is not None:
+            line += (f" (baseline {self.baseline_us:.1f}us, "
+                     f"{100.0 * self.change:+.1f}%)")
+        return f"{line} - {self.status}"
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''
+      Compare the median time per call of each of the given results (see
+      run_benchmarks) to that in the baseline.
+      Returns a Comparison for each result
+    '''
+    return [
+        Comparison(name,
+                   baseline[name]['median_us'] if name in baseline else None,
+                   result['median_us'],
+                   tolerance)
+        for name, result in results.items()
+    ]
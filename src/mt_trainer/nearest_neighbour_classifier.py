@@ -0,0 +1,171 @@
+import numpy as np
+
+from mt_trainer.pose_classifier import PoseClassifier
+from mt_trainer.training_data import load_training_set
+
+
+class NearestNeighbourClassifier:
+    '''
+        Unlike PoseClassifier, this doesn't average each technique into
+        one archetype - it keeps every training sample, so a technique
+        can have several distinct variants, and every extra sample makes
+        it more discriminating.
+
+        classify finds the k training samples most similar to the given
+        pose (by cosine-similarity of their angles), and each of them
+        votes for its technique. A technique's confidence is the sum of
+        its voters' similarities, divided by k - so it's the same as the
+        cosine-similarity when all k neighbours agree, and less when
+        they don't.
+
+        The samples are searched by brute force, as a blocked matrix
+        multiply, so memory use stays bounded however many poses are
+        classified at once
+    '''
+    def __init__(self, training_set=None, data_dir=None, k=5,
+                 block_size=1 << 22, cache_file=None, use_cache=True,
+                 workers=None):
+        '''
+            training_set - a TrainingSet to index. If not given, it's
+                           loaded from data_dir (see training_data)
+            k            - number of nearest neighbours which vote
+            block_size   - maximum number of similarities to hold in
+                           memory at once
+        '''
+        self.k = k
+        self.block_size = block_size
+        self.load_report = None
+        if training_set is None and data_dir:
+            self.data_dir = data_dir
+            training_set = load_training_set(data_dir,
+                                             cache_file=cache_file,
+                                             use_cache=use_cache,
+                                             workers=workers)
+        if training_set is not None:
+            self.build_index(training_set)
+
+    def build_index(self, training_set):
+        '''
+            Index every sample in the given TrainingSet which has angles
+        '''
+        self.training_set = training_set
+        self.load_report = training_set.report
+        self.technique_names = list(training_set.technique_names)
+
+        samples = PoseClassifier.normalise(training_set.angles)
+        usable = ~np.isnan(samples).any(axis=1)
+        self.sample_matrix = np.ascontiguousarray(samples[usable],
+                                                  dtype=np.float32)
+        self.sample_techniques = training_set.techniques[usable]
+
+    def __len__(self):
+        return len(self.sample_techniques)
+
+    def nearest(self, poses, k=None):
+        '''
+            Find the k training samples most similar to each of the given
+            poses (a list of QuantifiedPoses, or an (N, n_angles) matrix
+            of their angles).
+            Returns (indices, similarities), both of shape (N, k), most
+            similar first. Poses without angles get similarities of NaN
+        '''
+        queries = PoseClassifier.normalise(PoseClassifier.angle_matrix(poses))
+        k = min(k or self.k, len(self))
+        n_queries, n_samples = len(queries), len(self)
+
+        indices = np.zeros((n_queries, k), dtype=np.intp)
+        similarities = np.full((n_queries, k), np.nan, dtype=np.float32)
+        if k == 0:
+            return indices, similarities
+
+        # split the samples into blocks, and then the queries into blocks
+        # small enough that a block of queries x samples fits in block_size
+        sample_block = max(k, min(n_samples, self.block_size))
+        query_block = max(1, self.block_size // sample_block)
+
+        for q_start in range(0, n_queries, query_block):
+            query = queries[q_start:q_start + query_block]
+            best_indices = np.zeros((len(query), 0), dtype=np.intp)
+            best_scores = np.zeros((len(query), 0), dtype=np.float32)
+
+            for s_start in range(0, n_samples, sample_block):
+                block = self.sample_matrix[s_start:s_start + sample_block]
+                block_indices = np.broadcast_to(
+                    np.arange(s_start, s_start + len(block)),
+                    (len(query), len(block)))
+
+                # merge this block into the running top-k
+                scores = np.concatenate([best_scores, query @ block.T], axis=1)
+                candidates = np.concatenate([best_indices, block_indices], axis=1)
+                if scores.shape[1] > k:
+                    ranked = np.where(np.isnan(scores), -np.inf, scores)
+                    top = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+                    scores = np.take_along_axis(scores, top, axis=1)
+                    candidates = np.take_along_axis(candidates, top, axis=1)
+                best_scores, best_indices = scores, candidates
+
+            ranked = np.where(np.isnan(best_scores), -np.inf, best_scores)
+            order = np.argsort(-ranked, axis=1, kind='stable')
+            indices[q_start:q_start + len(query)] = np.take_along_axis(
+                best_indices, order, axis=1)
+            similarities[q_start:q_start + len(query)] = np.take_along_axis(
+                best_scores, order, axis=1)
+
+        return indices, similarities
+
+    def confidence_matrix(self, poses):
+        '''
+            Returns an (N, n_techniques) matrix of the confidence for
+            each of the given poses being each technique, in the order
+            technique_names
+        '''
+        indices, similarities = self.nearest(poses)
+        n_queries, k = indices.shape
+        confidences = np.zeros((n_queries, len(self.technique_names)),
+                               dtype=np.float32)
+        if k == 0:
+            return confidences
+
+        rows = np.repeat(np.arange(n_queries), k)
+        votes = np.nan_to_num(similarities, nan=0.0).ravel()
+        np.add.at(confidences,
+                  (rows, self.sample_techniques[indices].ravel()),
+                  votes)
+        confidences /= k
+        # a pose without angles can't be anything
+        confidences[np.isnan(similarities[:, 0])] = np.nan
+        return confidences
+
+    def similarities(self, pose):
+        '''
+            Returns a dict of technique => confidence that the given pose
+            is that technique
+        '''
+        confidences = self.confidence_matrix([pose])[0].tolist()
+        return dict(
+            (technique, None if np.isnan(confidence) else confidence)
+            for technique, confidence in zip(self.technique_names, confidences)
+        )
+
+    def classify(self, pose, threshold=0.9, max_results=1):
+        '''
+            Returns a list of the techniques which the given pose is most
+            likely to be, and their confidence.
+            The list is sorted in descending order of confidence,
+            and will contain at most max_results members.
+            All members must have confidence equal to or greater than
+            the given threshold.
+        '''
+        return self.classify_batch([pose], threshold, max_results)[0]
+
+    def classify_batch(self, poses, threshold=0.9, max_results=1):
+        '''
+            As classify, but for a list of QuantifiedPoses (or an
+            (N, n_angles) matrix of their angles) all at once.
+            Returns a list of results, one per pose
+        '''
+        confidences = self.confidence_matrix(poses)
+        # techniques which got no votes at all aren't candidates
+        confidences[confidences == 0.0] = np.nan
+        return PoseClassifier.top_results(confidences, self.technique_names,
+                                          threshold, max_results)
@@ -0,0 +1,173 @@
+'''
+  A minimal staged pipeline - each stage runs in its own thread, and the
+  stages are connected by bounded queues, so that e.g. decoding the next
+  frame can overlap with inference on this one and encoding the last one.
+'''
+import queue
+import threading
+
+# marks the end of the stream as it passes down the queues
+_END_OF_STREAM = object()
+
+
+class Batch(list):
+    '''
+      Return one of these from a stage to pass each of its items on to
+      the next stage separately - so a stage can hold items back and
+      release them later, or release none at all
+    '''
+
+
+class Pipeline:
+    '''
+      Runs items from source through each of the given stages in turn.
+
+      source - any iterable. It is iterated in its own thread, so a
+               generator that e.g. reads frames from a video is ideal
+      stages - list of callables. Each is called with the output of the
+               previous stage, and returns the input for the next one.
+               Returning None drops the item - later stages never see it.
+               Returning a Batch passes on each item in it instead.
+               The return value of the last stage is discarded.
+               If a stage has a flush() method, it's called once the
+               stream has ended, and whatever it returns is passed on too
+
+      Each stage has exactly one thread and the queues are FIFO, so items
+      come out in the same order as they went in, and a stage can safely
+      keep state between items (e.g. a classification streak)
+    '''
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, source, stages, queue_size=8):
+        self.source = source
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.items_completed = 0
+        self._stop = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def run(self):
+        '''
+          Run the pipeline to completion, blocking until every item has
+          passed through the last stage.
+          If any stage raises an exception, the whole pipeline is stopped
+          and the exception is re-raised here.
+          Returns the number of items which made it through every stage
+        '''
+        queues = [queue.Queue(maxsize=self.queue_size)
+                  for _ in self.stages]
+        threads = [
+            threading.Thread(target=self._run_source,
+                             args=(queues[0],),
+                             name='pipeline-source',
+                             daemon=True)
+        ]
+        for i, stage in enumerate(self.stages):
+            output_queue = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(
+                threading.Thread(target=self._run_stage,
+                                 args=(stage, queues[i], output_queue),
+                                 name='pipeline-' + self._stage_name(stage),
+                                 daemon=True)
+            )
+
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(self.POLL_INTERVAL)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+
+        if self._error is not None:
+            raise self._error
+
+        return self.items_completed
+
+    def stop(self):
+        ''' Ask every stage to stop as soon as possible '''
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _stage_name(self, stage):
+        return getattr(stage, '__name__', type(stage).__name__)
+
+    def _fail(self, error):
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+        self.stop()
+
+    def _put(self, output_queue, item):
+        '''
+          Put the item on the queue, waiting for space if needed - but give
+          up if the pipeline has been stopped while we were waiting
+        '''
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=self.POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, input_queue):
+        while not self._stop.is_set():
+            try:
+                return input_queue.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _END_OF_STREAM
+
+    def _run_source(self, output_queue):
+        try:
+            for item in self.source:
+                if item is None:
+                    continue
+                if not self._put(output_queue, item):
+                    return
+            self._put(output_queue, _END_OF_STREAM)
+        except Exception as error:
+            self._fail(error)
+
+    def _pass_on(self, result, output_queue):
+        '''
+          Pass the result of a stage on to the next one (if any).
+          Returns False if the pipeline was stopped while waiting
+        '''
+        if output_queue is None:
+            return True
+        items = result if isinstance(result, Batch) else [result]
+        for item in items:
+            if item is not None and not self._put(output_queue, item):
+                return False
+        return True
+
+    def _run_stage(self, stage, input_queue, output_queue):
+        try:
+            while True:
+                item = self._get(input_queue)
+                if item is _END_OF_STREAM:
+                    break
+
+                result = stage(item)
+                if output_queue is None:
+                    self.items_completed += 1
+                elif not self._pass_on(result, output_queue):
+                    return
+
+            flush = getattr(stage, 'flush', None)
+            if flush is not None and not self._stop.is_set():
+                if not self._pass_on(flush(), output_queue):
+                    return
+
+            if output_queue is not None:
+                self._put(output_queue, _END_OF_STREAM)
+        except Exception as error:
+            self._fail(error)
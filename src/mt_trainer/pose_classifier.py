@@ -1,10 +1,10 @@
 import os
 import pdb
 
-from json.decoder import JSONDecodeError
+import numpy as np
 
 from mt_trainer.quantified_pose import QuantifiedPose
-from mt_trainer.file_system import FileSystem
+from mt_trainer.training_data import load_training_set
 
 class PoseClassifier:
     '''
@@ -14,46 +14,110 @@ class PoseClassifier:
         'archetype'
         classify then compares the given candidate pose
         to all the known archetypes using cosine_similarity 
+
+        The archetypes' angles are kept as a matrix of unit vectors,
+        one row per technique, so that scoring one pose - or a whole
+        batch of them - against every archetype is a single matrix
+        multiply
     '''
-    def __init__(self, pose_archetypes=None, data_dir=None):
+    def __init__(self, pose_archetypes=None, data_dir=None,
+                 cache_file=None, use_cache=True, workers=None):
         self.pose_archetypes = pose_archetypes or {}
+        self.load_report = None
         if data_dir:
             self.data_dir = data_dir
-            self.technique_names = sorted([d.name for d in os.scandir(data_dir)])
-            self.load_training_data(self.data_dir)
+            self.load_training_data(self.data_dir,
+                                    cache_file=cache_file,
+                                    use_cache=use_cache,
+                                    workers=workers)
+        self.build_archetype_matrix()
 
-    def load_training_data(self, dir_path):
+    def build_archetype_matrix(self):
+        '''
+            (Re)build the matrix of normalised archetype angle vectors
+            from pose_archetypes. Must be called again after changing
+            pose_archetypes.
+            Archetypes without any angles are left out, as they can
+            never match anything
+        '''
+        self.archetype_names = [
+            technique for technique, archetype in self.pose_archetypes.items()
+            if archetype.angle_array is not None
+        ]
+        matrix = np.array(
+            [self.pose_archetypes[technique].angle_array
+             for technique in self.archetype_names],
+            dtype=np.float32
+        ).reshape(len(self.archetype_names), len(QuantifiedPose.ANGLE_NAMES))
+        self.archetype_matrix = self.normalise(matrix)
+
+    def load_training_data(self, dir_path, cache_file=None, use_cache=True,
+                           workers=None):
         '''
             Load training data from the given dir_path.
             Training data must be in the form of a
             JSON-serialised QuantifiedPose, organised
             into a sub-folder for each technique. 
+            Unless use_cache is False, it's read from a compiled
+            cache file if that is up-to-date, otherwise the files are
+            parsed by a pool of (workers) processes (see training_data).
+            What happened to each file is recorded in load_report
         '''
-        for technique in self.technique_names:
-            archetype = QuantifiedPose({}, {}, {})
+        self.training_set = load_training_set(dir_path,
+                                              cache_file=cache_file,
+                                              use_cache=use_cache,
+                                              workers=workers)
+        self.load_report = self.training_set.report
+        self.technique_names = self.training_set.technique_names
+        self.pose_archetypes.update(self.training_set.archetypes())
 
-            technique_dir = os.path.join(dir_path, technique)
-            files = FileSystem.files_in(technique_dir)
+    @staticmethod
+    def normalise(matrix):
+        '''
+            Scale each row of the given matrix to unit length.
+            Rows of zeros (or NaN) come out as NaN, so that they never
+            pass a similarity threshold
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
 
-            files_loaded = 0
-            for file in files:
-                try:
-                    pose = QuantifiedPose.load(file)
-                    archetype = archetype.plus(pose)
-                    files_loaded += 1
-                except JSONDecodeError:
-                    pass
+    @staticmethod
+    def angle_matrix(poses):
+        '''
+            Return an (N, n_angles) float32 matrix of the angles of the
+            given list of QuantifiedPoses. If given an array, it's assumed
+            to already be in that form.
+            Poses without angles get a row of NaNs
+        '''
+        if isinstance(poses, np.ndarray):
+            return np.atleast_2d(poses.astype(np.float32, copy=False))
 
-            if files_loaded > 1:
-                archetype.multiply_by(1.0 / files_loaded)
+        matrix = np.full((len(poses), len(QuantifiedPose.ANGLE_NAMES)),
+                         np.nan, dtype=np.float32)
+        for i, pose in enumerate(poses):
+            if pose is not None and pose.angle_array is not None:
+                matrix[i] = pose.angle_array
+        return matrix
 
-            self.pose_archetypes[technique] = archetype
+    def similarity_matrix(self, poses):
+        '''
+            Returns an (N, n_archetypes) matrix of the cosine-similarity
+            of each of the given poses to each archetype, in the order
+            archetype_names
+        '''
+        return self.normalise(self.angle_matrix(poses)) @ self.archetype_matrix.T
 
     def similarities(self, pose):
-        similarities = {}
-        for technique, archetype in self.pose_archetypes.items():
-            similarities[technique] = pose.similarity_to(archetype)
+        '''
+            Returns a dict of technique => cosine-similarity of the given
+            pose to that technique's archetype
+        '''
+        if pose.angle_array is None:
+            return dict((technique, None) for technique in self.pose_archetypes)
 
+        scores = self.similarity_matrix([pose])[0].tolist()
+        similarities = dict((technique, None) for technique in self.pose_archetypes)
+        similarities.update(zip(self.archetype_names, scores))
         return similarities
 
     def classify(self, pose, threshold=0.9, max_results=1):
@@ -65,8 +129,44 @@ class PoseClassifier:
             All members must have cosine similarity equal to or 
             greater than the given threshold.
         '''
-        poses = self.similarities(pose)
-        poses_over_threshold = list(
-          (k, v) for k, v in poses.items() if v and v >= threshold
-        )
-        return sorted(poses_over_threshold, key=lambda v: v[1], reverse=True)[0:max_results]
+        return self.classify_batch([pose], threshold, max_results)[0]
+
+    def classify_batch(self, poses, threshold=0.9, max_results=1):
+        '''
+            As classify, but for a list of QuantifiedPoses (or an
+            (N, n_angles) matrix of their angles) all at once.
+            Returns a list of results, one per pose
+        '''
+        scores = self.similarity_matrix(poses)
+        return self.top_results(scores, self.archetype_names,
+                                threshold, max_results)
+
+    @staticmethod
+    def top_results(scores, names, threshold, max_results):
+        '''
+            Given an (N, n_names) matrix of scores, return a list of the
+            (name, score) pairs for each row which are at least threshold,
+            highest first, at most max_results of them
+        '''
+        n_rows, n_names = scores.shape
+        k = min(max_results, n_names)
+        if k <= 0:
+            return [[] for _ in range(n_rows)]
+
+        # NaN never passes the threshold
+        scores = np.where(scores >= threshold, scores, -np.inf)
+        if k < n_names:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n_names), (n_rows, n_names))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(names[i], score)
+             for i, score in zip(row, row_scores.tolist())
+             if score != -np.inf]
+            for row, row_scores in zip(top.tolist(), top_scores)
+        ]
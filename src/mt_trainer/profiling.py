@@ -0,0 +1,196 @@
+'''
+  Profiling a whole run of one of the scripts - where the CPU time goes,
+  and which allocations grow as frames go by - into files that standard
+  viewers can open:
+
+  <prefix>.pstats      - cProfile stats of the thread which started
+                         profiling - open with python -m pstats,
+                         snakeviz etc
+  <prefix>.folded      - collapsed stacks, sampled from every thread -
+                         e.g. each stage of a Pipeline - for
+                         flamegraph.pl, speedscope, inferno etc
+  <prefix>.memory.txt  - the allocations (by line) which grew the most
+                         between the first frame and the end of the run,
+                         per frame and in total, from tracemalloc
+'''
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+
+PSTATS_EXTENSION = '.pstats'
+FOLDED_EXTENSION = '.folded'
+MEMORY_EXTENSION = '.memory.txt'
+
+
+def profile_prefix(output_file, suffix='.profile'):
+    ''' Where to write the profile of a run which writes output_file '''
+    return os.path.abspath(output_file) + suffix
+
+
+class StackSampler:
+    '''
+      Samples the stack of every other thread every interval seconds,
+      from a thread of its own, counting how often each stack is seen -
+      which, unlike cProfile, costs the same however many calls are made
+    '''
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='stack-sampler',
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @staticmethod
+    def frame_name(frame):
+        code = frame.f_code
+        # ; separates frames in the collapsed format
+        return (f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                f"{code.co_firstlineno})").replace(';', ',')
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)).replace(';', ','))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def write(self, filepath):
+        ''' Write the stacks in collapsed ("folded") form - one "stack count" per line '''
+        with open(filepath, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    '''
+      Profiles everything between start() and stop(), and snapshots
+      memory allocations with tracemalloc.
+
+      This thread is profiled with cProfile. Other threads - e.g. the
+      stages of a Pipeline - only by the StackSampler: from Python 3.12,
+      cProfile is built on sys.monitoring, and only one profiler may be
+      active at a time, so a profiler per thread (via threading.setprofile)
+      would make each thread fail as it started.
+
+      Call tick() once per frame, so that start-up allocations (e.g.
+      loading the model) can be told apart from those which grow with
+      every frame: the first tick takes the baseline snapshot.
+
+      with Profiler(profile_prefix(output_file)) as profiler:
+          ...
+          profiler.tick()
+
+      The files are written by stop() - see files
+    '''
+    def __init__(self, prefix, sample_interval=0.005, top=25,
+                 traceback_frames=1):
+        self.prefix = prefix
+        self.top = top
+        self.traceback_frames = traceback_frames
+        self.sampler = StackSampler(sample_interval)
+        self.frames = 0
+        self._profile = cProfile.Profile()
+        self._baseline = None
+        self._started_tracemalloc = False
+
+    @property
+    def files(self):
+        return [self.prefix + extension for extension in
+                (PSTATS_EXTENSION, FOLDED_EXTENSION, MEMORY_EXTENSION)]
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+            self._started_tracemalloc = True
+        self.sampler.start()
+        self._profile.enable()
+        return self
+
+    def tick(self):
+        ''' Mark the end of a frame '''
+        if self._baseline is None:
+            self._baseline = tracemalloc.take_snapshot()
+        else:
+            self.frames += 1
+
+    def stop(self):
+        ''' Stop profiling, and write the files. Returns their paths '''
+        self._profile.disable()
+        self.sampler.stop()
+        final = tracemalloc.take_snapshot()
+        baseline = self._baseline
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        pstats_file, folded_file, memory_file = self.files
+        self.write_pstats(pstats_file)
+        self.sampler.write(folded_file)
+        self.write_memory(memory_file, baseline, final)
+        return self.files
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def write_pstats(self, filepath):
+        ''' Write the cProfile stats of the profiled thread to filepath '''
+        stats = pstats.Stats(self._profile)
+        stats.dump_stats(filepath)
+        return stats
+
+    def write_memory(self, filepath, baseline, final):
+        '''
+          Write the top allocations by growth from baseline (or, without
+          one, from nothing) to final
+        '''
+        frames = max(1, self.frames)
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, __file__)]
+        final = final.filter_traces(filters)
+        if baseline is None:
+            title = 'Largest allocations still held at the end of the run'
+            stats = final.statistics('lineno')
+            rows = [(stat.size, stat.count, stat.traceback) for stat in stats]
+        else:
+            title = (f"Allocations which grew the most over {self.frames} "
+                     "frames, from the first frame to the end of the run")
+            stats = final.compare_to(baseline.filter_traces(filters), 'lineno')
+            rows = [(stat.size_diff, stat.count_diff, stat.traceback)
+                    for stat in stats]
+            rows.sort(key=lambda row: row[0], reverse=True)
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(title + '\n')
+            f.write(f"{'bytes/frame':>12} {'total bytes':>14} "
+                    f"{'blocks':>8}  where\n")
+            for size, count, traceback in rows[:self.top]:
+                f.write(f"{size / frames:12.1f} {size:14d} {count:8d}  "
+                        f"{traceback}\n")
@@ -1,12 +1,78 @@
 import mediapipe as mp
-from . import vector_maths
+import numpy as np
+from .angle_engine import AngleEngine
 import json
 import pdb
 
-from google.protobuf.json_format import MessageToDict, ParseDict
-from mediapipe.framework.formats.landmark_pb2 import LandmarkList
+from google.protobuf.json_format import MessageToDict
+from mediapipe.framework.formats.landmark_pb2 import LandmarkList, NormalizedLandmarkList
+
+
+def landmark_arrays(landmarks):
+    '''
+      Convert the given landmarks - a MediaPipe LandmarkList, or its dict
+      representation as saved in JSON - to a (n, 3) float32 array of x, y, z
+      co-ordinates, and a (n,) float32 array of visibilities (or None if the
+      landmarks have no visibility)
+    '''
+    if isinstance(landmarks, dict):
+        landmarks = landmarks.get('landmark', [])
+        coords = np.array(
+            [(l.get('x', 0.0), l.get('y', 0.0), l.get('z', 0.0))
+             for l in landmarks],
+            dtype=np.float32)
+        visibility = None
+        if landmarks and 'visibility' in landmarks[0]:
+            visibility = np.array(
+                [l.get('visibility', 0.0) for l in landmarks],
+                dtype=np.float32)
+    else:
+        landmarks = landmarks.landmark
+        coords = np.array([(l.x, l.y, l.z) for l in landmarks],
+                          dtype=np.float32)
+        visibility = None
+        if len(landmarks) and landmarks[0].HasField('visibility'):
+            visibility = np.array([l.visibility for l in landmarks],
+                                  dtype=np.float32)
+    return coords.reshape(-1, 3), visibility
+
+
+def landmark_list(coords, visibility=None, message_class=LandmarkList):
+    '''
+      Convert the given (n, 3) co-ordinates and (n,) visibilities back to
+      a MediaPipe LandmarkList (or whatever message_class is given)
+    '''
+    message = message_class()
+    for i, (x, y, z) in enumerate(coords.tolist()):
+        landmark = message.landmark.add(x=x, y=y, z=z)
+        if visibility is not None:
+            landmark.visibility = float(visibility[i])
+    return message
+
+
+def _as_array(value, shape):
+    if value is None:
+        return None
+    return np.asarray(value, dtype=np.float32).reshape(shape)
+
 
 class QuantifiedPose:
+    '''
+      Everything we know about a single pose, held as float32 arrays:
+
+      world_array - (33, 3) world landmark co-ordinates, in metres
+      image_array - (33, 3) image landmark co-ordinates, normalised to the
+                    image size
+      visibility  - (33,) visibility of each landmark
+      angle_array - (14,) body angles in degrees, in the order ANGLE_NAMES
+
+      Any of these may be None if it isn't known.
+      The MediaPipe LandmarkList representations are only built when they
+      are asked for (e.g. to draw them), and then cached.
+    '''
+    __slots__ = ('world_array', 'image_array', 'visibility', 'angle_array',
+                 '_world_landmarks', '_image_landmarks')
+
     mp_pose = mp.solutions.pose
     
     ANGLE_LANDMARKS = {
@@ -67,33 +133,130 @@ class QuantifiedPose:
                                   mp_pose.PoseLandmark.RIGHT_SHOULDER.value),
     }
 
+    ANGLE_ENGINE = AngleEngine(ANGLE_LANDMARKS)
+    ANGLE_NAMES = ANGLE_ENGINE.names
+
     def __init__(self, world_landmarks=None, image_landmarks=None, angles=None):
-        self.world_landmarks = world_landmarks
-        self.image_landmarks = image_landmarks
-        if angles is not None:
+        '''
+            world_landmarks and image_landmarks may be MediaPipe
+            LandmarkLists, or arrays of shape (33, 3).
+            angles may be a dict of angle name => degrees, or an array
+            in the order ANGLE_NAMES. If not given, they are calculated
+            from the world landmarks.
+        '''
+        self.world_array = None
+        self.image_array = None
+        self.visibility = None
+        self._world_landmarks = None
+        self._image_landmarks = None
+
+        if isinstance(world_landmarks, (LandmarkList, NormalizedLandmarkList)):
+            self.world_array, self.visibility = landmark_arrays(world_landmarks)
+            self._world_landmarks = world_landmarks
+        elif world_landmarks is not None and len(world_landmarks):
+            self.world_array = _as_array(world_landmarks, (-1, 3))
+
+        if isinstance(image_landmarks, (LandmarkList, NormalizedLandmarkList)):
+            self.image_array, image_visibility = landmark_arrays(image_landmarks)
+            self._image_landmarks = image_landmarks
+            if self.visibility is None:
+                self.visibility = image_visibility
+        elif image_landmarks is not None and len(image_landmarks):
+            self.image_array = _as_array(image_landmarks, (-1, 3))
+
+        if angles is not None and len(angles):
             self.angles = angles
+        elif self.world_array is not None:
+            self.angle_array = self.calculate_angle_array()
+        else:
+            self.angle_array = None
+
+    @classmethod
+    def from_arrays(cls, world_array=None, image_array=None,
+                    visibility=None, angle_array=None):
+        '''
+            Return a new instance wrapping the given arrays directly,
+            without any conversion to or from LandmarkLists
+        '''
+        pose = cls.__new__(cls)
+        pose.world_array = _as_array(world_array, (-1, 3))
+        pose.image_array = _as_array(image_array, (-1, 3))
+        pose.visibility = _as_array(visibility, (-1,))
+        pose._world_landmarks = None
+        pose._image_landmarks = None
+        if angle_array is not None:
+            pose.angle_array = _as_array(angle_array, (-1,))
+        elif pose.world_array is not None:
+            pose.angle_array = pose.calculate_angle_array()
         else:
-            if self.world_landmarks is not None:
-                self.angles = self.calculate_angles()
-   
+            pose.angle_array = None
+        return pose
+
+    @classmethod
+    def interpolate(cls, start, end, fraction):
+        '''
+            Return a new instance fraction (0.0 - 1.0) of the way from
+            the start pose to the end pose - with its landmarks linearly
+            interpolated, and its angles calculated from those.
+            If either pose is None, the other is returned as it is
+        '''
+        if start is None or end is None:
+            return start if end is None else end
+
+        def lerp(a, b):
+            if a is None or b is None:
+                return a if b is None else b
+            return a + (b - a) * np.float32(fraction)
+
+        return cls.from_arrays(
+            world_array=lerp(start.world_array, end.world_array),
+            image_array=lerp(start.image_array, end.image_array),
+            visibility=lerp(start.visibility, end.visibility))
+
+    @property
+    def world_landmarks(self):
+        ''' The world landmarks as a MediaPipe LandmarkList '''
+        if self._world_landmarks is None and self.world_array is not None:
+            self._world_landmarks = landmark_list(self.world_array,
+                                                  self.visibility)
+        return self._world_landmarks
+
+    @property
+    def image_landmarks(self):
+        ''' The image landmarks as a MediaPipe NormalizedLandmarkList '''
+        if self._image_landmarks is None and self.image_array is not None:
+            self._image_landmarks = landmark_list(self.image_array,
+                                                  self.visibility,
+                                                  NormalizedLandmarkList)
+        return self._image_landmarks
+
+    @property
+    def angles(self):
+        ''' The body angles, as a dict of angle name => degrees '''
+        if self.angle_array is None:
+            return {}
+        return dict(zip(self.ANGLE_NAMES, self.angle_array.tolist()))
+
+    @angles.setter
+    def angles(self, angles):
+        if isinstance(angles, dict):
+            self.angle_array = self._angle_array_from(angles)
+        else:
+            self.angle_array = _as_array(angles, (-1,))
+
+    def calculate_angle_array(self):
+        '''
+            Calculate the body angles from world_array, in the order
+            ANGLE_NAMES
+        '''
+        return self.ANGLE_ENGINE.calculate(self.world_array).astype(np.float32)
+
     def calculate_angles(self):
         '''
             Calculate the body angles from world_landmarks
         '''
-        angles = {}
-        for angle, landmark_names in self.ANGLE_LANDMARKS.items():
-            landmarks = list(map( 
-                lambda l: vector_maths.landmark_to_vector(
-                            self.world_landmarks.landmark[l]
-                          ),
-                landmark_names
-            ))
-
-            angles[angle] = vector_maths.angle_between(
-                vector_maths.vector_between(landmarks[1], landmarks[2]),
-                vector_maths.vector_between(landmarks[1], landmarks[0]),
-            )
-        return angles
+        return dict(zip(self.ANGLE_NAMES,
+                        self.calculate_angle_array().tolist()))
 
     def rounded_angles(self):
         ''' The body angles, but rounded to integers '''
@@ -106,86 +269,61 @@ class QuantifiedPose:
         #     len(key) for key, _ in QuantifiedPose.ANGLE_LANDMARKS.items()
         # )
 
+    def _combine(self, other_pose, operation, missing_from_self=None):
+        '''
+            Apply operation to each pair of arrays in this pose and
+            other_pose, returning a new pose.
+            Where other_pose is missing an array, ours is carried over as-is.
+            Where we are missing one, missing_from_self is called with
+            theirs to decide what to use.
+            Visibility is carried over from this pose, or other_pose if
+            this one has none.
+        '''
+        def combine(mine, theirs):
+            if mine is None:
+                return None if theirs is None else missing_from_self(theirs)
+            if theirs is None:
+                return mine
+            return operation(mine, theirs)
+
+        return QuantifiedPose.from_arrays(
+            combine(self.world_array, other_pose.world_array),
+            combine(self.image_array, other_pose.image_array),
+            self.visibility if self.visibility is not None
+            else other_pose.visibility,
+            combine(self.angle_array, other_pose.angle_array),
+        )
+
     def minus(self, other_pose):
         '''
             Subtract the values of angles and both types of landmarks
             of other_pose from this pose, returning a new copy 
         '''
-        diff = QuantifiedPose(self.world_landmarks, self.image_landmarks, self.angles)
-
-        if other_pose.world_landmarks and diff.world_landmarks:
-            for i, landmark in enumerate(diff.world_landmarks.landmark):
-                landmark.x -= other_pose.world_landmarks.landmark[i].x
-                landmark.y -= other_pose.world_landmarks.landmark[i].y
-                landmark.z -= other_pose.world_landmarks.landmark[i].z
-        
-        if other_pose.image_landmarks and diff.image_landmarks:
-            for i, landmark in enumerate(diff.image_landmarks.landmark):
-                landmark.x -= other_pose.image_landmarks.landmark[i].x
-                landmark.y -= other_pose.image_landmarks.landmark[i].y
-                landmark.z -= other_pose.image_landmarks.landmark[i].z
-
-        for key in diff.angles.keys():
-            diff.angles[key] -= other_pose.angles[key]
-
-        return diff
+        return self._combine(other_pose, np.subtract, lambda theirs: None)
 
     def plus(self, other_pose):
         '''
             Add the values of angles and both types of landmarks
             of other_pose to this pose, returning a new copy 
         '''
-        diff = QuantifiedPose(
-            self.world_landmarks,
-            self.image_landmarks,
-            self.angles
-        )
-
-        if not diff.world_landmarks:
-            diff.world_landmarks = other_pose.world_landmarks
-        else:
-            for i, landmark in enumerate(diff.world_landmarks.landmark):
-                landmark.x += other_pose.world_landmarks.landmark[i].x
-                landmark.y += other_pose.world_landmarks.landmark[i].y
-                landmark.z += other_pose.world_landmarks.landmark[i].z
-        
-        if not diff.image_landmarks:
-            diff.image_landmarks = other_pose.image_landmarks
-        else:
-            for i, landmark in enumerate(diff.image_landmarks.landmark):
-                landmark.x += other_pose.image_landmarks.landmark[i].x
-                landmark.y += other_pose.image_landmarks.landmark[i].y
-                landmark.z += other_pose.image_landmarks.landmark[i].z
+        return self._combine(other_pose, np.add, np.copy)
 
-        for key in other_pose.angles.keys():
-            diff.angles[key] = diff.angles.get(key, 0.0) + other_pose.angles[key]
-
-        return diff
-    
     def multiply_by(self, scale_factor=1.0):
         '''
             Multiply the values of angles and both types of landmarks
-            of this pose by the given scale_factor.
+            of this pose by the given scale_factor, returning a new copy.
             Mostly used for averaging a set of poses in training
         '''
+        def scale(array):
+            return None if array is None else array * np.float32(scale_factor)
+
+        return QuantifiedPose.from_arrays(
+            scale(self.world_array),
+            scale(self.image_array),
+            self.visibility,
+            scale(self.angle_array),
+        )
 
-        if self.world_landmarks:
-            for i, landmark in enumerate(self.world_landmarks.landmark):
-                landmark.x *= scale_factor
-                landmark.y *= scale_factor
-                landmark.z *= scale_factor
-        
-        if self.image_landmarks:
-            for i, landmark in enumerate(self.image_landmarks.landmark):
-                landmark.x *= scale_factor
-                landmark.y *= scale_factor
-                landmark.z *= scale_factor
-
-        for key in self.angles.keys():
-            self.angles[key] *= scale_factor
-
-        return self
-    
     def similarity_to(self, other_pose):
         '''
             Returns the cosine-similarity compared to the other_pose.
@@ -196,14 +334,12 @@ class QuantifiedPose:
             Value ranges from -1 (exactly opposing) to +1 (exactly
             the same)
         '''
-        if self.angles and other_pose.angles:
-            vector1 = self.angles.values()
-            vector2 = other_pose.angles.values()
-            dot12 = vector_maths.dot(vector1, vector2)
-            mod1mod2 = (
-                vector_maths.vector_mod(vector1) * vector_maths.vector_mod(vector2)
-            )
-            return dot12 / mod1mod2
+        if self.angle_array is not None and other_pose.angle_array is not None:
+            vector1 = self.angle_array.astype(np.float64)
+            vector2 = other_pose.angle_array.astype(np.float64)
+            dot12 = np.dot(vector1, vector2)
+            mod1mod2 = np.linalg.norm(vector1) * np.linalg.norm(vector2)
+            return float(dot12 / mod1mod2)
         else:
             return None
 
@@ -227,20 +363,38 @@ class QuantifiedPose:
         }
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(doc, f)
-            
+
+    @staticmethod
+    def from_dict(doc):
+        '''
+            Return a new instance initialised with the given dict, in the
+            same form as saved by save()
+        '''
+        world_array, visibility = landmark_arrays(doc.get("world_landmarks") or {})
+        image_array, image_visibility = landmark_arrays(doc.get("image_landmarks") or {})
+        return QuantifiedPose.from_arrays(
+            world_array if len(world_array) else None,
+            image_array if len(image_array) else None,
+            visibility if visibility is not None else image_visibility,
+            QuantifiedPose._angle_array_from(doc.get("angles")),
+        )
+
+    @staticmethod
+    def _angle_array_from(angles):
+        if not angles:
+            return None
+        return np.array([angles.get(name, 0.0)
+                         for name in QuantifiedPose.ANGLE_NAMES],
+                        dtype=np.float32)
+
     @staticmethod
     def load(filepath):
         '''
             Return a new instance initialised with the JSON data
             in the given filepath
         '''
-        doc = json.load(open(filepath, 'r', encoding='utf-8'))
-        pose = QuantifiedPose(
-            ParseDict(doc.get("world_landmarks"), LandmarkList()),
-            ParseDict(doc.get("image_landmarks"), LandmarkList()),
-            doc.get("angles"),
-        )
-        return pose
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return QuantifiedPose.from_dict(json.load(f))
     
     def plot_3d(self):
         '''
@@ -248,4 +402,4 @@ class QuantifiedPose:
         '''
         mp_pose = mp.solutions.pose
         mp_drawing = mp.solutions.drawing_utils
-        mp_drawing.plot_landmarks(self.world_landmarks, mp_pose.POSE_CONNECTIONS)
\ No newline at end of file
+        mp_drawing.plot_landmarks(self.world_landmarks, mp_pose.POSE_CONNECTIONS)
@@ -0,0 +1,128 @@
+'''
+  Tracking the region of the frame that the fighter is in, so that pose
+  inference only needs to look at that region, rather than the whole of
+  a wide gym shot.
+'''
+import numpy as np
+
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+class RoiTracker:
+    '''
+      Keeps a box (left, top, right, bottom), in pixels, around the image
+      landmarks of the last pose found - padded by padding times the size
+      of the landmarks' bounding box on each side.
+
+      The box only moves when the landmarks get near its edge, so that the
+      landmarker sees the same crop from frame to frame, and can keep
+      tracking the pose within it.
+
+      A pose found in the box is rejected - meaning inference should be
+      run on the whole frame instead - if its mean visibility is below
+      min_visibility, or any of its visible landmarks are within
+      edge_margin (as a fraction of the box size) of an edge of the box
+      which isn't also an edge of the frame.
+
+      If the box would cover more than max_area of the frame, there's no
+      box - cropping wouldn't save enough to be worth it
+    '''
+    def __init__(self, padding=0.25, min_visibility=0.5, edge_margin=0.02,
+                 max_area=0.8):
+        self.padding = padding
+        self.min_visibility = min_visibility
+        self.edge_margin = edge_margin
+        self.max_area = max_area
+        self.box = None
+        self.hits = 0
+        self.fallbacks = 0
+
+    def visible_points(self, pose, width, height):
+        '''
+          The (n, 2) pixel co-ordinates of the visible image landmarks of
+          the given pose, in a width x height frame
+        '''
+        points = pose.image_array[:, 0:2] * np.array([width, height],
+                                                     np.float32)
+        if pose.visibility is not None:
+            points = points[pose.visibility >= self.min_visibility]
+        return points
+
+    def accept(self, pose, width, height):
+        '''
+          True if the given pose - found in the current box of a width x
+          height frame, and mapped back to the whole frame - can be used
+        '''
+        if pose is None or pose.image_array is None or self.box is None:
+            return False
+        if (pose.visibility is not None and
+                pose.visibility.mean() < self.min_visibility):
+            return False
+        points = self.visible_points(pose, width, height)
+        if not len(points):
+            return False
+
+        left, top, right, bottom = self.box
+        margin_x = self.edge_margin * (right - left)
+        margin_y = self.edge_margin * (bottom - top)
+        near_edge = (
+            (left > 0 and points[:, 0].min() < left + margin_x) or
+            (top > 0 and points[:, 1].min() < top + margin_y) or
+            (right < width and points[:, 0].max() > right - margin_x) or
+            (bottom < height and points[:, 1].max() > bottom - margin_y)
+        )
+        return not near_edge
+
+    def update(self, pose, width, height):
+        '''
+          Move the box to fit around the given pose in a width x height
+          frame, if it needs to - or lose it, if there's no pose
+        '''
+        points = None
+        if pose is not None and pose.image_array is not None:
+            points = self.visible_points(pose, width, height)
+        if points is None or not len(points):
+            self.box = None
+            return self.box
+
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        if self.box is not None:
+            left, top, right, bottom = self.box
+            margin_x = self.edge_margin * (right - left)
+            margin_y = self.edge_margin * (bottom - top)
+            if (x0 >= left + margin_x and y0 >= top + margin_y and
+                    x1 <= right - margin_x and y1 <= bottom - margin_y):
+                # still comfortably inside - leave it where it is
+                return self.box
+
+        pad_x = self.padding * (x1 - x0)
+        pad_y = self.padding * (y1 - y0)
+        left = max(0, int(np.floor(x0 - pad_x)))
+        top = max(0, int(np.floor(y0 - pad_y)))
+        right = min(width, int(np.ceil(x1 + pad_x)))
+        bottom = min(height, int(np.ceil(y1 + pad_y)))
+        if (right - left < 2 or bottom - top < 2 or
+                (right - left) * (bottom - top) > self.max_area * width * height):
+            self.box = None
+        else:
+            self.box = (left, top, right, bottom)
+        return self.box
+
+    @staticmethod
+    def remap(pose, box, width, height):
+        '''
+          Map the image landmarks of the given pose, found in the given box
+          of a width x height frame, back to co-ordinates normalised to the
+          whole frame. Returns a new QuantifiedPose
+        '''
+        left, top, right, bottom = box
+        box_width, box_height = right - left, bottom - top
+        image_array = pose.image_array.copy()
+        image_array[:, 0] = (image_array[:, 0] * box_width + left) / width
+        image_array[:, 1] = (image_array[:, 1] * box_height + top) / height
+        # MediaPipe's z is on roughly the same scale as x
+        image_array[:, 2] *= box_width / width
+        return QuantifiedPose.from_arrays(world_array=pose.world_array,
+                                          image_array=image_array,
+                                          visibility=pose.visibility,
+                                          angle_array=pose.angle_array)
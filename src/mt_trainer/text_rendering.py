@@ -1,14 +1,56 @@
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 import pdb
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, features as pil_features
+
+
+class LruCache(OrderedDict):
+    '''
+      A dict which keeps at most maxsize entries, forgetting the least
+      recently used first - for caches keyed on strings which may be
+      different every frame (e.g. 'Frame #123'), so they can't grow
+      without bound over a long video
+    '''
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+        return value
 
 
 class Cv2TextRenderer:
     '''
       image - must be a numpy array
+
+      Font scales and text sizes are cached, as the same strings tend to
+      be rendered over & over again. Only the most recent text sizes are
+      kept (see LruCache)
     '''
+    def __init__(self, text_size_cache_size=1024):
+        self.font_scales = {}
+        self.text_sizes = LruCache(text_size_cache_size)
+
+    def font_scale(self, font_face, pixel_height, thickness=1):
+        key = (font_face, pixel_height, thickness)
+        scale = self.font_scales.get(key)
+        if scale is None:
+            scale = cv2.getFontScaleFromHeight(font_face, pixel_height, thickness)
+            self.font_scales[key] = scale
+        return scale
 
     def render(self, string, image, top=0, left=0, font_face=cv2.FONT_HERSHEY_COMPLEX, pixel_height=10, color=(0, 0, 0), thickness=1):
         '''
@@ -20,12 +62,52 @@ class Cv2TextRenderer:
                     string,
                     (left, top),
                     font_face,
-                    cv2.getFontScaleFromHeight(
-                        font_face, pixel_height, thickness),
+                    self.font_scale(font_face, pixel_height, thickness),
                     color,
                     thickness,
                     cv2.LINE_AA)
 
+    def text_size(self,
+                  string,
+                  pixel_height,
+                  font_face=cv2.FONT_HERSHEY_COMPLEX,
+                  thickness=1):
+        '''
+          Return (width, height, baseline) in pixels of the given string,
+          when rendered in the given font at the given pixel height -
+          as cv2.getTextSize
+        '''
+        key = (string, pixel_height, font_face, thickness)
+        size = self.text_sizes.get(key)
+        if size is None:
+            (width, height), baseline = cv2.getTextSize(
+                string,
+                font_face,
+                self.font_scale(font_face, pixel_height, thickness),
+                thickness)
+            size = self.text_sizes.put(key, (width, height, baseline))
+        return size
+
+    def text_box(self,
+                 string,
+                 top=0,
+                 left=0,
+                 pixel_height=10,
+                 font_face=cv2.FONT_HERSHEY_COMPLEX,
+                 thickness=1):
+        '''
+          Return (top, bottom, left, right) of the pixels which render()
+          could touch, when rendering the given string at the given
+          top/left - including anti-aliasing
+        '''
+        width, height, baseline = self.text_size(
+            string, pixel_height, font_face, thickness)
+        margin = thickness + 1
+        return (top - height - margin,
+                top + baseline + margin,
+                left - margin,
+                left + width + margin)
+
     def pixel_width(self, 
                     string,
                     pixel_height,
@@ -36,19 +118,22 @@ class Cv2TextRenderer:
           given font  on the given image, at the given pixel height, with the
           given features
         '''
-        font_scale = cv2.getFontScaleFromHeight(
-            font_face, pixel_height, thickness)
-        (value_width, _value_height), _baseline = cv2.getTextSize(
-            string, font_face, font_scale, 1)
-        return value_width
+        return self.text_size(string, pixel_height, font_face, thickness)[0]
 
 
 class PILTextRenderer:
+    '''
+      Fonts are loaded once per font face, and each size of them is kept
+      (see LruCache) once measured at that size, as loading a FreeType
+      face is far slower than measuring a string with it
+    '''
     DEFAULT_FONT_FACE = "SourceSans3-Regular.ttf"
     DEFAULT_FONT_PATH = "assets/fonts/"
 
-    def __init__(self, fonts=DEFAULT_FONT_FACE, font_path=DEFAULT_FONT_PATH):
+    def __init__(self, fonts=DEFAULT_FONT_FACE, font_path=DEFAULT_FONT_PATH,
+                 sized_font_cache_size=32):
         self.fonts = {}
+        self.sized_fonts = LruCache(sized_font_cache_size)
         self.font_path = font_path
         if isinstance(fonts, str):
             fonts = [fonts]
@@ -65,13 +150,22 @@ class PILTextRenderer:
 
         return this_font
 
+    def sized_font(self, font_face, pixel_height):
+        ''' The given font face at the given pixel height '''
+        key = (font_face, pixel_height)
+        font = self.sized_fonts.get(key)
+        if font is None:
+            font = self.sized_fonts.put(
+                key, self.lazy_load_font(font_face).font_variant(size=pixel_height))
+        return font
+
     def pixel_width(self, string, image, pixel_height, font_face=DEFAULT_FONT_FACE, features=None):
         '''
           Return the width in pixels of the given string, when rendered in the given font 
           on the given image, at the given pixel height with the given features
         '''
-        # hack - textlength() only works with an actual ImageDraw object, so just return
-        return len(string) * pixel_height
+        font = self.sized_font(font_face, pixel_height)
+        return int(round(font.getlength(string, features=features)))
 
     def render(self, string, image, top=0, left=0, font=None, font_face=DEFAULT_FONT_FACE, align='left', pixel_height=10, color=(0, 0, 0), thickness=1):
         '''
@@ -106,3 +200,218 @@ class PILTextRenderer:
             font or self.lazy_load_font(font_face)), fill=color)
         # convert it back to OpenCV format
         return cv2.cvtColor(np.array(pil_im), cv2.COLOR_RGB2BGR)
+
+
+class Glyph:
+    '''
+      One rasterised character:
+        alpha   - 2D uint8 coverage mask
+        left    - x offset of the mask from the pen position
+        top     - y offset of the mask from the baseline (negative is up)
+        advance - how far the pen moves on after this character (may be
+                  fractional - pen positions are rounded when blitting)
+    '''
+    __slots__ = ('alpha', 'left', 'top', 'advance')
+
+    def __init__(self, alpha, left, top, advance):
+        self.alpha = alpha
+        self.left = left
+        self.top = top
+        self.advance = advance
+
+
+class GlyphAtlas:
+    '''
+      The glyphs of one font at one pixel height, each rasterised the
+      first time it's needed, and the coverage masks of the most recently
+      used strings built from them (see LruCache).
+
+      Glyphs come from a PIL TrueType font if given one, otherwise
+      from a Hershey font via cv2.putText
+    '''
+    def __init__(self, pixel_height, font=None,
+                 font_face=cv2.FONT_HERSHEY_COMPLEX, thickness=1,
+                 string_cache_size=256):
+        self.pixel_height = pixel_height
+        self.font = font
+        self.font_face = font_face
+        self.thickness = thickness
+        self.font_scale = cv2.getFontScaleFromHeight(font_face, pixel_height,
+                                                     thickness)
+        self.glyphs = {}
+        self.strings = LruCache(string_cache_size)
+
+    def glyph(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            if self.font:
+                glyph = self.rasterise_truetype(char)
+            else:
+                glyph = self.rasterise_hershey(char)
+            self.glyphs[char] = glyph
+        return glyph
+
+    def rasterise_truetype(self, char):
+        left, top, right, bottom = self.font.getbbox(char, anchor='ls')
+        mask = Image.new('L', (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), char, fill=255,
+                                  font=self.font, anchor='ls')
+        return Glyph(np.asarray(mask, dtype=np.uint8), left, top,
+                     self.font.getlength(char))
+
+    def rasterise_hershey(self, char):
+        font_scale = self.font_scale
+        (width, height), baseline = cv2.getTextSize(
+            char, self.font_face, font_scale, self.thickness)
+        # an approximation of the advance cv2.putText uses - close enough
+        # to place glyphs, but widths come from cv2.getTextSize itself
+        # (see string_width)
+        (unit_width, _), _ = cv2.getTextSize(char, self.font_face, 1.0, 1)
+        # room for anti-aliasing all round
+        margin = self.thickness + 1
+        mask = np.zeros((height + baseline + 2 * margin, width + 2 * margin),
+                        np.uint8)
+        cv2.putText(mask, char, (margin, height + margin), self.font_face,
+                    font_scale, 255, self.thickness, cv2.LINE_AA)
+        return Glyph(mask, -margin, -(height + margin),
+                     (unit_width - 1) * font_scale)
+
+    def string_width(self, string, advances):
+        '''
+          Width in pixels of the given string, whose glyphs' pen positions
+          add up to advances - or, for Hershey fonts, whatever
+          cv2.getTextSize says, so it matches Cv2TextRenderer whatever
+          the version of OpenCV
+        '''
+        if not string:
+            return 0
+        if self.font:
+            return int(round(advances))
+        (width, _), _ = cv2.getTextSize(string, self.font_face,
+                                        self.font_scale, self.thickness)
+        return width
+
+    def string_mask(self, string):
+        '''
+          Return (alpha, left, top, width) - the coverage mask of the whole
+          string, its offset from the pen position & baseline, and its
+          width (see string_width)
+        '''
+        cached = self.strings.get(string)
+        if cached is not None:
+            return cached
+
+        glyphs = [self.glyph(char) for char in string]
+        advances = np.cumsum([0.0] + [glyph.advance for glyph in glyphs])
+        width = self.string_width(string, advances[-1])
+        pen_positions = [int(round(x)) for x in advances]
+        if not glyphs:
+            return self.strings.put(string, (np.zeros((0, 0), np.uint8), 0, 0, 0))
+
+        left = min(x + g.left for x, g in zip(pen_positions, glyphs))
+        right = max(x + g.left + g.alpha.shape[1]
+                    for x, g in zip(pen_positions, glyphs))
+        top = min(g.top for g in glyphs)
+        bottom = max(g.top + g.alpha.shape[0] for g in glyphs)
+
+        alpha = np.zeros((bottom - top, right - left), np.uint8)
+        for x, glyph in zip(pen_positions, glyphs):
+            y0 = glyph.top - top
+            x0 = x + glyph.left - left
+            region = alpha[y0:y0 + glyph.alpha.shape[0],
+                           x0:x0 + glyph.alpha.shape[1]]
+            np.maximum(region, glyph.alpha, out=region)
+
+        return self.strings.put(string, (alpha, int(left), int(top), width))
+
+
+class GlyphAtlasTextRenderer:
+    '''
+      A drop-in replacement for Cv2TextRenderer, which rasterises each
+      glyph once (see GlyphAtlas) and then alpha-blends whole strings
+      straight into the image - so no per-call rasterising, and no
+      conversion of the image to or from PIL.
+
+      Uses the TrueType font_file if given, otherwise Pillow's built-in
+      scalable font if Pillow has FreeType support, otherwise the Hershey
+      font that Cv2TextRenderer uses.
+
+      As with Cv2TextRenderer, top is the baseline of the text.
+      font_face may be the path of another TrueType font file - anything
+      else (e.g. a cv2 font constant) means the default font
+    '''
+    def __init__(self, font_file=None, use_default_font=True):
+        self.font_file = font_file
+        self.use_default_font = use_default_font
+        self.atlases = {}
+
+    def atlas(self, pixel_height, font_face=None, thickness=1):
+        if not isinstance(font_face, str):
+            font_face = self.font_file
+        key = (font_face, pixel_height, thickness)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            font = None
+            if font_face:
+                font = ImageFont.truetype(font_face, size=pixel_height)
+            elif self.use_default_font and pil_features.check('freetype2'):
+                font = ImageFont.load_default(size=pixel_height)
+            atlas = GlyphAtlas(pixel_height, font=font, thickness=thickness)
+            self.atlases[key] = atlas
+        return atlas
+
+    def render(self, string, image, top=0, left=0, font_face=None, pixel_height=10, color=(0, 0, 0), thickness=1):
+        '''
+          Alpha-blend the given string into the given image (a numpy
+          array), with its baseline at top
+        '''
+        alpha, mask_left, mask_top, _width = self.atlas(
+            pixel_height, font_face, thickness).string_mask(string)
+
+        # clip the mask to the image
+        y0, x0 = top + mask_top, left + mask_left
+        y1, x1 = y0 + alpha.shape[0], x0 + alpha.shape[1]
+        clip_y0, clip_x0 = max(0, y0), max(0, x0)
+        clip_y1, clip_x1 = min(image.shape[0], y1), min(image.shape[1], x1)
+        if clip_y0 >= clip_y1 or clip_x0 >= clip_x1:
+            return
+        alpha = alpha[clip_y0 - y0:clip_y1 - y0, clip_x0 - x0:clip_x1 - x0]
+
+        region = image[clip_y0:clip_y1, clip_x0:clip_x1]
+        coverage = alpha.astype(np.int32)
+        if region.ndim == 3:
+            coverage = coverage[:, :, np.newaxis]
+            color = np.array(color[:region.shape[2]], np.int32)
+        else:
+            color = np.int32(color if np.isscalar(color) else color[0])
+        blended = region + ((color - region) * coverage + 127) // 255
+        region[...] = blended
+
+    def text_size(self, string, pixel_height, font_face=None, thickness=1):
+        '''
+          Return (width, height, baseline) in pixels of the given string -
+          as Cv2TextRenderer.text_size
+        '''
+        alpha, _left, mask_top, width = self.atlas(
+            pixel_height, font_face, thickness).string_mask(string)
+        return width, -mask_top, max(0, alpha.shape[0] + mask_top)
+
+    def text_box(self, string, top=0, left=0, pixel_height=10, font_face=None, thickness=1):
+        '''
+          Return (top, bottom, left, right) of the pixels which render()
+          will touch, when rendering the given string at the given top/left
+        '''
+        alpha, mask_left, mask_top, _width = self.atlas(
+            pixel_height, font_face, thickness).string_mask(string)
+        return (top + mask_top,
+                top + mask_top + alpha.shape[0],
+                left + mask_left,
+                left + mask_left + alpha.shape[1])
+
+    def pixel_width(self, string, pixel_height, font_face=None, thickness=1):
+        '''
+          Return the width in pixels of the given string - the total
+          advance of its glyphs, or for the Hershey font, that given by
+          cv2.getTextSize
+        '''
+        return self.atlas(pixel_height, font_face, thickness).string_mask(string)[3]
@@ -0,0 +1,186 @@
+'''
+  End-to-end throughput of annotate_video.py's pipeline - on a synthetic
+  video or real footage, with real MediaPipe inference, and with a
+  stand-in processor which replays canned landmarks instead - so the cost
+  of our own decoding, rendering & encoding can be seen apart from that
+  of inference.
+  MediaPipe finds no pose in the synthetic stick figure, so use footage
+  of a person to compare the two.
+'''
+import os
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.metrics import Metrics
+from mt_trainer.micro_benchmark import synthetic_pose
+from mt_trainer.video_annotation import annotate_frames, inference_settings
+
+BACKENDS = ('fake', 'mediapipe')
+
+# containers OpenCV can write each codec into - anything else gets .avi
+CODEC_EXTENSIONS = {
+    'mp4v': '.mp4',
+    'avc1': '.mp4',
+    'FFV1': '.mkv',
+}
+
+
+def output_extension(codec):
+    return CODEC_EXTENSIONS.get(codec, '.avi')
+
+
+def write_synthetic_video(filepath, width, height, frames, fps=30,
+                          codec='mp4v', seed=0):
+    '''
+      Write a video of the given size & length to filepath: a stick
+      figure swinging its arms across a noisy background, so that there's
+      motion & detail for the codecs to work on. It's for the fake
+      backend - MediaPipe finds no pose in it.
+      The same arguments always give the same video
+    '''
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(background, (0, 0), 3)
+    out = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*codec), fps,
+                          (width, height))
+    if not out.isOpened():
+        raise IOError(f"Could not create the video file {filepath}")
+
+    unit = min(width, height) / 10
+    thickness = max(1, int(unit / 4))
+    try:
+        for i in range(frames):
+            image = background.copy()
+            swing = np.sin(2 * np.pi * i / fps)
+            hip = (width / 2 + unit * swing, height * 0.6)
+            neck = (hip[0], hip[1] - 3 * unit)
+
+            def point(origin, dx, dy):
+                return (int(origin[0] + dx * unit), int(origin[1] + dy * unit))
+
+            limbs = [
+                (point(hip, 0, 0), point(neck, 0, 0)),
+                (point(hip, 0, 0), point(hip, -1, 3)),
+                (point(hip, 0, 0), point(hip, 1, 3)),
+                (point(neck, 0, 0), point(neck, -2 * swing, 1.5)),
+                (point(neck, 0, 0), point(neck, 2 * swing, 1.5)),
+            ]
+            for start, end in limbs:
+                cv2.line(image, start, end, (230, 230, 230), thickness,
+                         cv2.LINE_AA)
+            cv2.circle(image, point(neck, 0, -0.8), int(unit * 0.7),
+                       (230, 230, 230), -1, cv2.LINE_AA)
+            out.write(image)
+    finally:
+        out.release()
+    return filepath
+
+
+class ReplayFrameProcessor(FrameProcessor):
+    '''
+      A FrameProcessor which never runs inference - it just replays the
+      given poses, in turn, one per frame - so everything but inference
+      costs the same as with a real one.
+      By default, it replays poses of synthetic landmarks
+    '''
+    def __init__(self, poses=None, seed=0, **settings):
+        super().__init__(**settings)
+        if poses is None:
+            rng = np.random.default_rng(seed)
+            poses = [synthetic_pose(rng) for _ in range(30)]
+        self.poses = poses
+        self.frames_replayed = 0
+
+    def quantify_pose_in(self, rgb_image, box=None, bgr=False):
+        pose = self.poses[self.frames_replayed % len(self.poses)]
+        self.frames_replayed += 1
+        return pose
+
+
+def peak_rss_mb():
+    ''' Peak resident set size of this process so far, in MB '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def throughput(metrics, frames_written):
+    '''
+      The frames per second of a run which wrote frames_written frames,
+      and the mean milliseconds per frame written of each stage, from its
+      Metrics - see run_throughput.
+      Raises ValueError if no frames were written - i.e. no pose was found
+      in any frame - as then nothing but decoding & inference ran, so the
+      timings can't be compared with those of any other run
+    '''
+    if not frames_written:
+        raise ValueError("No frames were written, as no pose was found in "
+                         "any of them - so the timings would only be of "
+                         "decoding & inference. Use footage in which the "
+                         "backend finds a pose")
+    seconds = sum(metrics.samples.get('pipeline', []))
+    stages = {}
+    for name in sorted(metrics.samples):
+        if name != 'pipeline':
+            stages[name] = sum(metrics.samples[name]) * 1000.0 / frames_written
+    return {
+        'frames': frames_written,
+        'seconds': seconds,
+        'fps': frames_written / seconds if seconds else 0.0,
+        'stage_ms_per_frame': stages,
+    }
+
+
+def run_throughput(options, backend, frames):
+    '''
+      Annotate the first frames of options.input_file into
+      options.output_file, with the given backend - 'mediapipe', or
+      'fake' for a ReplayFrameProcessor.
+      The model is loaded before the clock starts.
+      Returns a dict of the frames per second of the pipeline, the mean
+      milliseconds per frame of each stage (see throughput), and the peak
+      RSS of this process - so run each in a fresh process (see
+      run_in_fresh_process) for that to mean anything.
+      Raises ValueError if the backend found no pose in any frame
+    '''
+    metrics = Metrics()
+    if backend == 'fake':
+        processor = ReplayFrameProcessor(**inference_settings(options))
+    else:
+        processor = FrameProcessor(**inference_settings(options))
+        processor.pose_landmarker
+    frames_written = annotate_frames(options, options.output_file, 0, frames,
+                                     metrics=metrics, processor=processor)
+    try:
+        result = throughput(metrics, frames_written)
+    except ValueError as e:
+        raise ValueError(f"{backend} on {options.input_file}: {e}") from None
+    result.update({
+        'peak_rss_mb': peak_rss_mb(),
+        'output_bytes': os.path.getsize(options.output_file),
+    })
+    return result
+
+
+def run_in_fresh_process(options, backend, frames):
+    '''
+      run_throughput, in a new (spawned) process of its own - so its
+      peak RSS is its own, and each backend starts from cold
+    '''
+    with ProcessPoolExecutor(max_workers=1,
+                             mp_context=get_context('spawn')) as pool:
+        return pool.submit(run_throughput, options, backend, frames).result()
+
+
+def summary(result):
+    ''' One line for a result of run_throughput, with its stages by cost '''
+    stages = sorted(result['stage_ms_per_frame'].items(),
+                    key=lambda stage: stage[1], reverse=True)
+    return (f"{result['fps']:.1f} fps, peak RSS {result['peak_rss_mb']:.0f}MB - " +
+            ', '.join(f"{name} {ms:.2f}ms" for name, ms in stages))
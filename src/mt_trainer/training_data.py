@@ -0,0 +1,395 @@
+'''
+  Loading training data - JSON-serialised QuantifiedPoses, organised into
+  a sub-folder for each technique - into arrays, and caching those arrays
+  in a compiled binary form so that later loads are near-instant.
+'''
+import hashlib
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from mt_trainer.file_system import FileSystem
+from mt_trainer.quantified_pose import QuantifiedPose
+
+N_LANDMARKS = 33
+TRAINING_FILE_EXTENSION = '.json'
+
+# errors which mean a training file is malformed, rather than missing
+MALFORMED_FILE_ERRORS = (ValueError, UnicodeDecodeError, KeyError, IndexError,
+                         TypeError, AttributeError)
+
+
+class LoadReport:
+    '''
+      What happened to each file when loading training data:
+
+      loaded    - list of files loaded successfully
+      skipped   - list of files which aren't training data (wrong extension)
+      malformed - list of (file, error message) for files which couldn't be
+                  parsed
+      cache_file - the compiled cache the data came from, if any
+
+      File paths are relative to the training data directory
+    '''
+    def __init__(self, loaded=None, skipped=None, malformed=None,
+                 cache_file=None):
+        self.loaded = list(loaded or [])
+        self.skipped = list(skipped or [])
+        self.malformed = list(malformed or [])
+        self.cache_file = cache_file
+
+    @staticmethod
+    def merge(reports):
+        ''' Combine the given reports into one, preserving their order '''
+        merged = LoadReport()
+        for report in reports:
+            merged.loaded.extend(report.loaded)
+            merged.skipped.extend(report.skipped)
+            merged.malformed.extend(report.malformed)
+        return merged
+
+    def summary(self):
+        source = f" (from cache {self.cache_file})" if self.cache_file else ''
+        return (f"{len(self.loaded)} training files loaded{source}, "
+                f"{len(self.skipped)} skipped, "
+                f"{len(self.malformed)} malformed")
+
+    def __str__(self):
+        lines = [self.summary()]
+        lines += ['  skipped ' + file for file in self.skipped]
+        lines += [f"  malformed {file} - {error}"
+                  for file, error in self.malformed]
+        return '\n'.join(lines)
+
+
+class TrainingSet:
+    '''
+      Every training sample, as float32 arrays with one row per sample:
+
+      world       - (N, 33, 3) world landmarks
+      image       - (N, 33, 3) image landmarks
+      visibility  - (N, 33) landmark visibility
+      angles      - (N, n_angles) body angles, in QuantifiedPose.ANGLE_NAMES
+                    order
+      techniques  - (N,) index into technique_names of each sample
+      files       - (N,) the file each sample was loaded from, relative to
+                    the training data directory
+
+      Anything missing from a sample's file is NaN.
+    '''
+    CACHE_FORMAT_VERSION = 2
+
+    def __init__(self, technique_names, techniques, world, image,
+                 visibility, angles, files, fingerprint=None, report=None):
+        self.technique_names = list(technique_names)
+        self.techniques = techniques
+        self.world = world
+        self.image = image
+        self.visibility = visibility
+        self.angles = angles
+        self.files = list(files)
+        self.fingerprint = fingerprint
+        self.report = report or LoadReport(loaded=self.files)
+
+    def __len__(self):
+        return len(self.techniques)
+
+    @staticmethod
+    def empty_arrays(n_samples):
+        ''' Return NaN-filled world, image, visibility & angle arrays '''
+        n_angles = len(QuantifiedPose.ANGLE_NAMES)
+        return (
+            np.full((n_samples, N_LANDMARKS, 3), np.nan, dtype=np.float32),
+            np.full((n_samples, N_LANDMARKS, 3), np.nan, dtype=np.float32),
+            np.full((n_samples, N_LANDMARKS), np.nan, dtype=np.float32),
+            np.full((n_samples, n_angles), np.nan, dtype=np.float32),
+        )
+
+    @staticmethod
+    def from_poses(technique_names, techniques, poses, files, fingerprint=None):
+        '''
+          Build a TrainingSet from a list of QuantifiedPoses, with
+          techniques giving the index into technique_names of each one
+        '''
+        world, image, visibility, angles = TrainingSet.empty_arrays(len(poses))
+        for i, pose in enumerate(poses):
+            if pose.world_array is not None:
+                world[i] = pose.world_array
+            if pose.image_array is not None:
+                image[i] = pose.image_array
+            if pose.visibility is not None:
+                visibility[i] = pose.visibility
+            if pose.angle_array is not None:
+                angles[i] = pose.angle_array
+
+        return TrainingSet(technique_names,
+                           np.asarray(techniques, dtype=np.int32),
+                           world, image, visibility, angles,
+                           files, fingerprint)
+
+    @staticmethod
+    def concatenate(technique_names, parts, fingerprint=None):
+        '''
+          Merge the given TrainingSets - which must share technique_names -
+          into one, keeping their samples (and so the count for each
+          technique) and load reports in order
+        '''
+        if not parts:
+            parts = [TrainingSet.from_poses(technique_names, [], [], [])]
+        return TrainingSet(
+            technique_names,
+            np.concatenate([part.techniques for part in parts]),
+            np.concatenate([part.world for part in parts]),
+            np.concatenate([part.image for part in parts]),
+            np.concatenate([part.visibility for part in parts]),
+            np.concatenate([part.angles for part in parts]),
+            [file for part in parts for file in part.files],
+            fingerprint,
+            LoadReport.merge([part.report for part in parts]),
+        )
+
+    def counts(self):
+        ''' The number of samples for each technique '''
+        return np.bincount(self.techniques,
+                           minlength=len(self.technique_names))
+
+    def archetypes(self):
+        '''
+          Return a dict of technique name => QuantifiedPose which is the
+          average of all that technique's samples.
+          Techniques with no samples get an empty QuantifiedPose
+        '''
+        archetypes = {}
+        for i, technique in enumerate(self.technique_names):
+            samples = self.techniques == i
+            if not samples.any():
+                archetypes[technique] = QuantifiedPose()
+                continue
+
+            archetypes[technique] = QuantifiedPose.from_arrays(
+                self._mean(self.world[samples]),
+                self._mean(self.image[samples]),
+                self._first(self.visibility[samples]),
+                self._mean(self.angles[samples]),
+            )
+        return archetypes
+
+    @staticmethod
+    def _mean(arrays):
+        ''' Mean of the given samples, ignoring any that are missing '''
+        present = ~np.isnan(arrays.reshape(len(arrays), -1)).any(axis=1)
+        if not present.any():
+            return None
+        return arrays[present].mean(axis=0)
+
+    @staticmethod
+    def _first(arrays):
+        ''' The first of the given samples which isn't missing '''
+        present = ~np.isnan(arrays.reshape(len(arrays), -1)).any(axis=1)
+        if not present.any():
+            return None
+        return arrays[np.argmax(present)]
+
+    def save(self, filepath):
+        ''' Save as an uncompressed .npz bundle of arrays '''
+        with open(filepath, 'wb') as f:
+            np.savez(f,
+                     version=np.int32(self.CACHE_FORMAT_VERSION),
+                     fingerprint=np.str_(self.fingerprint or ''),
+                     technique_names=np.array(self.technique_names, dtype=np.str_),
+                     techniques=self.techniques,
+                     world=self.world,
+                     image=self.image,
+                     visibility=self.visibility,
+                     angles=self.angles,
+                     files=np.array(self.files, dtype=np.str_),
+                     skipped=np.array(self.report.skipped, dtype=np.str_),
+                     malformed=np.array(self.report.malformed,
+                                        dtype=np.str_).reshape(-1, 2))
+
+    @staticmethod
+    def load(filepath):
+        '''
+          Return a TrainingSet loaded from the given .npz bundle, or None if
+          it isn't in the current cache format
+        '''
+        with np.load(filepath, allow_pickle=False) as bundle:
+            if int(bundle['version']) != TrainingSet.CACHE_FORMAT_VERSION:
+                return None
+            files = bundle['files'].tolist()
+            report = LoadReport(
+                loaded=files,
+                skipped=bundle['skipped'].tolist(),
+                malformed=[tuple(m) for m in bundle['malformed'].tolist()],
+                cache_file=filepath)
+            return TrainingSet(bundle['technique_names'].tolist(),
+                               bundle['techniques'],
+                               bundle['world'],
+                               bundle['image'],
+                               bundle['visibility'],
+                               bundle['angles'],
+                               files,
+                               str(bundle['fingerprint']),
+                               report)
+
+
+def technique_names_in(data_dir):
+    ''' The name of each technique sub-folder of data_dir, sorted '''
+    return sorted([d.name for d in os.scandir(data_dir) if d.is_dir()])
+
+
+def training_files_in(data_dir, technique_names=None):
+    '''
+      Return a list of (technique index, file path) for every file in
+      each technique sub-folder of data_dir, in a stable order
+    '''
+    technique_names = technique_names or technique_names_in(data_dir)
+    return [
+        (i, file)
+        for i, technique in enumerate(technique_names)
+        for file in sorted(FileSystem.files_in(os.path.join(data_dir, technique)))
+    ]
+
+
+def fingerprint(data_dir):
+    '''
+      A hash of the listing of data_dir, including the size and
+      modification time of every training file - so it changes whenever
+      a file is added, removed, renamed or edited
+    '''
+    technique_names = technique_names_in(data_dir)
+    digest = hashlib.sha1('\0'.join(technique_names).encode('utf-8'))
+    for technique, file in training_files_in(data_dir, technique_names):
+        stat = os.stat(file)
+        digest.update(
+            f"{technique}\0{os.path.relpath(file, data_dir)}\0"
+            f"{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8')
+        )
+    return digest.hexdigest()
+
+
+def default_cache_file(data_dir):
+    '''
+      The cache lives alongside the training data directory, not inside it,
+      so that it's never mistaken for training data
+    '''
+    return os.path.normpath(data_dir) + '.cache.npz'
+
+
+def read_training_files(data_dir, technique_names, technique_files):
+    '''
+      Parse the given list of (technique index, file path) into a
+      TrainingSet, with a LoadReport of what happened to each file.
+      Runs in a worker process, so it must be a module-level function
+    '''
+    techniques, poses, files = [], [], []
+    report = LoadReport()
+    for technique, file in technique_files:
+        relative_path = os.path.relpath(file, data_dir)
+        if not file.endswith(TRAINING_FILE_EXTENSION):
+            report.skipped.append(relative_path)
+            continue
+
+        try:
+            pose = QuantifiedPose.load(file)
+            for array, shape in [(pose.world_array, (N_LANDMARKS, 3)),
+                                 (pose.image_array, (N_LANDMARKS, 3)),
+                                 (pose.angle_array,
+                                  (len(QuantifiedPose.ANGLE_NAMES),))]:
+                if array is not None and array.shape != shape:
+                    raise ValueError(f"expected shape {shape}, "
+                                     f"got {array.shape}")
+            if pose.angle_array is None:
+                raise ValueError('no angles or world landmarks')
+        except MALFORMED_FILE_ERRORS as error:
+            report.malformed.append((relative_path, str(error)))
+            continue
+
+        techniques.append(technique)
+        poses.append(pose)
+        files.append(relative_path)
+
+    training_set = TrainingSet.from_poses(technique_names, techniques,
+                                          poses, files)
+    training_set.report.skipped = report.skipped
+    training_set.report.malformed = report.malformed
+    return training_set
+
+
+def _read_training_files_args(args):
+    return read_training_files(*args)
+
+
+def read_training_set(data_dir, fingerprint=None, workers=None,
+                      executor='process', chunk_size=64):
+    '''
+      Parse every JSON training file under data_dir into a TrainingSet.
+
+      The files are split into chunks of chunk_size, which are parsed in
+      parallel by a pool of workers (default: one per CPU) - either
+      'process'es or 'thread's as given by executor. The parsed chunks
+      are then concatenated in order.
+      If there's only one chunk, or workers is 1, it's all done in this
+      process instead.
+
+      Files which can't be parsed are listed in the returned TrainingSet's
+      report, rather than raising an error
+    '''
+    technique_names = technique_names_in(data_dir)
+    technique_files = training_files_in(data_dir, technique_names)
+    chunks = [
+        (data_dir, technique_names, technique_files[i:i + chunk_size])
+        for i in range(0, len(technique_files), chunk_size)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    if workers <= 1:
+        parts = [read_training_files(*chunk) for chunk in chunks]
+    else:
+        pool_class = (ThreadPoolExecutor if executor == 'thread'
+                      else ProcessPoolExecutor)
+        with pool_class(max_workers=workers) as pool:
+            parts = list(pool.map(_read_training_files_args, chunks))
+
+    return TrainingSet.concatenate(technique_names, parts, fingerprint)
+
+
+def load_training_set(data_dir, cache_file=None, use_cache=True,
+                      workers=None, executor='process'):
+    '''
+      Return a TrainingSet of all the training data under data_dir.
+      If use_cache is True, it's loaded from cache_file (default: see
+      default_cache_file) if that is still up-to-date, otherwise it's
+      re-read from the JSON files (see read_training_set for workers &
+      executor), and cache_file is re-written
+    '''
+    if not use_cache:
+        return read_training_set(data_dir, workers=workers, executor=executor)
+
+    cache_file = cache_file or default_cache_file(data_dir)
+    current_fingerprint = fingerprint(data_dir)
+
+    if os.path.exists(cache_file):
+        try:
+            training_set = TrainingSet.load(cache_file)
+            if training_set and training_set.fingerprint == current_fingerprint:
+                return training_set
+        except (OSError, ValueError, KeyError) as error:
+            print('Ignoring unreadable training data cache',
+                  cache_file, '-', error, file=sys.stderr)
+
+    training_set = read_training_set(data_dir, current_fingerprint,
+                                     workers=workers, executor=executor)
+    try:
+        # write to a temporary file first, so that nothing ever reads a
+        # half-written cache
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        training_set.save(temp_file)
+        os.replace(temp_file, cache_file)
+    except OSError as error:
+        print('Could not write training data cache',
+              cache_file, '-', error, file=sys.stderr)
+    return training_set
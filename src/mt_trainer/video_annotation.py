@@ -0,0 +1,576 @@
+'''
+  Annotating a video file - or a range of its frames - with the detected
+  pose landmarks, body angles and pose classification.
+  This is the engine behind annotate_video.py. It lives here, rather than
+  in the script, so that worker processes can import it when a long video
+  is split into shards.
+
+  options is the argparse Namespace from annotate_video.py
+'''
+import copy
+import math
+import os
+import shutil
+import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+
+from mt_trainer import inference_benchmark
+from mt_trainer.adaptive_inference import AdaptiveInference, MotionGate
+from mt_trainer.camera import Camera
+from mt_trainer.frame_annotator import FrameAnnotator
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.graph_plotter import GraphPlotter
+from mt_trainer.landmark_cache import LandmarkCache
+from mt_trainer.layout import Layout
+from mt_trainer.metrics import NULL_METRICS, Metrics
+from mt_trainer.nearest_neighbour_classifier import NearestNeighbourClassifier
+from mt_trainer.pipeline import Pipeline
+from mt_trainer.pose_classifier import PoseClassifier
+from mt_trainer.profiling import Profiler
+from mt_trainer.text_rendering import Cv2TextRenderer, GlyphAtlasTextRenderer
+from mt_trainer.training_data import load_training_set
+from mt_trainer.video_source import VideoIndex, VideoSource
+
+FONT_SIZE = 12
+PADDING = 2
+
+# shards are written losslessly, so that stitching them together doesn't
+# add a second generation of compression artifacts
+SEGMENT_CODEC = 'FFV1'
+SEGMENT_EXTENSION = '.mkv'
+
+
+def decode_fourcc(four_cc_int_value):
+    """FourCC values from a video file are packed into an int.
+    We need to decode them into four actual characters if we
+    want to re-use them.
+    """
+    return "".join(
+        [chr((int(four_cc_int_value) >> 8 * i) & 0xFF) for i in range(4)]
+    )
+
+
+def print_debug_line(options, *variables):
+    ''' Writes the given line to STDOUT if in verbose mode, otherwise no-op '''
+    if options.verbose == 'true':
+        sys.stdout.write(' '.join([str(var) for var in variables]))
+
+
+class VideoInfo:
+    '''
+      The properties of the input video which we need to work out the
+      properties of the output video
+    '''
+    def __init__(self, input_file):
+        cap = cv2.VideoCapture(input_file)
+        if cap.isOpened() is False:
+            print("Error opening video stream or file")
+            raise TypeError
+        self.frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.codec = decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC))
+        cap.release()
+
+    def output_size(self, options):
+        ''' [width, height] of the video part of each output frame '''
+        return [
+            options.output_width or int(self.frame_width * 0.01 * options.output_scale),
+            options.output_height or int(self.frame_height * 0.01 * options.output_scale),
+        ]
+
+    def output_fps(self, options):
+        return options.fps or int(self.fps)
+
+    def output_codec(self, options):
+        return options.codec or self.codec
+
+
+def inference_settings(options):
+    '''
+      The FrameProcessor settings which affect the landmarks it detects -
+      so also the key for the landmark cache
+    '''
+    settings = {
+        'min_detection_confidence': options.min_detection_confidence,
+        'min_tracking_confidence': options.min_tracking_confidence,
+    }
+    # only when not the defaults, so existing caches stay valid
+    if options.inference_max_side:
+        settings['inference_max_side'] = options.inference_max_side
+    if options.inference_scale and options.inference_scale < 100:
+        settings['inference_scale'] = options.inference_scale / 100.0
+    if options.roi == 'true':
+        settings['roi'] = True
+        settings['roi_padding'] = options.roi_padding
+    if options.model_complexity not in (None, 'auto') and \
+            int(options.model_complexity) != 1:
+        settings['model_complexity'] = int(options.model_complexity)
+    if options.smooth_landmarks == 'false':
+        settings['smooth_landmarks'] = False
+    if options.enable_segmentation == 'true':
+        settings['enable_segmentation'] = True
+    return settings
+
+
+def motion_gate(options):
+    ''' The MotionGate for --adaptive-inference, as the options set it up '''
+    return MotionGate(threshold=options.motion_threshold,
+                      min_changed=options.motion_area,
+                      max_stride=options.max_stride)
+
+
+def inference_fps_needed(options, frames):
+    '''
+      The frames per second one landmarker must manage for the whole run
+      to keep up options.target_fps: less when the frames are split
+      between several processes (up to one per CPU), and less again with
+      adaptive inference, by the fraction of the given frames which its
+      MotionGate would pick
+    '''
+    parallel = max(1, min(options.processes, os.cpu_count() or 1))
+    inference_ratio = 1.0
+    if options.adaptive_inference == 'true':
+        gate = motion_gate(options)
+        inference_ratio = (sum(gate.should_infer(frame) for frame in frames) /
+                           len(frames))
+    return options.target_fps * inference_ratio / parallel
+
+
+def auto_tune_model_complexity(options, first_frame):
+    '''
+      Benchmark each model complexity on options.auto_tune_frames frames
+      of the input file from first_frame, with the rest of the inference
+      settings, and return the most accurate one which meets
+      options.target_fps - allowing for --processes and
+      --adaptive-inference, see inference_fps_needed
+    '''
+    source = VideoSource(options.input_file,
+                         cache_dir=options.landmark_cache_dir)
+    try:
+        frames = [frame for _, frame in source.frames(
+            first_frame, first_frame + options.auto_tune_frames)]
+    finally:
+        source.release()
+    if not frames:
+        raise IOError(f"Could not read frames to auto-tune from {options.input_file}")
+
+    settings = inference_settings(options)
+    settings.pop('model_complexity', None)
+    fps_needed = inference_fps_needed(options, frames)
+    complexity, results = inference_benchmark.auto_tune_model_complexity(
+        frames, fps_needed, settings)
+    for result in results:
+        print_debug_line(options, result, '\n')
+    print_debug_line(options, 'Chose model complexity', complexity,
+                     'for a target of', options.target_fps, 'fps -',
+                     round(fps_needed, 1), 'fps of inference per process\n')
+    return complexity
+
+
+def landmark_cache_path(options):
+    ''' Path of the landmark cache for the input file, or None if disabled '''
+    if options.landmark_cache != 'true':
+        return None
+    return LandmarkCache.path_for(options.input_file,
+                                  inference_settings(options),
+                                  options.landmark_cache_dir)
+
+
+def make_classifier(options):
+    ''' Build whichever classifier the options ask for '''
+    if options.classifier == 'nearest-neighbour':
+        return NearestNeighbourClassifier(
+            data_dir=options.training_data_dir,
+            k=options.neighbours,
+            use_cache=(options.training_cache == 'true'),
+            workers=options.training_workers)
+
+    return PoseClassifier(data_dir=options.training_data_dir,
+                          use_cache=(options.training_cache == 'true'),
+                          workers=options.training_workers)
+
+
+def make_text_renderer(options):
+    ''' Build whichever text renderer the options ask for '''
+    if options.text_renderer == 'glyph-atlas':
+        return GlyphAtlasTextRenderer(font_file=options.font_file)
+    return Cv2TextRenderer()
+
+
+def make_layout(processor, video_size, plot_3d):
+    '''
+      layout:
+
+      ---------------------------------------------
+      | original video, scaled | body angles & prediction |
+      height is adjusted to the tallest of the above
+      width also includes a few pixels padding between the two panels
+
+      if told to plot3d, we append another row on the bottom:
+      | 3d landmarks           | (empty space)            |
+      -----------------------------------------------------
+    '''
+    annotation_panel = processor.make_panel_for_angles(font_size=FONT_SIZE)
+    return Layout(
+        video_size,
+        [annotation_panel.shape[1], annotation_panel.shape[0]],
+        video_size if plot_3d else None,
+        PADDING,
+    )
+
+
+def annotate_frames(options, output_file, first_frame, stop_frame,
+                    warm_up_from=None, codec=None, landmark_cache_file=None,
+                    metrics=None, processor=None, profiler=None):
+    '''
+      Annotate frames first_frame up to (not including) stop_frame of
+      options.input_file, writing them to output_file.
+
+      If warm_up_from is before first_frame, the frames in between are
+      decoded and run through pose inference and classification - so that
+      MediaPipe's tracking and the classification streak have settled by
+      first_frame - but are not written out.
+
+      Decode, pose inference, rendering and encoding each run in their own
+      thread (see Pipeline), so the time per frame tends towards that of
+      the slowest stage, rather than the sum of all of them.
+
+      Pose landmarks are replayed from, and saved to, the landmark cache
+      (see LandmarkCache) at landmark_cache_file - by default, wherever
+      the options say - so re-running with different rendering or
+      classification options doesn't need to run inference again.
+
+      If given Metrics, every stage of every frame is timed into it -
+      decode, inference, rendering (see FrameAnnotator) & encode - as is
+      the whole pipeline, once everything is loaded.
+
+      processor is the FrameProcessor to use - by default, a new one
+      with the inference settings of the options. It's released at the
+      end either way.
+
+      If given a Profiler, it's ticked as each frame is written.
+
+      Returns the number of frames written
+    '''
+    metrics = metrics or NULL_METRICS
+    info = VideoInfo(options.input_file)
+    video_size = info.output_size(options)
+    warm_up_from = first_frame if warm_up_from is None else warm_up_from
+    codec = codec or info.output_codec(options)
+
+    classifier = make_classifier(options)
+    print_debug_line(options, str(classifier.load_report), '\n')
+
+    processor = processor or FrameProcessor(**inference_settings(options))
+    processor.metrics = metrics
+    layout = make_layout(processor, video_size, options.plot_3d == 'true')
+
+    landmark_cache = None
+    landmark_cache_file = landmark_cache_file or landmark_cache_path(options)
+    if landmark_cache_file:
+        landmark_cache = LandmarkCache(landmark_cache_file, info.frame_count)
+
+    # Create the graph here as it's an expensive operation
+    plotter = None
+    camera = None
+    if options.plot_3d == 'true':
+        plotter = GraphPlotter()
+        camera = Camera(image_width=video_size[0],
+                        image_height=video_size[1])
+
+    annotator = FrameAnnotator(
+        processor,
+        classifier,
+        layout,
+        font_size=FONT_SIZE,
+        classification_confidence_threshold=options.classification_confidence_threshold,
+        frames_for_classification=options.frames_for_classification,
+        plotter=plotter,
+        camera=camera,
+        text_renderer=make_text_renderer(options),
+        # enough output frames for a full queue into the encode stage,
+        # plus the one being encoded and the one being rendered
+        canvas_count=options.queue_size + 2,
+        metrics=metrics,
+    )
+
+    source = VideoSource(options.input_file,
+                         cache_dir=options.landmark_cache_dir)
+    out = cv2.VideoWriter(output_file,
+                          cv2.VideoWriter_fourcc(*codec),
+                          info.output_fps(options),
+                          (layout.total_width, layout.total_height))
+    if not out.isOpened():
+        source.release()
+        raise IOError(f"Could not create the output video file {output_file}")
+
+    print_debug_line(options,
+                     'writing', stop_frame - first_frame,
+                     'frames of annotated video to', output_file,
+                     'at', info.output_fps(options), 'fps,',
+                     layout.video_size[0], 'x', layout.video_size[1],
+                     'with codec', codec,
+                     ' total size =',
+                     layout.total_width, 'x', layout.total_height)
+    print_debug_line(options, '\n\n')
+
+    def read_frames():
+        ''' decode stage - yields (frame number, BGR image) '''
+        frame_number = warm_up_from - 1
+        frames = metrics.timed(source.frames(warm_up_from, stop_frame), 'decode')
+        for frame_number, input_image in frames:
+            yield frame_number, input_image
+        if frame_number + 1 < stop_frame:
+            print("Couldn't read frame ", frame_number + 1,
+                  "from", options.input_file, "aborting!")
+
+    def quantify_pose(frame_number, input_image):
+        if landmark_cache:
+            return landmark_cache.quantify_pose(processor, frame_number,
+                                                input_image, bgr=True)
+        return processor.quantify_pose(input_image, bgr=True)
+
+    def infer_pose(item):
+        ''' pose inference stage '''
+        frame_number, input_image = item
+        return frame_number, input_image, quantify_pose(frame_number,
+                                                        input_image)
+
+    adaptive_inference = None
+    if options.adaptive_inference == 'true':
+        # pose inference stage, but only on frames with enough motion
+        adaptive_inference = AdaptiveInference(
+            quantify_pose, motion_gate(options))
+        infer_pose = adaptive_inference
+
+    def render_frame(item):
+        ''' render stage - returns None if there's no pose, dropping the frame '''
+        frame_number, input_image, pose = item
+        if frame_number < first_frame:
+            # warming up - just keep the classification streak going
+            if pose:
+                annotator.prediction_for(pose)
+            return None
+
+        output_image = annotator.annotate(
+            input_image, pose,
+            frame_number=frame_number - options.from_frame + 1)
+        if output_image is None:
+            metrics.count('frames_without_pose')
+            print_debug_line(options, 'Frame ', frame_number, " No pose detected")
+            if options.verbose == 'true':
+                sys.stdout.write('\r')
+                sys.stdout.flush()
+            return None
+        return frame_number, output_image
+
+    def write_frame(item):
+        ''' encode stage '''
+        frame_number, output_image = item
+        with metrics.span('encode'):
+            out.write(output_image)
+        metrics.count('frames_written')
+        if profiler:
+            profiler.tick()
+
+        # wind the stdout buffer back a line if needed & flush
+        print_debug_line(options, 'Frame ', frame_number, ' of ', info.frame_count)
+        if options.verbose == 'true':
+            sys.stdout.write('\r')
+            sys.stdout.flush()
+
+    try:
+        pipeline = Pipeline(read_frames(),
+                            [infer_pose, render_frame, write_frame],
+                            queue_size=options.queue_size)
+        with metrics.span('pipeline'):
+            return pipeline.run()
+    finally:
+        # cleanup
+        if landmark_cache:
+            landmark_cache.flush()
+            print_debug_line(options, '\nLandmarks replayed from cache for',
+                             landmark_cache.hits, 'frames, inferred for',
+                             landmark_cache.misses, '\n')
+        if adaptive_inference:
+            print_debug_line(options, '\nAdaptive inference:',
+                             adaptive_inference.summary(), '\n')
+        if processor.roi_tracker:
+            print_debug_line(options, '\nRegion of interest used for',
+                             processor.roi_tracker.hits, 'frames, fell back '
+                             'to the whole frame for',
+                             processor.roi_tracker.fallbacks, '\n')
+        processor.release()
+        if plotter:
+            plotter.cleanup()
+        source.release()
+        out.release()
+
+
+def shard_ranges(first_frame, stop_frame, shards, warm_up_frames):
+    '''
+      Split frames first_frame up to stop_frame into (at most) the given
+      number of shards. Returns a list of (warm_up_from, first, stop) for
+      each shard - see annotate_frames.
+      Every shard but the first starts warm_up_frames early
+    '''
+    n_frames = max(0, stop_frame - first_frame)
+    shard_size = max(1, math.ceil(n_frames / max(1, shards)))
+    ranges = []
+    for start in range(first_frame, stop_frame, shard_size):
+        warm_up_from = first_frame if start == first_frame else \
+            max(first_frame, start - warm_up_frames)
+        ranges.append((warm_up_from, start, min(start + shard_size, stop_frame)))
+    return ranges
+
+
+def stitch_segments(segment_files, output_file, codec, fps):
+    '''
+      Concatenate the frames of the given video files, in order, into
+      output_file. Returns the number of frames written
+    '''
+    out = None
+    frames_written = 0
+    try:
+        for segment_file in segment_files:
+            cap = cv2.VideoCapture(segment_file)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if out is None:
+                    out = cv2.VideoWriter(output_file,
+                                          cv2.VideoWriter_fourcc(*codec),
+                                          fps,
+                                          (frame.shape[1], frame.shape[0]))
+                    if not out.isOpened():
+                        raise IOError("Could not create the output video "
+                                      f"file {output_file}")
+                out.write(frame)
+                frames_written += 1
+            cap.release()
+    finally:
+        if out is not None:
+            out.release()
+    return frames_written
+
+
+def segment_codec():
+    '''
+      The codec & file extension to write shards with - lossless if this
+      build of OpenCV supports it, otherwise None (use the output codec)
+    '''
+    test_file = os.path.join(tempfile.gettempdir(),
+                             f"mt-trainer-codec-test-{os.getpid()}{SEGMENT_EXTENSION}")
+    writer = cv2.VideoWriter(test_file, cv2.VideoWriter_fourcc(*SEGMENT_CODEC),
+                             25, (16, 16))
+    supported = writer.isOpened()
+    writer.release()
+    if os.path.exists(test_file):
+        os.remove(test_file)
+    return (SEGMENT_CODEC, SEGMENT_EXTENSION) if supported else (None, None)
+
+
+def annotate_shard(options, output_file, first_frame, stop_frame,
+                   warm_up_from, codec, landmark_cache_file, collect_metrics,
+                   profile_prefix=None):
+    '''
+      annotate_frames, in a worker process - profiled into profile_prefix
+      if given (see Profiler). Returns (the number of frames written, the
+      state of its Metrics - or None if not collect_metrics)
+    '''
+    metrics = Metrics() if collect_metrics else None
+    profiler = Profiler(profile_prefix).start() if profile_prefix else None
+    try:
+        frames_written = annotate_frames(options, output_file, first_frame,
+                                         stop_frame, warm_up_from, codec,
+                                         landmark_cache_file, metrics=metrics,
+                                         profiler=profiler)
+    finally:
+        if profiler:
+            profiler.stop()
+    return frames_written, metrics.state() if metrics else None
+
+
+def shard_options(options):
+    '''
+      Get the training data ready for the shards to load, and return the
+      options they should be run with. Each shard builds its own
+      classifier, so if the training data cache is in use, it's built (or
+      refreshed) here, once - rather than by every shard, each with a pool
+      of its own, all racing to write the same cache. If it isn't, each
+      shard parses the training data in a single process
+    '''
+    if options.training_cache == 'true':
+        load_training_set(options.training_data_dir,
+                          workers=options.training_workers)
+        return options
+    options = copy.copy(options)
+    options.training_workers = 1
+    return options
+
+
+def annotate_frames_in_shards(options, output_file, first_frame, stop_frame,
+                              processes, warm_up_frames=15, metrics=None,
+                              profile_prefix=None):
+    '''
+      As annotate_frames, but the frames are split into shards, each
+      annotated by a separate worker process - with its own FrameProcessor
+      and classifier - into a temporary segment file. The segments are
+      then stitched together, in order, into output_file.
+      The Metrics of every worker are merged into metrics, if given, and
+      stitching is timed as the stitch span.
+      If profile_prefix is given, each worker is profiled into
+      <profile_prefix>.shard-<n> (see Profiler).
+      Returns the number of frames written
+    '''
+    metrics = metrics or NULL_METRICS
+    info = VideoInfo(options.input_file)
+    codec, extension = segment_codec()
+    if codec is None:
+        codec = info.output_codec(options)
+        extension = os.path.splitext(output_file)[1]
+
+    ranges = shard_ranges(first_frame, stop_frame, processes, warm_up_frames)
+    segment_dir = tempfile.mkdtemp(prefix='.mt-trainer-shards-',
+                                   dir=os.path.dirname(os.path.abspath(output_file)))
+    segment_files = [os.path.join(segment_dir, f"segment-{i:04d}{extension}")
+                     for i in range(len(ranges))]
+
+    # index the video & create the landmark cache before the workers all try to
+    VideoIndex.for_video(options.input_file, options.landmark_cache_dir)
+    landmark_cache_file = landmark_cache_path(options)
+    if landmark_cache_file:
+        LandmarkCache(landmark_cache_file, info.frame_count)
+    worker_options = shard_options(options)
+
+    try:
+        # spawn rather than fork - each worker gets a clean MediaPipe
+        with ProcessPoolExecutor(max_workers=len(ranges),
+                                 mp_context=get_context('spawn')) as pool:
+            futures = [
+                pool.submit(annotate_shard, worker_options, segment_file,
+                            start, stop, warm_up_from, codec,
+                            landmark_cache_file, bool(metrics),
+                            f"{profile_prefix}.shard-{i}" if profile_prefix else None)
+                for i, (segment_file, (warm_up_from, start, stop))
+                in enumerate(zip(segment_files, ranges))
+            ]
+            for future in futures:
+                _, worker_metrics = future.result()
+                if worker_metrics:
+                    metrics.merge(worker_metrics)
+
+        with metrics.span('stitch'):
+            return stitch_segments(segment_files, output_file,
+                                   info.output_codec(options),
+                                   info.output_fps(options))
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
@@ -0,0 +1,222 @@
+'''
+  Random access to the frames of a video file, without decoding any more
+  of it than we have to.
+'''
+import os
+import sys
+
+import cv2
+import numpy as np
+
+
+class VideoIndex:
+    '''
+      The number of frames in a video, the timestamp of each one, and
+      which of them are keyframes - i.e. where decoding can start from.
+
+      Building it only demuxes the file - no frames are decoded - and it's
+      saved in a sidecar file (<video>.index.npz) so it only needs to be
+      built once per video
+    '''
+    CACHE_FORMAT_VERSION = 1
+
+    def __init__(self, frame_count, timestamps, keyframes,
+                 keyframes_known=True, file_size=None, mtime_ns=None):
+        '''
+          timestamps      - of each frame, in milliseconds
+          keyframes       - sorted array of the frame numbers of keyframes
+          keyframes_known - False if the video backend couldn't tell us
+                            where the keyframes are
+          file_size, mtime_ns - of the video file when it was indexed
+        '''
+        self.frame_count = frame_count
+        self.timestamps = timestamps
+        self.keyframes = keyframes
+        self.keyframes_known = keyframes_known
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+
+    @staticmethod
+    def build(video_file):
+        '''
+          Index the given video file by reading its encoded packets in
+          order, without decoding them
+        '''
+        cap = cv2.VideoCapture(video_file)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video file {video_file}")
+        stat = os.stat(video_file)
+        try:
+            # CAP_PROP_FORMAT -1 means give us the raw, still-encoded packets
+            keyframes_known = cap.set(cv2.CAP_PROP_FORMAT, -1)
+            timestamps = []
+            keyframes = []
+            while cap.grab():
+                if keyframes_known and cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    keyframes.append(len(timestamps))
+                timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+        finally:
+            cap.release()
+
+        if not keyframes_known:
+            # let the backend's own seeking decide where to decode from
+            keyframes = range(len(timestamps))
+        return VideoIndex(len(timestamps),
+                          np.array(timestamps, dtype=np.float64),
+                          np.array(keyframes, dtype=np.int64),
+                          keyframes_known,
+                          stat.st_size,
+                          stat.st_mtime_ns)
+
+    @staticmethod
+    def path_for(video_file, cache_dir=None):
+        directory = cache_dir or os.path.dirname(os.path.abspath(video_file))
+        return os.path.join(directory,
+                            f"{os.path.basename(video_file)}.index.npz")
+
+    @staticmethod
+    def for_video(video_file, cache_dir=None, use_cache=True):
+        '''
+          Load the index of the given video file from its sidecar file, or
+          build it (and save it) if there isn't one for the file as it is
+          now
+        '''
+        cache_file = VideoIndex.path_for(video_file, cache_dir)
+        if use_cache and os.path.exists(cache_file):
+            index = VideoIndex.load(cache_file)
+            if index and index.is_index_of(video_file):
+                return index
+
+        index = VideoIndex.build(video_file)
+        if use_cache:
+            try:
+                temp_file = f"{cache_file}.{os.getpid()}.tmp"
+                index.save(temp_file)
+                os.replace(temp_file, cache_file)
+            except OSError as error:
+                print('Could not write video index',
+                      cache_file, '-', error, file=sys.stderr)
+        return index
+
+    def is_index_of(self, video_file):
+        ''' True if video_file hasn't changed since it was indexed '''
+        stat = os.stat(video_file)
+        return (stat.st_size == self.file_size and
+                stat.st_mtime_ns == self.mtime_ns)
+
+    def keyframe_before(self, frame_number):
+        ''' The last keyframe at or before the given frame '''
+        position = np.searchsorted(self.keyframes, frame_number, side='right')
+        return int(self.keyframes[position - 1]) if position else 0
+
+    def save(self, filepath):
+        ''' Save as an uncompressed .npz bundle of arrays '''
+        with open(filepath, 'wb') as f:
+            np.savez(f,
+                     version=np.int32(self.CACHE_FORMAT_VERSION),
+                     timestamps=self.timestamps,
+                     keyframes=self.keyframes,
+                     keyframes_known=np.bool_(self.keyframes_known),
+                     file_size=np.int64(self.file_size),
+                     mtime_ns=np.int64(self.mtime_ns))
+
+    @staticmethod
+    def load(filepath):
+        '''
+          Return a VideoIndex loaded from the given .npz bundle, or None if
+          it isn't in the current cache format
+        '''
+        with np.load(filepath, allow_pickle=False) as bundle:
+            if int(bundle['version']) != VideoIndex.CACHE_FORMAT_VERSION:
+                return None
+            return VideoIndex(len(bundle['timestamps']),
+                              bundle['timestamps'],
+                              bundle['keyframes'],
+                              bool(bundle['keyframes_known']),
+                              int(bundle['file_size']),
+                              int(bundle['mtime_ns']))
+
+
+class VideoSource:
+    '''
+      Reads frames from a video file, in any order, using its VideoIndex
+      to decode as few frames as possible.
+
+      To get to a frame, we either keep decoding forward from where we
+      are - if there's no keyframe between here and there - or jump
+      straight to the last keyframe before it and decode forward from
+      there. Frames which are only decoded to get to another frame are
+      never converted into images.
+
+      Frames are BGR, as cv2.VideoCapture returns them
+    '''
+    def __init__(self, video_file, cache_dir=None, use_cache=True):
+        self.video_file = video_file
+        self.cap = cv2.VideoCapture(video_file)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video file {video_file}")
+        self.index = VideoIndex.for_video(video_file, cache_dir, use_cache)
+        # the number of the frame which the next grab() will decode
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __len__(self):
+        return self.index.frame_count
+
+    @property
+    def frame_count(self):
+        return self.index.frame_count
+
+    def timestamp(self, frame_number):
+        ''' Milliseconds from the start of the video to the given frame '''
+        return float(self.index.timestamps[frame_number])
+
+    def seek(self, frame_number):
+        '''
+          Get ready to read the given frame next.
+          Returns the number of frames that will be decoded and thrown
+          away to get there
+        '''
+        keyframe = self.index.keyframe_before(frame_number)
+        if not keyframe <= self.position <= frame_number:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            self.position = keyframe
+        return frame_number - self.position
+
+    def read(self, frame_number=None):
+        '''
+          Return the given frame - or the next one, if frame_number is
+          None - as a BGR image, or None if it can't be read
+        '''
+        if frame_number is not None:
+            for _ in range(self.seek(frame_number)):
+                if not self.cap.grab():
+                    return None
+                self.position += 1
+
+        ret, image = self.cap.read()
+        if not ret:
+            return None
+        self.position += 1
+        return image
+
+    def frames(self, start=0, stop=None, stride=1):
+        '''
+          Lazily yield (frame number, BGR image) for every stride'th frame
+          from start up to (not including) stop - or the end of the video.
+          Stops early if a frame can't be read
+        '''
+        stop = self.frame_count if stop is None else min(stop, self.frame_count)
+        for frame_number in range(start, stop, stride):
+            image = self.read(frame_number)
+            if image is None:
+                return
+            yield frame_number, image
+
+    def release(self):
+        self.cap.release()
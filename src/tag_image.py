@@ -1,20 +1,18 @@
 #!/usr/bin/python
-""" tag_video.py
-Given an input file and a technique name, 
+""" tag_image.py
+Given input images and a technique name, 
 saves a JSON representation of the body angles in the
 detected pose into the folder named (technique) under the 
 given output folder (default: ./poses/training/)
 """
 import argparse
 import os
-import pathlib
-import pdb
 import sys
+from time import time
 
-import cv2
-
-from mt_trainer.frame_processor import FrameProcessor
-from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.image_tagging import (check_output_names, expand_inputs,
+                                      tag_images)
+from mt_trainer.profiling import Profiler, profile_prefix
 
 
 def print_debug_line(*variables):
@@ -23,32 +21,23 @@ def print_debug_line(*variables):
         sys.stdout.write(' '.join([str(var) for var in variables]))
 
 
-def insert_suffix_before_extension(path, suffix):
-    ''' Insert the given suffix before the file extension of the given path '''
-    root, ext = os.path.splitext(path)
-    out_path = root + suffix
-    if ext is not None:
-        out_path += ext
-    return out_path
-
-
-def output_file_name(input_path, output_dir):
-    return os.path.join(
-        output_dir,
-        os.path.basename(input_path) + '.json'
-    )
-
-
 parser = argparse.ArgumentParser(
     prog='tag_image.py',
     description=(
-        "Estimates the pose of a single person in the given image file, "
-        "and saves a JSON representation of the body angles in the "
+        "Estimates the pose of a single person in each of the given image "
+        "files, and saves a JSON representation of the body angles in the "
         "detected pose into the folder named (technique) under the "
         "given output folder (default: ./poses/training/)")
     )
 
-parser.add_argument('input_files', type=str, nargs='+')
+parser.add_argument('input_files', type=str, nargs='*',
+                    help=("Image files, directories (searched recursively "
+                          "for images) or glob patterns, e.g. "
+                          "'screenshots/**/*.png'"))
+parser.add_argument('-m', '--manifest',
+                    type=str, default=None, dest='manifest',
+                    help=("A file listing more inputs, one per line. "
+                          "Relative paths are relative to the manifest"))
 parser.add_argument('-v', '--verbose',
                     choices=['true', 'false'], default='false', dest='verbose')
 parser.add_argument('-t', '--technique',
@@ -63,34 +52,89 @@ parser.add_argument('-dc', '--min-detection-confidence',
 parser.add_argument('-tc', '--min-tracking-confidence',
                     dest='min_tracking_confidence',
                     type=float, default=0.5)
-
-args = parser.parse_args()
-
-
-processor = FrameProcessor(
-    min_detection_confidence=args.min_detection_confidence,
-    min_tracking_confidence=args.min_tracking_confidence)
-
-for input_file in args.input_files:
-    print_debug_line('reading ', input_file)
-    frame = cv2.imread(input_file)
-    if frame is None:
-        print("Error opening image file", input_file)
-    else:
-        print_debug_line(' quantifying pose')
-        pose = processor.quantify_pose(frame)
-        if pose:
-            output_file = output_file_name(
-                input_file,
-                os.path.join(args.output_dir, args.technique)
-            )
-                
-            pose.save(output_file)
-
-            print(' ', output_file, ' - ', os.path.getsize(output_file), ' bytes')
-        else:
-            print('no pose found in image ', input_file)
-
-print('All done')
-# cleanup
-processor.pose_landmarker.close()
+parser.add_argument('-mc', '--model-complexity',
+                    dest='model_complexity',
+                    type=int, default=1, choices=[0, 1, 2],
+                    help=("Pose landmark model complexity - higher is more "
+                          "accurate but slower. Default is 1"))
+parser.add_argument('--smooth-landmarks',
+                    dest='smooth_landmarks',
+                    choices=['true', 'false'], default='true',
+                    help="Filter landmarks across frames to reduce jitter")
+parser.add_argument('--enable-segmentation',
+                    dest='enable_segmentation',
+                    choices=['true', 'false'], default='false',
+                    help="Also generate a segmentation mask of the person")
+parser.add_argument('-w', '--workers',
+                    dest='workers',
+                    type=int, default=None,
+                    help=("Number of processes to decode & tag the images "
+                          "with. Default is one per CPU"))
+parser.add_argument('-f', '--force',
+                    choices=['true', 'false'], default='false', dest='force',
+                    help=("Tag every image again, even if its output is "
+                          "newer than the image"))
+parser.add_argument('--metrics',
+                    dest='metrics_file',
+                    type=str, default=None,
+                    help=("Time decoding, inference & saving of every image, "
+                          "and write the p50 / p95 / p99 of each to this "
+                          "file, as CSV if it ends in .csv, otherwise JSON"))
+parser.add_argument('--profile',
+                    dest='profile',
+                    choices=['true', 'false'], default='false',
+                    help=("Profile the run - in this process only, so with "
+                          "--workers 1 - writing tag_image.profile.pstats "
+                          "(cProfile), tag_image.profile.folded (sampled "
+                          "stacks, for flamegraph.pl / speedscope) and "
+                          "tag_image.profile.memory.txt (the largest "
+                          "allocations) into the technique's output folder"))
+
+# guarded, as worker processes import this module
+if __name__ == '__main__':
+    args = parser.parse_args()
+    input_files = expand_inputs(args.input_files, args.manifest)
+    if not input_files:
+        parser.error('no input images given')
+
+    print_debug_line('tagging', len(input_files), 'images as',
+                     args.technique, '\n')
+    output_dir = os.path.join(args.output_dir, args.technique)
+    try:
+        check_output_names(input_files, output_dir)
+    except ValueError as e:
+        parser.error(str(e))
+    profiler = None
+    if args.profile == 'true':
+        # worker processes wouldn't be profiled, so do it all here
+        args.workers = 1
+        os.makedirs(output_dir, exist_ok=True)
+        profiler = Profiler(profile_prefix(
+            os.path.join(output_dir, 'tag_image'))).start()
+    start = time()
+    report = tag_images(
+        input_files,
+        output_dir,
+        settings={
+            'min_detection_confidence': args.min_detection_confidence,
+            'min_tracking_confidence': args.min_tracking_confidence,
+            'model_complexity': args.model_complexity,
+            'smooth_landmarks': args.smooth_landmarks == 'true',
+            'enable_segmentation': args.enable_segmentation == 'true',
+        },
+        workers=args.workers,
+        force=(args.force == 'true'),
+        collect_metrics=bool(args.metrics_file))
+
+    for input_file, output_file in report.tagged:
+        print_debug_line(' ', input_file, '=>', output_file, '-',
+                         os.path.getsize(output_file), 'bytes\n')
+    print(report)
+    print_debug_line('in', str(round(time() - start, 2)) + 's\n')
+    if profiler:
+        print('Profile written to', *profiler.stop())
+    if args.metrics_file:
+        report.metrics.write(args.metrics_file, script='tag_image.py',
+                             options=vars(args),
+                             images_tagged=len(report.tagged))
+    print('All done')
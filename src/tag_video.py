@@ -11,10 +11,11 @@ import os
 import pdb
 import sys
 
-import cv2
-
 from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.metrics import NULL_METRICS, Metrics
+from mt_trainer.profiling import Profiler, profile_prefix
 from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.video_source import VideoSource
 
 
 def print_debug_line(*variables):
@@ -69,61 +70,103 @@ parser.add_argument('-dc', '--min-detection-confidence',
 parser.add_argument('-tc', '--min-tracking-confidence',
                     dest='min_tracking_confidence',
                     type=float, default=0.5)
+parser.add_argument('-mc', '--model-complexity',
+                    dest='model_complexity',
+                    type=int, default=1, choices=[0, 1, 2],
+                    help=("Pose landmark model complexity - higher is more "
+                          "accurate but slower. Default is 1"))
+parser.add_argument('--smooth-landmarks',
+                    dest='smooth_landmarks',
+                    choices=['true', 'false'], default='true',
+                    help="Filter landmarks across frames to reduce jitter")
+parser.add_argument('--enable-segmentation',
+                    dest='enable_segmentation',
+                    choices=['true', 'false'], default='false',
+                    help="Also generate a segmentation mask of the person")
+parser.add_argument('--metrics',
+                    dest='metrics_file',
+                    type=str, default=None,
+                    help=("Time decoding, inference & saving of every frame, "
+                          "and write the p50 / p95 / p99 of each to this "
+                          "file, as CSV if it ends in .csv, otherwise JSON"))
+parser.add_argument('--profile',
+                    dest='profile',
+                    choices=['true', 'false'], default='false',
+                    help=("Profile the run, writing <input>.profile.pstats "
+                          "(cProfile), <input>.profile.folded (sampled "
+                          "stacks, for flamegraph.pl / speedscope) and "
+                          "<input>.profile.memory.txt (the allocations "
+                          "which grew the most per frame) into the "
+                          "technique's output folder"))
 
 args = parser.parse_args()
+metrics = Metrics() if args.metrics_file else NULL_METRICS
+profiler = None
+if args.profile == 'true':
+    technique_dir = os.path.join(args.output_dir, args.technique)
+    os.makedirs(technique_dir, exist_ok=True)
+    profiler = Profiler(profile_prefix(
+        os.path.join(technique_dir, os.path.basename(args.input_file)))).start()
 
 processor = FrameProcessor(
     min_detection_confidence=args.min_detection_confidence,
-    min_tracking_confidence=args.min_tracking_confidence)
-
-cap = cv2.VideoCapture(args.input_file)
-if cap.isOpened() is False:
+    min_tracking_confidence=args.min_tracking_confidence,
+    model_complexity=args.model_complexity,
+    smooth_landmarks=(args.smooth_landmarks == 'true'),
+    enable_segmentation=(args.enable_segmentation == 'true'))
+processor.metrics = metrics
+
+try:
+    source = VideoSource(args.input_file)
+except IOError:
     print("Error opening video stream or file")
     raise TypeError
 
 # sort the frames so that we can step from first to last in a 
-# logical iteration
-frames = sorted([int(s) for s in args.frames.split(',') if s.strip()])
-next_target_frame = frames[0]
-last_frame = min(frames[-1], int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+# logical iteration - the video source only decodes forward from the
+# nearest keyframe before each one
+frames = sorted(set(int(s) for s in args.frames.split(',') if s.strip()))
 
 print_debug_line('tagging frames', frames, ' as', args.technique)
 
-for target_frame in frames:
-    frame = None
-
-    print_debug_line('target_frame', target_frame)
-    
-    while (cap.isOpened() and 
-           (cap.get(cv2.CAP_PROP_POS_FRAMES) <= target_frame)):
-
-        frame_number = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-        print_debug_line('skipping frame', frame_number, '\r')
-        ret, frame = cap.read()
-        if not ret:
-            print("Couldn't read frame ", frame_number,
-                  "from", args.input_file,
-                  "aborting!")
-            break
-
-    print_debug_line('Frame', frame_number)
-
-    if frame_number == target_frame:
-        print_debug_line(' quantifying frame', frame_number)
-        pose = processor.quantify_pose(frame)
-        if pose.angles:
-            output_file = output_file_name(
-                args.input_file,
-                os.path.join(args.output_dir, args.technique),
-                frame_number)
-            
+for frame_number in frames:
+    print_debug_line('target_frame', frame_number)
+    if frame_number >= source.frame_count:
+        print("Frame ", frame_number, "is beyond the end of",
+              args.input_file, ", skipping")
+        continue
+
+    with metrics.span('decode'):
+        frame = source.read(frame_number)
+    if frame is None:
+        print("Couldn't read frame ", frame_number,
+              "from", args.input_file,
+              "aborting!")
+        break
+
+    print_debug_line(' quantifying frame', frame_number)
+    pose = processor.quantify_pose(frame, bgr=True)
+    if pose and pose.angles:
+        output_file = output_file_name(
+            args.input_file,
+            os.path.join(args.output_dir, args.technique),
+            frame_number)
+
+        with metrics.span('save'):
             pose.save_angles(output_file)
 
-            print(' ', output_file, ' - ', os.path.getsize(output_file), ' bytes')
-        else:
-            print('no pose found in frame ', frame_number, ', skipping')
+        print(' ', output_file, ' - ', os.path.getsize(output_file), ' bytes')
+    else:
+        print('no pose found in frame ', frame_number, ', skipping')
+    if profiler:
+        profiler.tick()
 
 print('All done')
 # cleanup
-processor.pose_landmarker.close()
-cap.release()
+processor.release()
+source.release()
+if metrics:
+    metrics.write(args.metrics_file, script='tag_video.py',
+                  options=vars(args))
+if profiler:
+    print('Profile written to', *profiler.stop())
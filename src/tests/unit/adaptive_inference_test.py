@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import pytest
+
+from mt_trainer.adaptive_inference import AdaptiveInference, MotionGate
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+def frame(grey_level):
+    return np.full((36, 64, 3), grey_level, np.uint8)
+
+
+def pose_at(x):
+    return QuantifiedPose.from_arrays(
+        world_array=np.full((33, 3), x, np.float32),
+        image_array=np.full((33, 3), x, np.float32),
+        visibility=np.ones(33, np.float32))
+
+
+class ScriptedGate:
+    ''' Infers exactly the given frame numbers '''
+    def __init__(self, frames_to_infer):
+        self.frames_to_infer = frames_to_infer
+
+    def should_infer(self, image):
+        return int(image[0, 0, 0]) in self.frames_to_infer
+
+
+def run(stage, n_frames):
+    out = []
+    for frame_number in range(n_frames):
+        out += stage((frame_number, frame(frame_number)))
+    out += stage.flush()
+    return out
+
+
+def test_the_gate_infers_the_first_frame_and_frames_with_motion():
+    gate = MotionGate(threshold=5, max_stride=100)
+    assert gate.should_infer(frame(0))
+    assert not gate.should_infer(frame(3))
+    assert gate.should_infer(frame(10))
+    # compared to the last inferred frame, not the last frame
+    assert not gate.should_infer(frame(14))
+    assert gate.should_infer(frame(16))
+
+def wide_shot(subject_x, noise=None):
+    ''' A 640x360 frame with a 20 pixel square subject at subject_x '''
+    image = np.full((360, 640, 3), 100, np.uint8)
+    if noise is not None:
+        image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    image[170:190, subject_x:subject_x + 20] = 230
+    return image
+
+def test_the_gate_infers_when_a_small_subject_moves_in_a_wide_shot():
+    gate = MotionGate(max_stride=100)
+    assert gate.should_infer(wide_shot(300))
+    assert gate.should_infer(wide_shot(320))
+    # which a mean difference over the whole frame would miss
+    assert cv2.absdiff(wide_shot(300), wide_shot(320)).mean() < 2.0
+
+def test_the_gate_ignores_noise_spread_over_the_frame():
+    rng = np.random.default_rng(0)
+    gate = MotionGate(max_stride=100)
+    assert gate.should_infer(wide_shot(300, rng.normal(0, 3, (360, 640, 3))))
+    assert not any(
+        gate.should_infer(wide_shot(300, rng.normal(0, 3, (360, 640, 3))))
+        for _ in range(5))
+
+def test_the_gate_infers_at_least_every_max_stride_frames():
+    gate = MotionGate(threshold=5, max_stride=3)
+    assert [gate.should_infer(frame(0)) for _ in range(7)] == \
+        [True, False, False, True, False, False, True]
+
+def test_skipped_frames_come_out_in_order_with_interpolated_poses():
+    inferred = []
+
+    def infer(frame_number, image):
+        inferred.append(frame_number)
+        return pose_at(float(frame_number))
+
+    stage = AdaptiveInference(infer, ScriptedGate({0, 4}))
+    out = run(stage, 7)
+
+    assert [frame_number for frame_number, _, _ in out] == list(range(7))
+    # the last frame is inferred at the end of the stream
+    assert inferred == [0, 4, 6]
+    np.testing.assert_allclose(out[1][2].world_array, 1.0)
+    np.testing.assert_allclose(out[5][2].image_array, 5.0)
+    assert (stage.inferred, stage.interpolated) == (3, 4)
+    assert stage.inference_ratio == pytest.approx(3 / 7)
+
+def test_frames_next_to_a_missing_pose_take_the_other_pose():
+    stage = AdaptiveInference(
+        lambda frame_number, image: None if frame_number == 0 else pose_at(2.0),
+        ScriptedGate({0, 2}))
+    out = run(stage, 3)
+    assert out[0][2] is None
+    np.testing.assert_allclose(out[1][2].world_array, 2.0)
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+import pytest
+
+from mt_trainer.angle_engine import AngleEngine, landmarks_to_array
+from mt_trainer.vector_maths import angle_between, vector_between
+
+
+class MockLandmark:
+  ''' Just needs x, y and z '''
+  def __init__(self, x, y, z):
+    self.x = x
+    self.y = y
+    self.z = z
+
+
+ANGLES = {
+  'right_angle': (0, 1, 2),
+  'straight': (0, 1, 3),
+  'reversed': (2, 1, 0),
+}
+
+LANDMARKS = np.array([
+  (1.0, 0.0, 0.0),
+  (0.0, 0.0, 0.0),
+  (0.0, 2.0, 0.0),
+  (-3.0, 0.0, 0.0),
+])
+
+
+def test_landmarks_to_array_returns_an_n_by_3_array():
+  landmarks = [MockLandmark(0.1, 0.2, 0.3), MockLandmark(0.4, 0.5, 0.6)]
+  assert landmarks_to_array(landmarks).tolist() == [[0.1, 0.2, 0.3],
+                                                    [0.4, 0.5, 0.6]]
+
+def test_calculate_returns_the_angle_at_the_middle_landmark_of_each_triplet():
+  engine = AngleEngine(ANGLES)
+  assert engine.calculate(LANDMARKS) == pytest.approx([90, 180, 90])
+
+def test_calculate_dict_keeps_the_order_of_the_angle_landmarks():
+  engine = AngleEngine(ANGLES)
+  angles = engine.calculate_dict(LANDMARKS)
+  assert list(angles.keys()) == ['right_angle', 'straight', 'reversed']
+  assert angles['right_angle'] == pytest.approx(90)
+
+def test_calculate_accepts_a_stack_of_poses():
+  engine = AngleEngine(ANGLES)
+  stack = np.stack([LANDMARKS, LANDMARKS * 2, LANDMARKS[[2, 1, 0, 3]]])
+  angles = engine.calculate(stack)
+  assert angles.shape == (3, 3)
+  assert angles[0] == pytest.approx(angles[1])
+  assert angles[2] == pytest.approx([90, 90, 90])
+
+def test_calculate_matches_vector_maths():
+  rng = np.random.default_rng(1)
+  landmarks = rng.normal(size=(4, 3))
+  expected = [
+    angle_between(vector_between(landmarks[b], landmarks[c]),
+                  vector_between(landmarks[b], landmarks[a]))
+    for a, b, c in ANGLES.values()
+  ]
+  assert AngleEngine(ANGLES).calculate(landmarks) == pytest.approx(expected)
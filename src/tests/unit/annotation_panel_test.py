@@ -0,0 +1,70 @@
+import numpy as np
+
+from mt_trainer.annotation_panel import AnnotationPanel
+from mt_trainer.frame_processor import FrameProcessor
+from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.text_rendering import Cv2TextRenderer
+
+FONT_SIZE = 12
+
+
+def random_pose(seed=0):
+    rng = np.random.default_rng(seed)
+    return QuantifiedPose.from_arrays(
+        world_array=rng.normal(size=(33, 3)),
+        image_array=rng.random(size=(33, 3)),
+        visibility=rng.random(size=33),
+    )
+
+
+def panel_rendered_from_scratch(processor, pose, frame_number, prediction):
+    renderer = Cv2TextRenderer()
+    panel = processor.make_panel_for_angles(FONT_SIZE)
+    renderer.render('Frame #' + str(frame_number), panel,
+                    top=FONT_SIZE + 2, left=2, pixel_height=FONT_SIZE,
+                    color=(255, 255, 255))
+    panel = processor.render_angles(pose, panel, top=FONT_SIZE * 2,
+                                    font_size=FONT_SIZE)
+    if prediction:
+        renderer.render(prediction, panel,
+                        top=panel.shape[0] - (FONT_SIZE + 2), left=2,
+                        pixel_height=FONT_SIZE, color=(255, 255, 255))
+    return panel
+
+
+def test_each_frame_is_the_same_as_rendering_the_panel_from_scratch():
+    processor = FrameProcessor()
+    panel = AnnotationPanel(processor, font_size=FONT_SIZE)
+    frames = [(1, None), (2, 'Pose: jab (99.1%)'), (100, None), (3, 'Pose: teep (98.25%)')]
+    for seed, (frame_number, prediction) in enumerate(frames):
+        pose = random_pose(seed)
+        np.testing.assert_array_equal(
+            panel.render(pose, frame_number, prediction),
+            panel_rendered_from_scratch(processor, pose, frame_number, prediction))
+
+def test_the_panel_image_is_reused():
+    panel = AnnotationPanel(FrameProcessor(), font_size=FONT_SIZE)
+    first = panel.render(random_pose(1), 1)
+    assert panel.render(random_pose(2), 2) is first
+
+def test_clear_restores_the_template():
+    panel = AnnotationPanel(FrameProcessor(), font_size=FONT_SIZE)
+    panel.render(random_pose(), 12345, 'Pose: jab (99.0%)')
+    panel.clear()
+    np.testing.assert_array_equal(panel.image, panel.template)
+
+def test_text_metrics_are_cached():
+    renderer = Cv2TextRenderer()
+    renderer.pixel_width('123.0', FONT_SIZE)
+    renderer.pixel_width('123.0', FONT_SIZE)
+    assert len(renderer.text_sizes) == 1
+    assert renderer.text_box('1', top=20, left=10, pixel_height=FONT_SIZE)[0] < 20 - FONT_SIZE + 2
+
+def test_text_metrics_cache_is_bounded():
+    renderer = Cv2TextRenderer(text_size_cache_size=3)
+    for frame_number in range(10):
+        renderer.pixel_width(f"Frame #{frame_number}", FONT_SIZE)
+    renderer.pixel_width('Frame #8', FONT_SIZE)
+    renderer.pixel_width('Frame #10', FONT_SIZE)
+    assert [key[0] for key in renderer.text_sizes] == \
+        ['Frame #9', 'Frame #8', 'Frame #10']
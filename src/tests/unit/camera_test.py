@@ -9,3 +9,18 @@ def test_project_3d_points_returns_an_array_of_2d_points_when_given_an_array_of_
 def test_project_3d_point_returns_a_2d_point_when_given_a_3d_point():
     camera = Camera(image_width=100, image_height=200)
     assert camera.project_3d_point((0, 0, 0)) == (50, 100)
+
+def test_project_points_array_projects_every_point_at_once():
+    camera = Camera(image_width=100, image_height=200)
+    points = camera.project_points_array([(0, 0, 0), (0.5, -0.5, 0), (0, 0, 0)])
+    assert points.shape == (3, 2)
+    assert points.tolist() == [[50, 100], [150, 0], [50, 100]]
+
+def test_project_points_array_handles_no_points():
+    assert Camera().project_points_array([]).shape == (0, 2)
+
+def test_the_intrinsic_matrix_is_only_rebuilt_when_the_image_size_changes():
+    camera = Camera(image_width=100, image_height=200)
+    assert camera.intrinsic_matrix() is camera.intrinsic_matrix()
+    camera.image_width = 300
+    assert camera.intrinsic_matrix()[0][2] == 150
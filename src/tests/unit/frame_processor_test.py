@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from mt_trainer.frame_processor import FrameProcessor
+
+
+def test_images_are_not_shrunk_by_default():
+    assert FrameProcessor().inference_size(1920, 1080) is None
+
+def test_inference_max_side_limits_the_longest_side():
+    processor = FrameProcessor(inference_max_side=640)
+    assert processor.inference_size(1920, 1080) == (640, 360)
+    assert processor.inference_size(1080, 1920) == (360, 640)
+
+def test_inference_scale_shrinks_both_sides():
+    assert FrameProcessor(inference_scale=0.25).inference_size(1920, 1080) == (480, 270)
+
+def test_the_smaller_of_max_side_and_scale_wins():
+    processor = FrameProcessor(inference_max_side=640, inference_scale=0.25)
+    assert processor.inference_size(1920, 1080) == (480, 270)
+    assert processor.inference_size(800, 600) == (200, 150)
+
+def test_images_are_never_enlarged():
+    processor = FrameProcessor(inference_max_side=640)
+    image = np.zeros((240, 320, 3), np.uint8)
+    assert processor.inference_size(320, 240) is None
+    assert processor.inference_image(image) is image
+
+def test_inference_image_is_resized():
+    processor = FrameProcessor(inference_max_side=64)
+    assert processor.inference_image(np.zeros((100, 200, 3), np.uint8)).shape == (32, 64, 3)
+
+def test_model_settings_are_passed_on_to_the_landmarker():
+    settings = FrameProcessor(model_complexity=2, smooth_landmarks=False).settings
+    assert settings['model_complexity'] == 2
+    assert settings['smooth_landmarks'] is False
+    assert settings['enable_segmentation'] is False
+
+
+class FakeLandmarker:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_crops_and_whole_frames_are_tracked_by_different_landmarkers(monkeypatch):
+    monkeypatch.setattr(FrameProcessor, '_new_landmarker',
+                        lambda self: FakeLandmarker())
+    processor = FrameProcessor(roi=True)
+    whole_frame = processor.landmarker_for(None)
+    crop = processor.landmarker_for((10, 10, 50, 90))
+    assert crop is not whole_frame
+    assert processor.landmarker_for((10, 10, 50, 90)) is crop
+    assert processor.landmarker_for(None) is whole_frame
+
+    moved = processor.landmarker_for((20, 10, 60, 90))
+    assert moved is not crop and crop.closed
+    processor.release()
+    assert moved.closed and whole_frame.closed
+
+def test_in_static_image_mode_crops_share_the_landmarker(monkeypatch):
+    monkeypatch.setattr(FrameProcessor, '_new_landmarker',
+                        lambda self: FakeLandmarker())
+    processor = FrameProcessor(static_image_mode=True, roi=True)
+    assert processor.landmarker_for((10, 10, 50, 90)) is \
+        processor.landmarker_for(None)
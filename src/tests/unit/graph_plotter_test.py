@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from mt_trainer.camera import Camera
+from mt_trainer.graph_plotter import GraphPlotter
+
+# with the default camera, (x, y, 0) lands on pixel (50 + 200x, 50 + 200y)
+COORDS = np.array([(-0.2, 0, 0), (0, 0, 0), (0.2, 0, 0)], np.float32)
+
+
+def plot(**kwargs):
+    image = np.full((100, 100, 3), 255, np.uint8)
+    GraphPlotter().plot_3d_array_on_image(
+        image, COORDS, camera=Camera(image_width=100, image_height=100),
+        **kwargs)
+    return image
+
+def test_landmarks_are_drawn_as_connected_points():
+    image = plot(connections=[(0, 1)])
+    # points are black dots - off the line, which is drawn over them
+    assert (image[52, 10] == 0).all()
+    # connection drawn in grey, between the two points
+    assert (image[50, 30] == 64).all()
+    # no connection to the third point
+    assert (image[50, 70] == 255).all()
+
+def test_invisible_landmarks_and_their_connections_are_skipped():
+    image = plot(connections=[(0, 1), (1, 2)],
+                 visibility=np.array([1.0, 1.0, 0.0], np.float32))
+    assert (image[52, 90] == 255).all()
+    assert (image[50, 70] == 255).all()
+    assert (image[50, 30] == 64).all()
+
+def test_connections_to_missing_landmarks_are_an_error():
+    with pytest.raises(ValueError, match='#1 to landmark #7'):
+        plot(connections=[(1, 7)])
@@ -0,0 +1,136 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from mt_trainer.image_tagging import (ImageInput, TagReport, check_output_names,
+                                      expand_inputs, is_up_to_date,
+                                      output_file_name, tag_image_files,
+                                      tag_images)
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+class FakeProcessor:
+    def __init__(self, pose):
+        self.pose = pose
+        self.images = []
+
+    def quantify_pose(self, rgb_image, bgr=False):
+        self.images.append(rgb_image)
+        return self.pose
+
+
+def random_pose():
+    rng = np.random.default_rng(0)
+    return QuantifiedPose.from_arrays(
+        world_array=rng.normal(size=(33, 3)),
+        image_array=rng.random(size=(33, 3)),
+        visibility=rng.random(size=33))
+
+
+@pytest.fixture
+def images(tmp_path):
+    os.makedirs(tmp_path / 'jab' / 'more')
+    paths = [tmp_path / 'jab' / 'a.png',
+             tmp_path / 'jab' / 'more' / 'b.jpg',
+             tmp_path / 'c.png']
+    for path in paths:
+        cv2.imwrite(str(path), np.zeros((8, 8, 3), np.uint8))
+    (tmp_path / 'jab' / 'notes.txt').write_text('not an image')
+    return [str(path) for path in paths]
+
+
+def paths(image_inputs):
+    return [image.path for image in image_inputs]
+
+def names(image_inputs):
+    return [image.name for image in image_inputs]
+
+def test_directories_are_searched_recursively_for_images(images, tmp_path):
+    assert paths(expand_inputs([str(tmp_path / 'jab')])) == images[0:2]
+
+def test_globs_are_expanded_and_duplicates_dropped(images, tmp_path):
+    assert paths(expand_inputs([str(tmp_path / '**' / '*.png'), images[2]])) == \
+        [images[2], images[0]]
+
+def test_manifest_paths_are_relative_to_the_manifest(images, tmp_path):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('# screenshots\nc.png\n\njab/more/b.jpg\n')
+    assert paths(expand_inputs([], str(manifest))) == [images[2], images[1]]
+
+def test_images_are_named_relative_to_the_directory_or_glob_they_were_found_in(
+        images, tmp_path):
+    assert names(expand_inputs([str(tmp_path / 'jab')])) == \
+        ['a.png', 'more__b.jpg']
+    assert names(expand_inputs([str(tmp_path / '**' / '*.png')])) == \
+        ['c.png', 'jab__a.png']
+    assert names(expand_inputs([images[1]])) == ['b.jpg']
+
+def test_an_images_name_doesnt_depend_on_what_else_is_tagged(images, tmp_path):
+    jab = str(tmp_path / 'jab')
+    assert expand_inputs([jab])[0] == \
+        expand_inputs([jab, images[2], str(tmp_path / 'missing.png')])[0]
+
+def test_outputs_are_saved_under_the_images_names(images):
+    assert output_file_name(ImageInput(images[1], 'more__b.jpg'), 'out') == \
+        os.path.join('out', 'more__b.jpg.json')
+    assert output_file_name(images[1], 'out') == os.path.join('out', 'b.jpg.json')
+
+def test_images_which_would_overwrite_each_other_are_reported(tmp_path):
+    images = [str(tmp_path / 'jab' / 'a.png'), str(tmp_path / 'cross' / 'a.png')]
+    check_output_names(images[0:1], 'out')
+    with pytest.raises(ValueError, match='would both be saved as'):
+        check_output_names(images, 'out')
+    with pytest.raises(ValueError):
+        tag_images(images, 'out', workers=1)
+
+def test_output_is_up_to_date_only_if_newer_than_the_image(images, tmp_path):
+    output_file = str(tmp_path / 'a.png.json')
+    assert not is_up_to_date(images[0], output_file)
+    open(output_file, 'w').close()
+    os.utime(output_file, (0, 0))
+    assert not is_up_to_date(images[0], output_file)
+    os.utime(output_file, None)
+    assert is_up_to_date(images[0], output_file)
+
+def test_tag_image_files_saves_each_pose_found(images, tmp_path):
+    output_dir = str(tmp_path / 'out')
+    report = tag_image_files(images[0:2] + [str(tmp_path / 'missing.png')],
+                             output_dir,
+                             processor=FakeProcessor(random_pose()))
+    assert [output for _, output in report.tagged] == \
+        [output_file_name(image, output_dir) for image in images[0:2]]
+    assert report.unreadable == [str(tmp_path / 'missing.png')]
+    assert QuantifiedPose.load(report.tagged[0][1]).angle_array is not None
+
+def test_images_with_no_pose_are_reported(images, tmp_path):
+    report = tag_image_files(images, str(tmp_path / 'out'),
+                             processor=FakeProcessor(None))
+    assert report.no_pose == images
+    assert not os.path.exists(tmp_path / 'out')
+
+def test_up_to_date_images_are_skipped(images, tmp_path):
+    output_dir = str(tmp_path / 'out')
+    os.makedirs(output_dir)
+    for image in images:
+        open(output_file_name(image, output_dir), 'w').close()
+    report = tag_images(images, output_dir, workers=1)
+    assert report.up_to_date == images
+    assert report.tagged == []
+
+def test_merged_reports_keep_their_order():
+    merged = TagReport.merge([TagReport(no_pose=['a']),
+                              TagReport(no_pose=['b'], unreadable=['c'])])
+    assert merged.no_pose == ['a', 'b']
+    assert merged.summary() == ('0 images tagged, 0 already up-to-date, '
+                                '2 with no pose found, 1 unreadable')
+
+def test_metrics_are_collected_when_asked_for(images, tmp_path):
+    report = tag_image_files(images, str(tmp_path / 'out'),
+                             processor=FakeProcessor(random_pose()),
+                             collect_metrics=True)
+    merged = TagReport.merge([TagReport(), report])
+    assert len(merged.metrics.samples['decode']) == len(images)
+    assert len(merged.metrics.samples['save']) == len(images)
+    assert not TagReport.merge([TagReport()]).metrics
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from mt_trainer.inference_benchmark import InferenceBenchmark, choose_model_complexity
+from mt_trainer.quantified_pose import QuantifiedPose
+
+N_ANGLES = len(QuantifiedPose.ANGLE_NAMES)
+
+
+def pose_with_angles(angles):
+    return QuantifiedPose.from_arrays(angle_array=np.full(N_ANGLES, angles))
+
+
+def test_drift_is_measured_where_both_found_a_pose():
+    reference = InferenceBenchmark('reference', {},
+                                   [pose_with_angles(90), pose_with_angles(90), None],
+                                   1.0)
+    candidate = InferenceBenchmark('small', {},
+                                   [pose_with_angles(93), None, pose_with_angles(10)],
+                                   0.5).compare_to(reference)
+    assert candidate.drift.shape == (1, N_ANGLES)
+    assert candidate.mean_drift == pytest.approx(3.0)
+    assert candidate.agreement == 0.5
+    assert candidate.fps == 6.0
+
+def test_worst_angles_are_those_with_the_largest_mean_drift():
+    angles = np.zeros(N_ANGLES)
+    angles[4] = 20
+    reference = InferenceBenchmark('reference', {}, [pose_with_angles(0)], 1.0)
+    candidate = InferenceBenchmark('small', {},
+                                   [QuantifiedPose.from_arrays(angle_array=angles)],
+                                   1.0).compare_to(reference)
+    assert candidate.worst_angles(1) == [(QuantifiedPose.ANGLE_NAMES[4], 20.0)]
+    assert 'drift mean' in candidate.summary()
+
+def test_no_drift_is_reported_without_any_poses_in_common():
+    reference = InferenceBenchmark('reference', {}, [None], 1.0)
+    candidate = InferenceBenchmark('small', {}, [None], 1.0).compare_to(reference)
+    assert candidate.mean_drift is None
+    assert candidate.agreement is None
+    assert candidate.worst_angles() == []
+
+def benchmark_at(complexity, fps):
+    return InferenceBenchmark(f"model complexity {complexity}",
+                              {'model_complexity': complexity},
+                              [None] * int(fps), 1.0)
+
+def test_the_most_accurate_complexity_which_meets_the_target_fps_is_chosen():
+    results = [benchmark_at(2, 8), benchmark_at(1, 20), benchmark_at(0, 40)]
+    assert choose_model_complexity(results, 5) == 2
+    assert choose_model_complexity(results, 15) == 1
+    assert choose_model_complexity(results, 30) == 0
+
+def test_the_fastest_complexity_is_chosen_if_none_meet_the_target_fps():
+    results = [benchmark_at(2, 8), benchmark_at(1, 20), benchmark_at(0, 40)]
+    assert choose_model_complexity(results, 100) == 0
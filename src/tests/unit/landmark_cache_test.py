@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from mt_trainer.landmark_cache import LandmarkCache
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+def random_pose(seed=0):
+    rng = np.random.default_rng(seed)
+    return QuantifiedPose.from_arrays(
+        rng.normal(size=(33, 3)).astype(np.float32),
+        rng.random((33, 3)).astype(np.float32),
+        rng.random(33).astype(np.float32),
+    )
+
+
+class FakeProcessor:
+    def __init__(self, pose):
+        self.pose = pose
+        self.calls = 0
+
+    def quantify_pose(self, rgb_image, bgr=False):
+        self.calls += 1
+        return self.pose
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'not really a video')
+    return str(path)
+
+
+def test_stored_poses_are_read_back_unchanged(tmp_path):
+    pose = random_pose()
+    LandmarkCache(str(tmp_path / 'cache.npy'), 10).put(3, pose)
+
+    status, replayed = LandmarkCache(str(tmp_path / 'cache.npy'), 10).get(3)
+    assert status == LandmarkCache.POSE
+    np.testing.assert_array_equal(replayed.world_array, pose.world_array)
+    np.testing.assert_array_equal(replayed.image_array, pose.image_array)
+    np.testing.assert_array_equal(replayed.visibility, pose.visibility)
+    np.testing.assert_allclose(replayed.angle_array, pose.angle_array)
+
+def test_frames_without_a_pose_are_distinguished_from_unprocessed_ones(tmp_path):
+    cache = LandmarkCache(str(tmp_path / 'cache.npy'), 10)
+    cache.put(4, None)
+    assert cache.get(4) == (LandmarkCache.NO_POSE, None)
+    assert cache.get(5) == (LandmarkCache.NOT_PROCESSED, None)
+    assert not cache.is_complete(0, 10)
+    assert cache.is_complete(4, 5)
+
+def test_frames_beyond_the_end_are_never_cached(tmp_path):
+    cache = LandmarkCache(str(tmp_path / 'cache.npy'), 2)
+    cache.put(2, random_pose())
+    assert cache.status(2) == LandmarkCache.NOT_PROCESSED
+    assert len(cache) == 2
+
+def test_quantify_pose_only_runs_inference_on_a_miss(tmp_path):
+    processor = FakeProcessor(random_pose())
+    cache = LandmarkCache(str(tmp_path / 'cache.npy'), 10)
+    for _ in range(3):
+        cache.quantify_pose(processor, 1, image=None)
+    assert processor.calls == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+def test_no_pose_is_replayed_without_running_inference(tmp_path):
+    processor = FakeProcessor(None)
+    cache = LandmarkCache(str(tmp_path / 'cache.npy'), 10)
+    assert cache.quantify_pose(processor, 0, image=None) is None
+    assert cache.quantify_pose(processor, 0, image=None) is None
+    assert processor.calls == 1
+
+def test_the_cache_file_changes_with_the_inference_settings(video_file):
+    first = LandmarkCache.path_for(video_file, {'min_detection_confidence': 0.5})
+    second = LandmarkCache.path_for(video_file, {'min_detection_confidence': 0.6})
+    assert first != second
+    assert first.startswith(video_file + '.')
+
+def test_the_cache_file_changes_with_the_video_content(video_file):
+    before = LandmarkCache.path_for(video_file, {})
+    with open(video_file, 'ab') as f:
+        f.write(b'!')
+    assert LandmarkCache.path_for(video_file, {}) != before
+
+def test_the_cache_can_live_in_another_directory(video_file, tmp_path):
+    cache_dir = tmp_path / 'elsewhere'
+    cache_dir.mkdir()
+    cache = LandmarkCache.for_video(video_file, 5, {}, cache_dir=str(cache_dir))
+    assert cache.path.startswith(str(cache_dir))
+    assert len(cache) == 5
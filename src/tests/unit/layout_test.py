@@ -0,0 +1,36 @@
+import numpy as np
+
+from mt_trainer.layout import Layout
+
+
+def test_regions_are_laid_out_side_by_side_with_padding():
+    layout = Layout((100, 50), (30, 40), padding=2)
+    assert layout.video_region == (0, 50, 0, 100)
+    assert layout.annotation_panel_region == (0, 40, 102, 132)
+    assert layout.world_landmarks_region is None
+    assert (layout.total_width, layout.total_height) == (132, 50)
+
+def test_the_top_row_is_as_tall_as_the_annotation_panel_if_thats_taller():
+    layout = Layout((100, 50), (30, 80), (100, 50), padding=2)
+    assert layout.world_landmarks_region == (82, 132, 0, 100)
+    assert layout.total_height == 132
+
+def test_views_write_straight_into_the_canvas():
+    layout = Layout((4, 3), (2, 2), padding=1)
+    canvas = layout.new_canvas()
+    assert canvas.shape == (3, 7, 3)
+    layout.annotation_panel_view(canvas)[...] = 9
+    assert canvas[0:2, 5:7].min() == 9
+    assert canvas[:, 0:5].max() == 0
+
+def test_the_world_landmarks_region_starts_white():
+    layout = Layout((4, 3), (2, 2), (4, 3), padding=1)
+    canvas = layout.new_canvas()
+    assert (layout.world_landmarks_view(canvas) == 255).all()
+    assert canvas[0:3].max() == 0
+
+def test_canvases_are_allocated_once_and_handed_out_in_turn():
+    canvases = Layout((4, 3), (2, 2)).canvases(2)
+    first, second, third = next(canvases), next(canvases), next(canvases)
+    assert first is not second
+    assert third is first
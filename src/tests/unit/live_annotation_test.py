@@ -0,0 +1,64 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from mt_trainer.live_annotation import LatencyStats, LatestFrameSource
+
+N_FRAMES = 30
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = str(tmp_path / 'video.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 100,
+                             (32, 24))
+    if not writer.isOpened():
+        pytest.skip('no MJPG encoder available')
+    for i in range(N_FRAMES):
+        writer.write(np.full((24, 32, 3), i * 8, np.uint8))
+    writer.release()
+    return path
+
+
+def read_all(source, delay=0.0):
+    sequences = []
+    while True:
+        frame = source.next_frame()
+        if frame is None:
+            return sequences
+        sequences.append(frame[0])
+        time.sleep(delay)
+
+
+def test_every_frame_is_returned_to_a_fast_enough_consumer(video_file):
+    source = LatestFrameSource(video_file).start()
+    try:
+        assert source.fps == pytest.approx(100, abs=1)
+        assert read_all(source) == list(range(N_FRAMES))
+        assert source.dropped == 0
+    finally:
+        source.release()
+
+def test_a_slow_consumer_only_gets_the_newest_frames(video_file):
+    source = LatestFrameSource(video_file).start()
+    try:
+        sequences = read_all(source, delay=0.05)
+        assert sequences == sorted(set(sequences))
+        assert len(sequences) < N_FRAMES
+        assert len(sequences) + source.dropped == N_FRAMES
+    finally:
+        source.release()
+
+def test_sources_that_cant_be_opened_are_an_error(tmp_path):
+    with pytest.raises(IOError):
+        LatestFrameSource(str(tmp_path / 'missing.mp4'))
+
+def test_latency_stats_summarise_in_milliseconds():
+    stats = LatencyStats()
+    assert stats.summary() == 'no frames processed'
+    for seconds in [0.01, 0.02, 0.03]:
+        stats.add(seconds)
+    assert stats.percentile(50) == pytest.approx(0.02)
+    assert 'max 30.0' in stats.summary()
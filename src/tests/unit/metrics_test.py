@@ -0,0 +1,98 @@
+import csv
+import json
+import pickle
+
+import pytest
+
+from mt_trainer.metrics import NULL_METRICS, Metrics
+
+
+def test_each_span_is_recorded():
+    metrics = Metrics()
+    for _ in range(3):
+        with metrics.span('inference'):
+            pass
+    with metrics.span('encode'):
+        pass
+    assert len(metrics.samples['inference']) == 3
+    assert len(metrics.samples['encode']) == 1
+
+def test_spans_are_recorded_even_if_they_raise():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.span('decode'):
+            raise ValueError()
+    assert len(metrics.samples['decode']) == 1
+
+def test_stats_are_in_milliseconds():
+    metrics = Metrics()
+    for ms in range(1, 101):
+        metrics.record('inference', ms / 1000.0)
+    stats = metrics.stats('inference')
+    assert stats['count'] == 100
+    assert stats['mean_ms'] == pytest.approx(50.5)
+    assert stats['p50_ms'] == pytest.approx(50.5)
+    assert stats['p95_ms'] == pytest.approx(95.05)
+    assert stats['p99_ms'] == pytest.approx(99.01)
+    assert stats['max_ms'] == pytest.approx(100.0)
+    assert metrics.stats('missing') == {'count': 0}
+
+def test_timed_times_each_item_of_an_iterable():
+    metrics = Metrics()
+    assert list(metrics.timed(iter('abc'), 'decode')) == ['a', 'b', 'c']
+    # the last, failed, next() is timed too
+    assert len(metrics.samples['decode']) == 4
+
+def test_merge_adds_samples_and_counters():
+    metrics = Metrics()
+    metrics.record('inference', 0.1)
+    metrics.count('frames_written')
+    other = Metrics()
+    other.record('inference', 0.2)
+    other.count('frames_written', 2)
+
+    metrics.merge(other.state())
+    assert metrics.samples['inference'] == [0.1, 0.2]
+    assert metrics.counters['frames_written'] == 3
+
+def test_survives_pickling():
+    metrics = Metrics()
+    metrics.record('inference', 0.1)
+    copy = pickle.loads(pickle.dumps(metrics))
+    copy.record('inference', 0.2)
+    assert copy.samples['inference'] == [0.1, 0.2]
+
+def test_null_metrics_records_nothing():
+    with NULL_METRICS.span('inference'):
+        pass
+    NULL_METRICS.record('inference', 0.1)
+    NULL_METRICS.count('frames_written')
+    NULL_METRICS.merge(({'inference': [0.1]}, {'frames_written': 1}))
+    assert not NULL_METRICS
+    assert NULL_METRICS.samples == {}
+    assert NULL_METRICS.counters == {}
+
+def test_writes_json(tmp_path):
+    metrics = Metrics()
+    metrics.record('inference', 0.01)
+    metrics.count('frames_written')
+    path = str(tmp_path / 'metrics.json')
+    metrics.write(path, options={'input_file': 'fight.mp4'})
+
+    with open(path) as f:
+        report = json.load(f)
+    assert report['run']['options']['input_file'] == 'fight.mp4'
+    assert report['spans']['inference']['p99_ms'] == pytest.approx(10.0)
+    assert report['counters'] == {'frames_written': 1}
+
+def test_writes_csv(tmp_path):
+    metrics = Metrics()
+    metrics.record('decode', 0.002)
+    metrics.record('inference', 0.01)
+    path = str(tmp_path / 'metrics.csv')
+    metrics.write(path)
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['span'] for row in rows] == ['decode', 'inference']
+    assert float(rows[0]['p50_ms']) == pytest.approx(2.0)
@@ -0,0 +1,47 @@
+import pytest
+
+from mt_trainer.micro_benchmark import (compare_to_baseline, hot_path_benchmarks,
+                                        load_baseline, run_benchmarks,
+                                        save_baseline, time_call)
+
+
+def result(median_us):
+    return {'median_us': median_us, 'best_us': median_us, 'repeat': 1}
+
+
+def test_every_hot_path_runs_on_synthetic_fixtures(tmp_path):
+    benchmarks = hot_path_benchmarks(str(tmp_path))
+    assert 'PoseClassifier.classify' in benchmarks
+    for function in benchmarks.values():
+        function()
+
+def test_time_call_returns_seconds_per_call_for_each_repeat():
+    calls = []
+    timings = time_call(lambda: calls.append(1), repeat=3)
+    assert len(timings) == 3
+    assert all(0 < seconds < 0.001 for seconds in timings)
+
+def test_only_the_named_benchmarks_are_run():
+    results = run_benchmarks({'fast': lambda: None, 'other': lambda: None},
+                             repeat=2, names=['fa'])
+    assert list(results) == ['fast']
+    assert results['fast']['repeat'] == 2
+
+def test_baselines_can_be_saved_and_loaded(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, {'classify': result(10.0)})
+    assert load_baseline(path) == {'classify': result(10.0)}
+
+def test_changes_beyond_the_tolerance_are_reported():
+    baseline = {'slow': result(10.0), 'fast': result(10.0), 'same': result(10.0)}
+    comparisons = compare_to_baseline(
+        {'slow': result(13.0), 'fast': result(7.0), 'same': result(11.0),
+         'new': result(1.0)},
+        baseline,
+        tolerance=0.25)
+    statuses = {comparison.name: comparison.status for comparison in comparisons}
+    assert statuses == {'slow': 'slower', 'fast': 'faster', 'same': 'unchanged',
+                        'new': 'new'}
+    assert [c.name for c in comparisons if c.regressed] == ['slow']
+    assert comparisons[0].change == pytest.approx(0.3)
+    assert '+30.0%' in str(comparisons[0])
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from mt_trainer.nearest_neighbour_classifier import NearestNeighbourClassifier
+from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.training_data import TrainingSet
+
+
+N_ANGLES = len(QuantifiedPose.ANGLE_NAMES)
+
+
+def training_set(angles, techniques, technique_names=('jab', 'kick', 'teep')):
+    angles = np.array(angles, dtype=np.float32)
+    world, image, visibility, _ = TrainingSet.empty_arrays(len(angles))
+    return TrainingSet(technique_names,
+                       np.array(techniques, dtype=np.int32),
+                       world, image, visibility, angles,
+                       [f'{i}.json' for i in range(len(angles))])
+
+
+def variants():
+    ''' two distinct variants of a kick, and a jab in between them '''
+    rising = np.linspace(10.0, 170.0, N_ANGLES)
+    falling = rising[::-1]
+    return training_set(
+        [rising, rising + 1, falling, falling + 1, np.full(N_ANGLES, 90.0)],
+        [1, 1, 1, 1, 0])
+
+
+def test_nearest_returns_the_most_similar_samples_first():
+    classifier = NearestNeighbourClassifier(variants(), k=2)
+    indices, similarities = classifier.nearest(
+        [QuantifiedPose.from_arrays(angle_array=np.linspace(11.0, 171.0, N_ANGLES))])
+
+    assert sorted(indices[0].tolist()) == [0, 1]
+    assert similarities[0, 0] >= similarities[0, 1]
+
+def test_nearest_gives_the_same_result_however_small_the_blocks():
+    rng = np.random.default_rng(0)
+    samples = training_set(rng.random((200, N_ANGLES)) * 180,
+                           rng.integers(0, 3, 200))
+    queries = rng.random((30, N_ANGLES)) * 180
+
+    expected = NearestNeighbourClassifier(samples, k=7).nearest(queries)
+    blocked = NearestNeighbourClassifier(samples, k=7, block_size=10).nearest(queries)
+
+    assert np.array_equal(blocked[0], expected[0])
+    assert blocked[1] == pytest.approx(expected[1])
+
+def test_classify_recognises_each_variant_of_a_technique():
+    classifier = NearestNeighbourClassifier(variants(), k=2)
+    for angles in [np.linspace(10.0, 170.0, N_ANGLES),
+                   np.linspace(170.0, 10.0, N_ANGLES)]:
+        results = classifier.classify(QuantifiedPose.from_arrays(angle_array=angles),
+                                      threshold=0.99)
+        assert [technique for technique, _ in results] == ['kick']
+
+def test_confidence_is_shared_between_the_techniques_voted_for():
+    classifier = NearestNeighbourClassifier(variants(), k=3)
+    pose = QuantifiedPose.from_arrays(angle_array=np.full(N_ANGLES, 90.0))
+    results = classifier.classify(pose, threshold=0.0, max_results=3)
+
+    assert [technique for technique, _ in results] == ['kick', 'jab']
+    assert results[1][1] == pytest.approx(1.0 / 3, abs=1e-6)
+    assert sum(confidence for _, confidence in results) <= 1.0
+
+def test_classify_batch_and_poses_without_angles():
+    classifier = NearestNeighbourClassifier(variants(), k=1)
+    results = classifier.classify_batch(
+        [QuantifiedPose(), QuantifiedPose.from_arrays(angle_array=np.full(N_ANGLES, 2.0))],
+        threshold=0.9)
+
+    assert results[0] == []
+    assert results[1][0][0] == 'jab'
+    assert classifier.similarities(QuantifiedPose())['jab'] is None
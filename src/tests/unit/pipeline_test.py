@@ -0,0 +1,85 @@
+import random
+import time
+
+import pytest
+
+from mt_trainer.pipeline import Batch, Pipeline
+
+
+def test_run_passes_every_item_through_every_stage_in_order():
+    results = []
+
+    def slow_double(x):
+        time.sleep(random.random() * 0.001)
+        return x * 2
+
+    pipeline = Pipeline(range(100), [slow_double, lambda x: x + 1, results.append])
+
+    assert pipeline.run() == 100
+    assert results == [x * 2 + 1 for x in range(100)]
+
+def test_items_for_which_a_stage_returns_none_are_dropped():
+    results = []
+    pipeline = Pipeline(range(10),
+                        [lambda x: x if x % 2 == 0 else None, results.append])
+
+    assert pipeline.run() == 5
+    assert results == [0, 2, 4, 6, 8]
+
+def test_stages_can_keep_state_between_items():
+    running_totals = []
+    total = 0
+
+    def accumulate(x):
+        nonlocal total
+        total += x
+        return total
+
+    Pipeline(range(5), [accumulate, running_totals.append], queue_size=1).run()
+    assert running_totals == [0, 1, 3, 6, 10]
+
+def test_run_reraises_an_exception_from_any_stage():
+    def explode(x):
+        if x == 3:
+            raise ValueError('boom')
+        return x
+
+    pipeline = Pipeline(range(1000), [explode, lambda x: x], queue_size=2)
+    with pytest.raises(ValueError):
+        pipeline.run()
+    assert pipeline.stopped
+
+def test_run_reraises_an_exception_from_the_source():
+    def source():
+        yield 1
+        raise IOError('could not read')
+
+    with pytest.raises(IOError):
+        Pipeline(source(), [lambda x: x]).run()
+
+def test_a_stage_can_pass_on_a_batch_of_items():
+    results = []
+    pipeline = Pipeline(range(4),
+                        [lambda x: Batch([x] * x), results.append])
+
+    assert pipeline.run() == 6
+    assert results == [1, 2, 2, 3, 3, 3]
+
+def test_a_stage_can_hold_items_back_until_the_stream_ends():
+    class Pairs:
+        def __init__(self):
+            self.held = []
+
+        def __call__(self, x):
+            self.held.append(x)
+            if len(self.held) < 2:
+                return Batch()
+            pair, self.held = tuple(self.held), []
+            return pair
+
+        def flush(self):
+            return Batch([tuple(self.held)]) if self.held else None
+
+    results = []
+    Pipeline(range(5), [Pairs(), results.append]).run()
+    assert results == [(0, 1), (2, 3), (4,)]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from mt_trainer.pose_classifier import PoseClassifier
+from mt_trainer.quantified_pose import QuantifiedPose
+
+
+N_ANGLES = len(QuantifiedPose.ANGLE_NAMES)
+
+
+def pose_with_angles(angles):
+    return QuantifiedPose.from_arrays(angle_array=angles)
+
+
+def archetypes():
+    return {
+        'jab': pose_with_angles(np.full(N_ANGLES, 90.0)),
+        'kick': pose_with_angles(np.linspace(10.0, 170.0, N_ANGLES)),
+        'teep': pose_with_angles(np.linspace(170.0, 10.0, N_ANGLES)),
+        'untrained': QuantifiedPose(),
+    }
+
+
+def test_similarities_matches_similarity_to_for_every_archetype():
+    classifier = PoseClassifier(archetypes())
+    pose = pose_with_angles(np.linspace(20.0, 150.0, N_ANGLES))
+    similarities = classifier.similarities(pose)
+
+    assert list(similarities.keys()) == ['jab', 'kick', 'teep', 'untrained']
+    for technique in ['jab', 'kick', 'teep']:
+        expected = pose.similarity_to(classifier.pose_archetypes[technique])
+        assert similarities[technique] == pytest.approx(expected, abs=1e-6)
+    assert similarities['untrained'] is None
+
+def test_classify_returns_the_most_similar_techniques_over_the_threshold():
+    classifier = PoseClassifier(archetypes())
+    pose = pose_with_angles(np.linspace(20.0, 150.0, N_ANGLES))
+
+    results = classifier.classify(pose, threshold=0.0, max_results=2)
+    assert [technique for technique, _ in results] == ['kick', 'jab']
+    assert results[0][1] > results[1][1]
+
+    results = classifier.classify(pose, threshold=0.0, max_results=10)
+    assert [technique for technique, _ in results] == ['kick', 'jab', 'teep']
+
+    assert classifier.classify(pose, threshold=0.9999) == []
+
+def test_classify_returns_nothing_for_a_pose_without_angles():
+    classifier = PoseClassifier(archetypes())
+    assert classifier.classify(QuantifiedPose(), threshold=0.0) == []
+
+def test_classify_batch_classifies_each_pose():
+    classifier = PoseClassifier(archetypes())
+    poses = [
+        pose_with_angles(np.full(N_ANGLES, 45.0)),
+        QuantifiedPose(),
+        pose_with_angles(np.linspace(171.0, 11.0, N_ANGLES)),
+    ]
+    results = classifier.classify_batch(poses, threshold=0.99, max_results=1)
+
+    assert [r[0][0] if r else None for r in results] == ['jab', None, 'teep']
+    assert results[0][0][1] == pytest.approx(1.0)
+
+def test_classify_batch_accepts_a_matrix_of_angles():
+    classifier = PoseClassifier(archetypes())
+    angles = np.stack([np.full(N_ANGLES, 1.0), np.linspace(10.0, 170.0, N_ANGLES)])
+    results = classifier.classify_batch(angles, threshold=0.99)
+
+    assert [r[0][0] for r in results] == ['jab', 'kick']
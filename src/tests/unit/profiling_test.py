@@ -0,0 +1,72 @@
+import pstats
+import threading
+import time
+
+from mt_trainer.pipeline import Pipeline
+from mt_trainer.profiling import Profiler, StackSampler, profile_prefix
+
+
+def spin(n=20000):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+def test_the_profile_goes_next_to_the_output_file(tmp_path):
+    output_file = str(tmp_path / 'fight-output.mp4')
+    assert profile_prefix(output_file) == output_file + '.profile'
+
+def test_the_thread_which_started_profiling_is_profiled(tmp_path):
+    profiler = Profiler(str(tmp_path / 'run.profile')).start()
+    spin()
+    pstats_file, _, _ = profiler.stop()
+
+    calls = [calls for (_, _, function), (calls, *_) in
+             pstats.Stats(pstats_file).stats.items() if function == 'spin']
+    assert calls and calls[0] >= 1
+
+def test_a_pipeline_runs_under_the_profiler_with_its_stages_sampled(tmp_path):
+    results = []
+
+    def slow_stage(x):
+        time.sleep(0.005)
+        return x
+
+    with Profiler(str(tmp_path / 'run.profile')) as profiler:
+        pipeline = Pipeline(range(20), [slow_stage, results.append])
+        assert pipeline.run() == 20
+    assert results == list(range(20))
+
+    with open(profiler.files[1]) as f:
+        stacks = f.read()
+    assert 'pipeline-slow_stage;' in stacks
+
+def test_sampled_stacks_are_written_collapsed(tmp_path):
+    sampler = StackSampler()
+    thread = threading.Thread(target=spin, args=(2000000,), name='worker')
+    thread.start()
+    sampler.sample()
+    thread.join()
+    path = str(tmp_path / 'run.folded')
+    sampler.write(path)
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) == 1
+    assert any(line.startswith('worker;') for line in lines)
+
+def test_allocations_which_grow_per_frame_are_reported(tmp_path):
+    kept = []
+    with Profiler(str(tmp_path / 'run.profile')) as profiler:
+        for _ in range(11):
+            kept.append(bytearray(100000))
+            profiler.tick()
+
+    with open(profiler.files[2]) as f:
+        lines = f.read().splitlines()
+    assert 'over 10 frames' in lines[0]
+    bytes_per_frame, total = lines[2].split()[0:2]
+    assert float(bytes_per_frame) >= 100000
+    assert 'profiling_test.py' in lines[2]
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from mt_trainer.quantified_pose import QuantifiedPose, landmark_arrays
+
+
+def random_pose(seed=0):
+    rng = np.random.default_rng(seed)
+    return QuantifiedPose.from_arrays(
+        world_array=rng.normal(size=(33, 3)),
+        image_array=rng.random(size=(33, 3)),
+        visibility=rng.random(size=33),
+    )
+
+
+def test_angles_are_calculated_from_the_world_landmarks_in_a_fixed_order():
+    pose = random_pose()
+    assert list(pose.angles.keys()) == list(QuantifiedPose.ANGLE_NAMES)
+    assert pose.angle_array.dtype == np.float32
+    assert pose.angle_array.shape == (len(QuantifiedPose.ANGLE_LANDMARKS),)
+
+def test_landmark_lists_round_trip_through_the_arrays():
+    pose = random_pose()
+    world_array, visibility = landmark_arrays(pose.world_landmarks)
+    image_array, _ = landmark_arrays(pose.image_landmarks)
+
+    assert np.array_equal(world_array, pose.world_array)
+    assert np.array_equal(image_array, pose.image_array)
+    assert np.array_equal(visibility, pose.visibility)
+
+def test_a_pose_can_be_built_from_landmark_lists():
+    pose = random_pose()
+    copy = QuantifiedPose(pose.world_landmarks, pose.image_landmarks)
+
+    assert np.array_equal(copy.world_array, pose.world_array)
+    assert np.array_equal(copy.visibility, pose.visibility)
+    assert copy.angle_array == pytest.approx(pose.angle_array)
+
+def test_plus_and_minus_return_new_poses_without_changing_either_operand():
+    pose1 = random_pose(1)
+    pose2 = random_pose(2)
+    world1 = pose1.world_array.copy()
+    world2 = pose2.world_array.copy()
+
+    total = pose1.plus(pose2)
+    diff = total.minus(pose2)
+
+    assert np.array_equal(pose1.world_array, world1)
+    assert np.array_equal(pose2.world_array, world2)
+    assert total.world_array == pytest.approx(world1 + world2)
+    assert diff.angle_array == pytest.approx(pose1.angle_array, abs=1e-4)
+
+def test_plus_on_an_empty_pose_copies_the_other_pose():
+    pose = random_pose()
+    total = QuantifiedPose().plus(pose)
+
+    assert np.array_equal(total.world_array, pose.world_array)
+    assert total.world_array is not pose.world_array
+
+def test_multiply_by_scales_landmarks_and_angles_but_not_visibility():
+    pose = random_pose()
+    half = pose.multiply_by(0.5)
+
+    assert half.world_array == pytest.approx(pose.world_array * 0.5)
+    assert half.angle_array == pytest.approx(pose.angle_array * 0.5)
+    assert np.array_equal(half.visibility, pose.visibility)
+
+def test_similarity_to_is_1_for_the_same_pose_and_none_without_angles():
+    pose = random_pose()
+    assert pose.similarity_to(pose.multiply_by(2.0)) == pytest.approx(1.0)
+    assert pose.similarity_to(QuantifiedPose()) is None
+
+def test_save_and_load_round_trip(tmp_path):
+    pose = random_pose()
+    filepath = str(tmp_path / 'pose.json')
+    pose.save(filepath)
+    loaded = QuantifiedPose.load(filepath)
+
+    assert np.array_equal(loaded.world_array, pose.world_array)
+    assert np.array_equal(loaded.image_array, pose.image_array)
+    assert np.array_equal(loaded.visibility, pose.visibility)
+    assert np.array_equal(loaded.angle_array, pose.angle_array)
+
+def test_interpolate_blends_the_landmarks_and_recalculates_the_angles():
+    rng = np.random.default_rng(1)
+    start = QuantifiedPose.from_arrays(rng.normal(size=(33, 3)),
+                                       rng.random((33, 3)), rng.random(33))
+    end = QuantifiedPose.from_arrays(rng.normal(size=(33, 3)),
+                                     rng.random((33, 3)), rng.random(33))
+    halfway = QuantifiedPose.interpolate(start, end, 0.5)
+    np.testing.assert_allclose(halfway.world_array,
+                               (start.world_array + end.world_array) / 2,
+                               atol=1e-6)
+    np.testing.assert_allclose(halfway.angle_array,
+                               QuantifiedPose.from_arrays(halfway.world_array).angle_array)
+    assert QuantifiedPose.interpolate(None, end, 0.5) is end
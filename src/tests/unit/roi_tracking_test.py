@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.roi_tracking import RoiTracker
+
+WIDTH, HEIGHT = 1000, 500
+
+
+def pose_in(left, top, right, bottom, visibility=1.0):
+    ''' A pose whose landmarks span the given pixel box of the frame '''
+    image_array = np.zeros((33, 3), np.float32)
+    image_array[:, 0] = np.linspace(left, right, 33) / WIDTH
+    image_array[:, 1] = np.linspace(top, bottom, 33) / HEIGHT
+    return QuantifiedPose.from_arrays(
+        world_array=np.random.default_rng(0).normal(size=(33, 3)),
+        image_array=image_array,
+        visibility=np.full(33, visibility, np.float32))
+
+
+def test_the_box_is_padded_around_the_pose():
+    tracker = RoiTracker(padding=0.25)
+    assert tracker.update(pose_in(400, 200, 600, 400), WIDTH, HEIGHT) == \
+        (350, 150, 650, 450)
+
+def test_the_box_is_clipped_to_the_frame():
+    tracker = RoiTracker(padding=0.5)
+    assert tracker.update(pose_in(0, 100, 100, 300), WIDTH, HEIGHT) == \
+        (0, 0, 150, 400)
+
+def test_the_box_stays_put_while_the_pose_is_well_inside_it():
+    tracker = RoiTracker(padding=0.25)
+    box = tracker.update(pose_in(400, 200, 600, 400), WIDTH, HEIGHT)
+    assert tracker.update(pose_in(410, 210, 610, 410), WIDTH, HEIGHT) == box
+    assert tracker.update(pose_in(500, 200, 700, 400), WIDTH, HEIGHT) != box
+
+def test_there_is_no_box_without_a_pose_or_when_it_would_cover_most_of_the_frame():
+    tracker = RoiTracker()
+    assert tracker.update(None, WIDTH, HEIGHT) is None
+    assert tracker.update(pose_in(50, 50, 950, 450), WIDTH, HEIGHT) is None
+
+def test_poses_near_the_edge_of_the_box_or_low_in_visibility_are_rejected():
+    tracker = RoiTracker(padding=0.25)
+    tracker.update(pose_in(400, 200, 600, 400), WIDTH, HEIGHT)
+    assert tracker.accept(pose_in(410, 210, 610, 410), WIDTH, HEIGHT)
+    assert not tracker.accept(pose_in(450, 200, 649, 400), WIDTH, HEIGHT)
+    assert not tracker.accept(pose_in(410, 210, 610, 410, visibility=0.2),
+                              WIDTH, HEIGHT)
+    assert not tracker.accept(None, WIDTH, HEIGHT)
+
+def test_box_edges_on_the_frame_edge_dont_count():
+    tracker = RoiTracker(padding=0.5)
+    tracker.update(pose_in(0, 100, 100, 300), WIDTH, HEIGHT)
+    assert tracker.accept(pose_in(0, 100, 100, 300), WIDTH, HEIGHT)
+
+def test_remap_maps_landmarks_in_the_box_back_to_the_whole_frame():
+    in_box = QuantifiedPose.from_arrays(
+        world_array=np.zeros((33, 3)),
+        image_array=np.tile([0.5, 0.25, 0.1], (33, 1)),
+        visibility=np.ones(33))
+    remapped = RoiTracker.remap(in_box, (100, 100, 300, 500), WIDTH, HEIGHT)
+    np.testing.assert_allclose(remapped.image_array[0], [0.2, 0.4, 0.02],
+                               rtol=1e-6)
+    np.testing.assert_array_equal(remapped.world_array, in_box.world_array)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from PIL import ImageFont
+
+from mt_trainer.text_rendering import (Cv2TextRenderer, GlyphAtlasTextRenderer,
+                                       PILTextRenderer)
+
+PIXEL_HEIGHT = 12
+# anti-aliased Hershey strokes never quite reach full coverage
+COVERAGE_TOLERANCE = 8
+
+
+@pytest.fixture(params=[True, False], ids=['truetype', 'hershey'])
+def renderer(request):
+    return GlyphAtlasTextRenderer(use_default_font=request.param)
+
+
+def changed_pixels(string, renderer, top=20, left=5):
+    image = np.zeros((40, 200, 3), np.uint8)
+    renderer.render(string, image, top=top, left=left,
+                    pixel_height=PIXEL_HEIGHT, color=(10, 200, 255))
+    return image, np.argwhere(image.any(axis=2))
+
+
+def test_pixel_width_is_answered_from_the_cache(renderer):
+    width = renderer.pixel_width('ab', PIXEL_HEIGHT)
+    assert width > renderer.pixel_width('a', PIXEL_HEIGHT)
+    assert renderer.atlas(PIXEL_HEIGHT).strings['ab'][3] == width
+    assert renderer.pixel_width('', PIXEL_HEIGHT) == 0
+
+def test_only_the_most_recent_strings_are_cached():
+    atlas = GlyphAtlasTextRenderer().atlas(PIXEL_HEIGHT)
+    atlas.strings.maxsize = 2
+    for frame_number in range(5):
+        atlas.string_mask(f"Frame #{frame_number}")
+    assert list(atlas.strings) == ['Frame #3', 'Frame #4']
+
+def test_each_glyph_is_only_rasterised_once(renderer):
+    renderer.pixel_width('aaa', PIXEL_HEIGHT)
+    renderer.pixel_width('a', PIXEL_HEIGHT)
+    assert list(renderer.atlas(PIXEL_HEIGHT).glyphs) == ['a']
+
+def test_text_is_drawn_in_the_given_colour_inside_the_text_box(renderer):
+    image, changed = changed_pixels('Frame #12', renderer)
+    top, bottom, left, right = renderer.text_box('Frame #12', top=20, left=5,
+                                                 pixel_height=PIXEL_HEIGHT)
+    assert len(changed) > 0
+    assert changed[:, 0].min() >= top and changed[:, 0].max() < bottom
+    assert changed[:, 1].min() >= left and changed[:, 1].max() < right
+    # the most covered pixels are (all but) the colour
+    difference = np.abs(image.astype(np.int32) - (10, 200, 255)).max(axis=2)
+    assert difference.min() <= COVERAGE_TOLERANCE
+
+def test_text_is_clipped_to_the_image(renderer):
+    image = np.zeros((10, 10, 3), np.uint8)
+    renderer.render('clipped', image, top=5, left=-3, pixel_height=PIXEL_HEIGHT,
+                    color=(255, 255, 255))
+    renderer.render('gone', image, top=100, left=100, pixel_height=PIXEL_HEIGHT)
+    assert image.any()
+
+def test_text_can_be_drawn_on_greyscale_images(renderer):
+    image = np.zeros((20, 60), np.uint8)
+    renderer.render('ab', image, top=15, pixel_height=PIXEL_HEIGHT, color=(255,))
+    assert image.max() >= 255 - COVERAGE_TOLERANCE
+
+def test_the_hershey_fallback_matches_cv2_widths():
+    atlas = GlyphAtlasTextRenderer(use_default_font=False)
+    cv2_renderer = Cv2TextRenderer()
+    for string in ['left_knee_extension', '123', 'Pose: jab (99.1%)']:
+        assert atlas.pixel_width(string, PIXEL_HEIGHT) == \
+            cv2_renderer.pixel_width(string, PIXEL_HEIGHT)
+
+def test_pil_fonts_are_only_sized_once_per_size(monkeypatch):
+    font_file = ImageFont.load_default(size=10)
+    monkeypatch.setattr(ImageFont, 'truetype', lambda path: font_file)
+    renderer = PILTextRenderer()
+    width = renderer.pixel_width('Frame #1', None, PIXEL_HEIGHT)
+    font = renderer.sized_font(PILTextRenderer.DEFAULT_FONT_FACE, PIXEL_HEIGHT)
+    assert renderer.pixel_width('Frame #2', None, PIXEL_HEIGHT) == width
+    assert renderer.sized_font(PILTextRenderer.DEFAULT_FONT_FACE,
+                               PIXEL_HEIGHT) is font
+    assert len(renderer.sized_fonts) == 1
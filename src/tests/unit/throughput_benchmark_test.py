@@ -0,0 +1,51 @@
+import cv2
+import pytest
+
+from mt_trainer.metrics import Metrics
+from mt_trainer.throughput_benchmark import (ReplayFrameProcessor,
+                                             output_extension, throughput,
+                                             write_synthetic_video)
+
+
+def test_synthetic_videos_have_the_size_and_length_asked_for(tmp_path):
+    path = write_synthetic_video(str(tmp_path / 'synthetic.mp4'), 64, 48, 5)
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    assert len(frames) == 5
+    assert frames[0].shape == (48, 64, 3)
+
+def test_replay_processor_replays_its_poses_in_turn():
+    processor = ReplayFrameProcessor(poses=['a', 'b'])
+    assert [processor.quantify_pose(None, bgr=True) for _ in range(3)] == \
+        ['a', 'b', 'a']
+    assert processor.frames_replayed == 3
+    assert processor._pose_landmarker is None
+
+def test_replay_processor_has_canned_poses_by_default():
+    pose = ReplayFrameProcessor().quantify_pose(None)
+    assert pose.image_landmarks is not None
+    assert len(pose.angle_array) == len(pose.ANGLE_NAMES)
+
+def test_codecs_are_written_into_a_container_which_takes_them():
+    assert output_extension('mp4v') == '.mp4'
+    assert output_extension('MJPG') == '.avi'
+
+def test_throughput_is_per_frame_written():
+    metrics = Metrics()
+    metrics.record('pipeline', 2.0)
+    metrics.record('encode', 0.5)
+    result = throughput(metrics, frames_written=50)
+    assert result['fps'] == pytest.approx(25.0)
+    assert result['stage_ms_per_frame'] == {'encode': pytest.approx(10.0)}
+
+def test_runs_which_write_no_frames_fail():
+    metrics = Metrics()
+    metrics.record('pipeline', 2.0)
+    with pytest.raises(ValueError, match='no pose was found'):
+        throughput(metrics, frames_written=0)
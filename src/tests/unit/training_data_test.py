@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+
+from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.training_data import (TrainingSet, default_cache_file,
+                                      load_training_set, read_training_set)
+
+
+def random_pose(rng):
+    return QuantifiedPose.from_arrays(
+        world_array=rng.normal(size=(33, 3)),
+        image_array=rng.random(size=(33, 3)),
+        visibility=rng.random(size=33),
+    )
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for technique, n_files in [('jab', 2), ('teep', 3), ('empty', 0)]:
+        os.makedirs(tmp_path / 'training' / technique)
+        for i in range(n_files):
+            random_pose(rng).save(str(tmp_path / 'training' / technique / f'{i}.json'))
+    with open(tmp_path / 'training' / 'teep' / 'broken.json', 'w') as f:
+        f.write('{ not json')
+    return str(tmp_path / 'training')
+
+
+def test_load_training_set_reads_every_valid_file(data_dir):
+    training_set = load_training_set(data_dir, use_cache=False)
+
+    assert training_set.technique_names == ['empty', 'jab', 'teep']
+    assert training_set.counts().tolist() == [0, 2, 3]
+    assert training_set.world.shape == (5, 33, 3)
+    assert training_set.angles.shape == (5, len(QuantifiedPose.ANGLE_NAMES))
+    assert not os.path.exists(default_cache_file(data_dir))
+
+def test_archetypes_are_the_mean_of_each_techniques_samples(data_dir):
+    training_set = load_training_set(data_dir, use_cache=False)
+    archetypes = training_set.archetypes()
+
+    jab = [QuantifiedPose.load(os.path.join(data_dir, 'jab', f)) for f in ['0.json', '1.json']]
+    expected = jab[0].plus(jab[1]).multiply_by(0.5)
+    assert archetypes['jab'].angle_array == pytest.approx(expected.angle_array, rel=1e-5)
+    assert archetypes['jab'].world_array == pytest.approx(expected.world_array, rel=1e-5)
+    assert archetypes['empty'].angle_array is None
+
+def test_the_cache_is_written_and_then_reused(data_dir, monkeypatch):
+    first = load_training_set(data_dir)
+    assert os.path.exists(default_cache_file(data_dir))
+
+    def fail(*args):
+        raise AssertionError('should have used the cache')
+    monkeypatch.setattr(QuantifiedPose, 'load', fail)
+
+    second = load_training_set(data_dir)
+    assert second.technique_names == first.technique_names
+    assert np.array_equal(second.angles, first.angles)
+    assert second.files == first.files
+
+def test_the_cache_is_rebuilt_when_the_training_data_changes(data_dir):
+    load_training_set(data_dir)
+    rng = np.random.default_rng(1)
+    random_pose(rng).save(os.path.join(data_dir, 'empty', 'new.json'))
+
+    training_set = load_training_set(data_dir)
+    assert training_set.counts().tolist() == [1, 2, 3]
+    assert TrainingSet.load(default_cache_file(data_dir)).counts().tolist() == [1, 2, 3]
+
+def test_the_load_report_lists_loaded_skipped_and_malformed_files(data_dir):
+    with open(os.path.join(data_dir, 'jab', 'notes.txt'), 'w') as f:
+        f.write('not training data')
+    with open(os.path.join(data_dir, 'jab', 'wrong-shape.json'), 'w') as f:
+        f.write('{"angles": {}, "world_landmarks": {"landmark": [{"x": 1}]}}')
+
+    report = load_training_set(data_dir, use_cache=False).report
+
+    assert sorted(report.loaded) == sorted(['jab/0.json', 'jab/1.json',
+                                            'teep/0.json', 'teep/1.json',
+                                            'teep/2.json'])
+    assert report.skipped == ['jab/notes.txt']
+    assert [file for file, _ in report.malformed] == ['jab/wrong-shape.json',
+                                                      'teep/broken.json']
+
+def test_the_load_report_survives_the_cache(data_dir):
+    load_training_set(data_dir)
+    report = load_training_set(data_dir).report
+
+    assert report.cache_file == default_cache_file(data_dir)
+    assert len(report.loaded) == 5
+    assert [file for file, _ in report.malformed] == ['teep/broken.json']
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_loading_gives_the_same_result_as_serial(data_dir, executor):
+    serial = read_training_set(data_dir, workers=1)
+    parallel = read_training_set(data_dir, workers=3, executor=executor,
+                                 chunk_size=1)
+
+    assert parallel.files == serial.files
+    assert parallel.counts().tolist() == serial.counts().tolist()
+    assert np.array_equal(parallel.angles, serial.angles)
+    assert parallel.report.malformed == serial.report.malformed
@@ -0,0 +1,69 @@
+import os
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+from mt_trainer.quantified_pose import QuantifiedPose
+from mt_trainer.training_data import default_cache_file
+from mt_trainer.video_annotation import (decode_fourcc, inference_fps_needed,
+                                         shard_options, shard_ranges)
+
+
+def test_shard_ranges_cover_every_frame_exactly_once():
+    ranges = shard_ranges(10, 110, 3, warm_up_frames=5)
+    assert [(start, stop) for _, start, stop in ranges] == [(10, 44), (44, 78), (78, 110)]
+
+def test_every_shard_but_the_first_starts_warm_up_frames_early():
+    ranges = shard_ranges(10, 110, 3, warm_up_frames=5)
+    assert [warm_up_from for warm_up_from, _, _ in ranges] == [10, 39, 73]
+
+def test_warm_up_never_starts_before_the_first_frame():
+    ranges = shard_ranges(0, 4, 4, warm_up_frames=10)
+    assert ranges == [(0, 0, 1), (0, 1, 2), (0, 2, 3), (0, 3, 4)]
+
+def test_shard_ranges_never_makes_more_shards_than_frames():
+    assert len(shard_ranges(0, 2, 8, warm_up_frames=1)) == 2
+    assert shard_ranges(5, 5, 8, warm_up_frames=1) == []
+
+def test_decode_fourcc_unpacks_the_four_characters():
+    packed = sum(ord(c) << 8 * i for i, c in enumerate('mp4v'))
+    assert decode_fourcc(packed) == 'mp4v'
+
+def tuning_options(**options):
+    return Namespace(**dict(dict(target_fps=30.0, processes=1,
+                                 adaptive_inference='false',
+                                 motion_threshold=12.0, motion_area=0.0005,
+                                 max_stride=5), **options))
+
+def test_the_fps_needed_is_shared_between_the_processes(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 8)
+    frames = [np.zeros((36, 64, 3), np.uint8)] * 10
+    assert inference_fps_needed(tuning_options(), frames) == 30.0
+    assert inference_fps_needed(tuning_options(processes=4), frames) == 7.5
+    # no more in parallel than there are CPUs
+    assert inference_fps_needed(tuning_options(processes=16), frames) == 3.75
+
+def test_adaptive_inference_only_needs_the_frames_it_would_infer():
+    # nothing moves, so only every max_stride'th frame is inferred
+    frames = [np.zeros((36, 64, 3), np.uint8)] * 10
+    assert inference_fps_needed(
+        tuning_options(adaptive_inference='true'), frames) == pytest.approx(6.0)
+
+def test_the_training_cache_is_built_once_before_the_shards_start(tmp_path):
+    data_dir = str(tmp_path / 'training')
+    os.makedirs(os.path.join(data_dir, 'jab'))
+    rng = np.random.default_rng(0)
+    pose = QuantifiedPose.from_arrays(rng.normal(size=(33, 3)),
+                                      rng.random((33, 3)), rng.random(33))
+    pose.save(os.path.join(data_dir, 'jab', '0.json'))
+    options = Namespace(training_data_dir=data_dir, training_cache='true',
+                        training_workers=None)
+
+    assert shard_options(options) is options
+    assert os.path.exists(default_cache_file(data_dir))
+
+def test_without_the_cache_each_shard_parses_the_training_data_alone():
+    options = Namespace(training_cache='false', training_workers=None)
+    assert shard_options(options).training_workers == 1
+    assert options.training_workers is None
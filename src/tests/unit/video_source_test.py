@@ -0,0 +1,75 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from mt_trainer.video_source import VideoIndex, VideoSource
+
+N_FRAMES = 40
+
+
+def frame_number_of(image):
+    return int(round(image.mean() / 6))
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    ''' A video whose frame n is a flat grey of brightness 6 * n '''
+    path = str(tmp_path / 'video.avi')
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for frame_number in range(N_FRAMES):
+        out.write(np.full((48, 64, 3), 6 * frame_number, np.uint8))
+    out.release()
+    return path
+
+
+def test_the_index_has_every_frame_in_order(video_file):
+    index = VideoIndex.build(video_file)
+    assert index.frame_count == N_FRAMES
+    assert np.all(np.diff(index.timestamps) > 0)
+    assert index.keyframe_before(0) == 0
+
+def test_frames_can_be_read_in_any_order(video_file):
+    with VideoSource(video_file) as source:
+        for frame_number in [30, 2, 39, 3, 17]:
+            assert frame_number_of(source.read(frame_number)) == frame_number
+
+def test_frames_yields_every_stride_th_frame_between_start_and_stop(video_file):
+    with VideoSource(video_file) as source:
+        frames = list(source.frames(start=4, stop=20, stride=5))
+    assert [frame_number for frame_number, _ in frames] == [4, 9, 14, 19]
+    assert [frame_number_of(image) for _, image in frames] == [4, 9, 14, 19]
+
+def test_frames_stops_at_the_end_of_the_video(video_file):
+    with VideoSource(video_file) as source:
+        assert len(list(source.frames(start=35, stop=1000))) == 5
+
+def test_seeking_forward_without_passing_a_keyframe_decodes_forward(video_file):
+    with VideoSource(video_file) as source:
+        source.index.keyframes = np.array([0, 20])
+        source.read(10)
+        assert source.seek(15) == 4
+        assert source.seek(25) == 5
+
+def test_the_index_is_saved_next_to_the_video_and_reused(video_file):
+    VideoSource(video_file).release()
+    cache_file = VideoIndex.path_for(video_file)
+    assert os.path.exists(cache_file)
+    saved = VideoIndex.load(cache_file)
+    assert saved.is_index_of(video_file)
+    np.testing.assert_array_equal(
+        VideoIndex.for_video(video_file).timestamps, saved.timestamps)
+
+def test_the_index_is_rebuilt_when_the_video_changes(video_file):
+    VideoIndex.for_video(video_file)
+    with open(video_file, 'ab') as f:
+        f.write(b'\0' * 16)
+    assert not VideoIndex.load(VideoIndex.path_for(video_file)).is_index_of(video_file)
+    assert VideoIndex.for_video(video_file).is_index_of(video_file)
+
+def test_the_index_can_live_in_another_directory(video_file, tmp_path):
+    cache_dir = tmp_path / 'elsewhere'
+    cache_dir.mkdir()
+    VideoIndex.for_video(video_file, cache_dir=str(cache_dir))
+    assert os.listdir(cache_dir) == ['video.avi.index.npz']